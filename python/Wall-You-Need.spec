@@ -12,8 +12,31 @@ a = Analysis(
         ('wallpaper_engine.py', '.'),
         ('DepotDownloaderMod/*', 'DepotDownloaderMod'),
         ('registry_utils.py', '.'),
+        ('setter_backend.py', '.'),
+        ('wallpaper_setter.py', '.'),
         ('startup_gui.py', '.'),
         ('wallpaper_utils.py', '.'),
+        ('engine.py', '.'),
+        ('engine_process.py', '.'),
+        ('control_api.py', '.'),
+        ('metrics.py', '.'),
+        ('profiling.py', '.'),
+        ('perceptual_hash.py', '.'),
+        ('image_features.py', '.'),
+        ('local_library.py', '.'),
+        ('bandwidth.py', '.'),
+        ('archive.py', '.'),
+        ('archive_worker.py', '.'),
+        ('thumbnails.py', '.'),
+        ('gallery.py', '.'),
+        ('http_session.py', '.'),
+        ('monitors.py', '.'),
+        ('work_queue.py', '.'),
+        ('providers.py', '.'),
+        ('sources.py', '.'),
+        ('local_folders.py', '.'),
+        ('feeds.py', '.'),
+        ('credentials.py', '.'),
     ],
     hiddenimports=[],
     hookspath=[],
@@ -0,0 +1,161 @@
+import os
+import hashlib
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from python.archive_worker import encode_archive_copy, encode_display_copy
+from python.wallpaper_utils import update_wallpaper_history
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_SUFFIX = ".webp"
+# Display copy of the archived wallpaper set last, in the save location
+RESTORED_FILE = "restored_wallpaper.jpg"
+# Hot files at most this much larger than the display are kept as they are, re-encoding would gain little
+DISPLAY_COPY_MARGIN = 1.25
+
+def archive_path(hot_path):
+    hot_path = Path(hot_path)
+    return hot_path.parent / ARCHIVE_DIR / (hot_path.stem + ARCHIVE_SUFFIX)
+
+def is_archived(path):
+    return Path(path).parent.name == ARCHIVE_DIR
+
+def locate_wallpaper(path):
+    """Where a wallpaper is now: the hot file, its archived copy, or None when gone."""
+    if os.path.exists(path):
+        return str(path)
+    if not is_archived(path) and archive_path(path).exists():
+        return str(archive_path(path))
+    return None
+
+def restore_wallpaper(path, target):
+    """The file to set for a picked wallpaper: hot paths as they are, archived ones decoded into target.
+
+    target is a display copy every restore overwrites; the archived WebP stays
+    the wallpaper's only copy, it is not passed off as the original again.
+    """
+    path = Path(path)
+    if not is_archived(path):
+        return path
+    temp_path = Path(target).with_suffix(".tmp")
+    try:
+        with Image.open(path) as image:
+            image.convert("RGB").save(temp_path, "JPEG", quality=95)
+        os.replace(temp_path, target)
+        logging.info(f"Showing {path.name} from the archive")
+        return Path(target)
+    except OSError as e:
+        logging.error(f"Failed to restore {path}: {e}")
+        return path
+
+class WallpaperArchive:
+    """Keeps the hot tier at display quality and moves old wallpapers to a compact cold tier, in the background.
+
+    New downloads larger than the display are replaced by a JPEG just covering
+    it (HOT_TIER_QUALITY), and their history entry is updated to match. Old
+    ones are re-encoded as WebP; the hot file is removed only after its copy
+    was written. The re-encodes (a full-size JPEG decode is CPU-bound) run in
+    one long-lived pool of ARCHIVE_WORKERS processes, started on first use.
+    The cold tier of every folder is kept under ARCHIVE_MAX_MB by deleting its
+    oldest copies.
+    """
+
+    def __init__(self, workers):
+        # Spawned everywhere: the pool's processes import archive_worker, never the GUI or the engine
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.commit_lock = threading.Lock()
+
+    def submit(self, hot_path, config):
+        hot_path = Path(hot_path)
+        target = archive_path(hot_path)
+        target.parent.mkdir(exist_ok=True)
+        commit = lambda future: self.commit_archive(future, hot_path, target, config)
+        self.run_once(hot_path, commit, encode_archive_copy, str(hot_path), str(target),
+                      int(config.get('ARCHIVE_QUALITY', 80)), int(config.get('ARCHIVE_MAX_SIZE', 2560)))
+
+    def fit_to_display(self, hot_path, size, config):
+        """Replace a new download by a display-quality copy if it is well over size (width, height)."""
+        quality = int(config.get('HOT_TIER_QUALITY', 90) or 0)
+        if not quality:
+            return
+        hot_path = Path(hot_path)
+        try:
+            with Image.open(hot_path) as image:
+                width, height = image.size
+        except (OSError, Image.DecompressionBombError) as e:
+            logging.error(f"Failed to scale {hot_path} down: {e}")
+            return
+        if min(width / size[0], height / size[1]) <= DISPLAY_COPY_MARGIN:
+            return
+        before = hot_path.stat().st_size
+        commit = lambda future: self.commit_display_copy(future, hot_path, before, config)
+        self.run_once(hot_path, commit, encode_display_copy, str(hot_path), str(hot_path), quality, *size)
+
+    def run_once(self, hot_path, commit, task, *args):
+        """Run task in the pool unless hot_path is already being re-encoded; commit gets its future."""
+        with self.lock:
+            if hot_path in self.pending:
+                return
+            self.pending.add(hot_path)
+
+        def done(future):
+            try:
+                commit(future)
+            finally:
+                with self.lock:
+                    self.pending.discard(hot_path)
+        self.executor.submit(task, *args).add_done_callback(done)
+
+    def commit_display_copy(self, future, hot_path, before, config):
+        try:
+            future.result()
+            size = hot_path.stat().st_size
+            digest = hashlib.sha256()
+            with hot_path.open("rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        except Exception as e:
+            logging.error(f"Failed to scale {hot_path} down: {e}")
+            return
+        # History still describes the downloaded original
+        update_wallpaper_history(config['SAVE_LOCATION'], hot_path.stem, str(hot_path), size=size,
+                                sha256=digest.hexdigest())
+        logging.info(f"Scaled {hot_path.name} down to the display, {(before - size) // 1024} KB smaller")
+
+    def commit_archive(self, future, hot_path, target, config):
+        try:
+            future.result()
+            # One copy at a time, so a quota pass never deletes a copy another one just wrote
+            with self.commit_lock:
+                saved = hot_path.stat().st_size - target.stat().st_size
+                hot_path.unlink()
+                logging.info(f"Archived {hot_path.name}, {saved // 1024} KB smaller")
+                enforce_quota(target.parent, float(config.get('ARCHIVE_MAX_MB', 2048)) * 1024 * 1024)
+        except Exception as e:
+            logging.error(f"Failed to archive {hot_path}: {e}")
+
+def enforce_quota(directory, max_bytes):
+    """Delete the oldest archived copies until the folder fits in max_bytes."""
+    files = sorted(directory.glob(f"*{ARCHIVE_SUFFIX}"), key=os.path.getmtime)  # Not the .tmp files in progress
+    total = sum(path.stat().st_size for path in files)
+    for path in files:
+        if total <= max_bytes:
+            break
+        total -= path.stat().st_size
+        logging.info(f"Deleting {path.name}, tier over its quota")
+        path.unlink(missing_ok=True)
+
+archive_instance = None
+archive_lock = threading.Lock()
+
+def get_archive(config):
+    global archive_instance
+    with archive_lock:
+        if archive_instance is None:
+            archive_instance = WallpaperArchive(int(config.get('ARCHIVE_WORKERS', 2)))
+        return archive_instance
@@ -0,0 +1,26 @@
+import os
+from PIL import Image
+
+# Run in the processes of the archive pool (archive.py), so only Pillow is imported here
+
+def encode_archive_copy(source, target, quality, max_size):
+    """Re-encode an image as a downscaled WebP, the cold tier format."""
+    with Image.open(source) as image:
+        image.draft("RGB", (max_size, max_size))
+        image = image.convert("RGB")
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        temp_path = f"{target}.tmp"
+        image.save(temp_path, "WEBP", quality=quality, method=4)
+    os.replace(temp_path, target)
+
+def encode_display_copy(source, target, quality, width, height):
+    """Re-encode an image as a JPEG scaled down to just cover width x height, the hot tier format."""
+    with Image.open(source) as image:
+        image.draft("RGB", (width, height))
+        image = image.convert("RGB")
+        scale = max(width / image.width, height / image.height)
+        if scale < 1:
+            image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+        temp_path = f"{target}.tmp"
+        image.save(temp_path, "JPEG", quality=quality, optimize=True)
+    os.replace(temp_path, target)
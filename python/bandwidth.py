@@ -0,0 +1,191 @@
+import sys
+import json
+import time
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+import psutil
+from python.utils import per_location, write_atomic
+
+USAGE_FILE = "bandwidth_usage.json"
+CHUNK_SIZE = 64 * 1024
+# Seconds of traffic is_idle looks back over, and the shortest span a rate is measured on
+NETWORK_WINDOW = 30
+MIN_NETWORK_SPAN = 0.25
+
+class BandwidthUsage:
+    """Bytes downloaded per source today and this month, kept in bandwidth_usage.json."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.day = self.month = None
+        self.sources = {}
+        try:
+            if self.path.exists():
+                with self.path.open("r") as f:
+                    data = json.load(f)
+                self.day, self.month, self.sources = data["day"], data["month"], data["sources"]
+        except (json.JSONDecodeError, IOError, KeyError) as e:
+            logging.error(f"Error reading bandwidth usage: {e}")
+
+    def roll_over(self):
+        """Start new daily/monthly totals when the date moved on."""
+        day, month = time.strftime("%Y-%m-%d"), time.strftime("%Y-%m")
+        if month != self.month:
+            self.sources = {}
+        elif day != self.day:
+            for usage in self.sources.values():
+                usage["day"] = 0
+        self.day, self.month = day, month
+
+    def used(self, source):
+        """(bytes today, bytes this month) of a source."""
+        with self.lock:
+            self.roll_over()
+            usage = self.sources.get(source, {})
+            return usage.get("day", 0), usage.get("month", 0)
+
+    def add(self, source, amount):
+        with self.lock:
+            self.roll_over()
+            usage = self.sources.setdefault(source, {"day": 0, "month": 0})
+            usage["day"] += amount
+            usage["month"] += amount
+            try:
+                write_atomic(self.path, lambda f: json.dump({"day": self.day, "month": self.month,
+                                                             "sources": self.sources}, f, indent=4))
+            except IOError as e:
+                logging.error(f"Error saving bandwidth usage: {e}")
+
+class RateLimiter:
+    """Token bucket shared by every download, so together they stay under the cap."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.allowance = 0.0
+        self.updated = time.monotonic()
+
+    def consume(self, amount, rate):
+        """Block until amount bytes fit under rate bytes/second (0 means no cap)."""
+        if rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            # Allow bursts of up to one second worth of data
+            self.allowance = min(rate, self.allowance + (now - self.updated) * rate) - amount
+            self.updated = now
+            delay = -self.allowance / rate if self.allowance < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+rate_limiter = RateLimiter()
+# System-wide network counter samples of the last NETWORK_WINDOW seconds, for telling whether
+# something else is using the link: (monotonic time, bytes sent and received, own bytes so far)
+network_samples = deque()
+own_bytes = 0
+network_lock = threading.Lock()
+
+def get_usage_tracker(config):
+    return per_location(config, USAGE_FILE, BandwidthUsage)
+
+def get_rate_limit(config):
+    """Download cap in bytes/second, 0 for none."""
+    return int(float(config.get('BANDWIDTH_LIMIT_KBPS', "0") or 0) * 1024)
+
+def remaining_budget(config, source):
+    """Bytes the source may still download today/this month, None without a budget."""
+    budget = (config.get('BANDWIDTH_BUDGETS') or {}).get(source)
+    if not budget:
+        return None
+    day, month = get_usage_tracker(config).used(source)
+    remaining = []
+    if budget.get("daily_mb"):
+        remaining.append(int(float(budget["daily_mb"]) * 1024 * 1024) - day)
+    if budget.get("monthly_mb"):
+        remaining.append(int(float(budget["monthly_mb"]) * 1024 * 1024) - month)
+    return max(0, min(remaining)) if remaining else None
+
+def user_idle_seconds():
+    """Seconds since the last keyboard/mouse input, None where it cannot be told."""
+    if sys.platform != "win32":
+        return None
+    import ctypes
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+    info = LASTINPUTINFO()
+    info.cbSize = ctypes.sizeof(info)
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+        return None
+    return (ctypes.windll.kernel32.GetTickCount() - info.dwTime) / 1000
+
+def sample_network():
+    counters = psutil.net_io_counters()
+    return time.monotonic(), counters.bytes_sent + counters.bytes_recv, own_bytes
+
+def network_rate():
+    """Other programs' bytes/second over the last NETWORK_WINDOW seconds (sampled briefly without a recent sample).
+
+    Our own downloads in the window are subtracted, they are not foreground traffic.
+    """
+    with network_lock:
+        now, total, own = sample_network()
+        while network_samples and now - network_samples[0][0] > NETWORK_WINDOW:
+            network_samples.popleft()
+        if not network_samples:
+            network_samples.append((now, total, own))
+        if now - network_samples[0][0] < MIN_NETWORK_SPAN:
+            time.sleep(MIN_NETWORK_SPAN - (now - network_samples[0][0]))
+            now, total, own = sample_network()
+        if now - network_samples[-1][0] >= 1:
+            network_samples.append((now, total, own))  # At most one a second, the window stays small
+        started, started_total, started_own = network_samples[0]
+    others = max(0, total - started_total - (own - started_own))
+    return others / max(now - started, 1e-3)
+
+def is_idle(config):
+    """No recent input and no other traffic worth protecting, e.g. a video call."""
+    idle_seconds = user_idle_seconds()
+    if idle_seconds is not None and idle_seconds < float(config.get('IDLE_MINUTES', "5")) * 60:
+        return False
+    return network_rate() < float(config.get('IDLE_NETWORK_KBPS', "256")) * 1024
+
+def download_allowance(config, source):
+    """Largest download the source may start right now in bytes, None for no limit.
+
+    The remaining budget caps it, and outside idle windows so does LARGE_DOWNLOAD_MB.
+    """
+    allowance = remaining_budget(config, source)
+    large = int(float(config.get('LARGE_DOWNLOAD_MB', "100") or 0) * 1024 * 1024)
+    if large and not is_idle(config):
+        allowance = large if allowance is None else min(allowance, large)
+    return allowance
+
+def copy_limited(response, file, source, config, digest=None):
+    """Stream a requests response into file under the rate cap and record the bytes used.
+
+    digest (a hashlib object) is fed every chunk on the way. Returns the bytes copied.
+    """
+    rate = get_rate_limit(config)
+    copied = 0
+    while True:
+        chunk = response.raw.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        rate_limiter.consume(len(chunk), rate)
+        file.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+        copied += len(chunk)
+    record_usage(config, source, copied)
+    return copied
+
+def record_usage(config, source, amount):
+    """Count downloaded bytes against the source's budget; copy_limited does this itself."""
+    global own_bytes
+    with network_lock:
+        own_bytes += amount
+    get_usage_tracker(config).add(source, amount)
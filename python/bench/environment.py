@@ -0,0 +1,86 @@
+"""Isolated environment for running update cycles against the local fakes.
+
+Everything lives in a temporary WALLYOUNEED_HOME: config.json, .env, the
+save location and launchers for the fake DepotDownloader and Wallpaper
+Engine, so the user's own files are never touched.
+"""
+import os
+import sys
+import json
+import stat
+import tempfile
+import multiprocessing
+from pathlib import Path
+from python.bench.fakes import serve_fakes
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+def start_fakes(latency=0.0, bandwidth=0, image_bytes=2 * 1024 * 1024, package_bytes=8 * 1024 * 1024):
+    """Run the fake services in their own process so they do not skew our CPU time."""
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=serve_fakes,
+        args=(port_queue, latency, bandwidth, image_bytes, package_bytes),
+        daemon=True
+    )
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+def write_launcher(path, command):
+    """Write an executable wrapper around command, a .cmd on Windows and a shell script elsewhere."""
+    if os.name == "nt":
+        path = path.with_suffix(".cmd")
+        path.write_text("@" + " ".join(f'"{part}"' for part in command) + " %*\r\n")
+    else:
+        path.write_text("#!/bin/sh\nexec " + " ".join(f'"{part}"' for part in command) + ' "$@"\n')
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return path
+
+def prepare_environment(fake_url, overrides=None):
+    """Create the temporary home and point every external dependency at the fakes.
+
+    Must run before any python.* engine module is imported, they read config at import.
+    """
+    home = Path(tempfile.mkdtemp(prefix="wallyouneed-bench-"))
+    save_location = home / "save"
+    save_location.mkdir()
+
+    depot = write_launcher(home / "DepotDownloaderMod", [sys.executable, str(BENCH_DIR / "fake_depotdownloader.py")])
+    if os.name != "nt":
+        # Wallpaper Engine is looked up by exe name in SAVE_LOCATION; a script only runs outside Windows
+        write_launcher(save_location / "wallpaper64.exe", ["echo", "[fake] openWallpaper"])
+
+    config = {
+        "SAVE_LOCATION": str(save_location),
+        "SOURCE_UNSPLASH": True,
+        "SOURCE_PEXELS": True,
+        "SOURCE_WALLPAPER_ENGINE": True,
+        "CHECK_INTERVAL": "0",
+        "COLLECTIONS_URL": f"{fake_url}/workshop/?page={{page}}",
+        "WALLPAPER_DOWNLOAD_LIMIT": "1",
+        "MAX_WALLPAPERS": "5",
+        "SAVE_OLD_WALLPAPERS": False,
+        "UPDATE_RUNNING": False,
+        "UNSPLASH_API_URL": f"{fake_url}/unsplash",
+        "PEXELS_API_URL": f"{fake_url}/pexels",
+        "STEAM_API_URL": f"{fake_url}/steam",
+        "FEED_URLS": [f"{fake_url}/feed"],
+        "DEPOTDOWNLOADER_PATH": str(depot),
+        "WALLPAPER_ENGINE_SETTLE_SECONDS": "0"
+    }
+    config.update(overrides or {})
+    (home / "config.json").write_text(json.dumps(config, indent=4))
+    (home / ".env").write_text(
+        "UNSPLASH_ACCESS_KEY=bench\nPEXELS_API_KEY=bench\nUSERNAMES=bench\nPASSWORDS=bench\n"
+    )
+
+    os.environ["WALLYOUNEED_HOME"] = str(home)
+    os.environ["WALLYOUNEED_FAKE_CDN"] = fake_url
+    return home
+
+def load_engine():
+    """Import the engine against the prepared environment with a fake setter backend."""
+    from python import engine
+    from python.setter_backend import set_setter_backend, FakeSetterBackend
+    set_setter_backend(FakeSetterBackend())
+    return engine
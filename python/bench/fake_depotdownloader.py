@@ -0,0 +1,45 @@
+"""Stand-in for DepotDownloaderMod used by the benchmarks.
+
+Accepts the same arguments as the real tool, prints progress lines like it
+does and fetches the package from the fake CDN in WALLYOUNEED_FAKE_CDN.
+"""
+import os
+import sys
+import argparse
+import urllib.request
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-app")
+    parser.add_argument("-pubfile", required=True)
+    parser.add_argument("-verify-all", action="store_true")
+    parser.add_argument("-username")
+    parser.add_argument("-password")
+    parser.add_argument("-dir", required=True)
+    args = parser.parse_args()
+
+    print(f"Logging '{args.username}' into Steam3...", flush=True)
+    if args.password == "wrong":
+        # What the real tool prints for a rejected account
+        print("Failed to authenticate with Steam: InvalidPassword", flush=True)
+        return 1
+    print(f"Downloading depot for pubfile {args.pubfile}", flush=True)
+
+    os.makedirs(args.dir, exist_ok=True)
+    target = os.path.join(args.dir, "scene.pkg")
+    url = f"{os.environ['WALLYOUNEED_FAKE_CDN']}/cdn/{args.pubfile}.pkg"
+    written = 0
+    with urllib.request.urlopen(url) as response, open(target, "wb") as f:
+        while True:
+            chunk = response.read(256 * 1024)
+            if not chunk:
+                break
+            f.write(chunk)
+            written += len(chunk)
+            print(f"{written} bytes {target}", flush=True)
+
+    print("Total downloaded: {} bytes".format(written), flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from io import BytesIO
+from PIL import Image
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Wallpaper types a fake Workshop item can have, with their share of the catalogue
+WORKSHOP_TYPES = [("Scene", 6), ("Video", 3), ("Web", 1)]
+WORKSHOP_ITEMS_PER_PAGE = 30
+FEED_ITEMS = 50
+
+def fake_image_bytes(name, size):
+    """Deterministic image payload, so repeated runs transfer identical bytes.
+
+    A small real JPEG (random blocks seeded by the name, so every photo hashes
+    differently) padded after its end marker to the requested size.
+    """
+    seed = hashlib.sha256(name.encode("utf-8")).digest()
+    image = Image.frombytes("L", (8, 4), seed).resize((320, 160), Image.BILINEAR)
+    buffer = BytesIO()
+    image.save(buffer, "JPEG")
+    block = seed * (4096 // len(seed))
+    padding = max(size - buffer.tell(), 0)
+    return buffer.getvalue() + (block * (padding // len(block) + 1))[:padding]
+
+def workshop_item_details(pubfileid, package_bytes):
+    rng = random.Random(pubfileid)
+    kind = rng.choices([name for name, _ in WORKSHOP_TYPES], [weight for _, weight in WORKSHOP_TYPES])[0]
+    return {
+        "publishedfileid": pubfileid,
+        "result": 1,
+        "title": f"Fake wallpaper {pubfileid}",
+        "file_size": str(package_bytes),
+        "tags": [{"tag": kind}, {"tag": "Everyone"}]
+    }
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    """Stands in for every remote service the update cycle talks to.
+
+    /unsplash/photos/random     Unsplash random photos API
+    /pexels/v1/search           Pexels search API
+    /cdn/<name>                 image and Workshop package CDN, throttled
+    /workshop/?page=N           Workshop browse page HTML
+    /steam/ISteamRemoteStorage/GetPublishedFileDetails/v1/
+    /_stats, /_reset            bytes and requests served, for the benchmark
+    """
+
+    # Keep-alive, like the real services. Headers and body are written separately,
+    # so without TCP_NODELAY every response would wait for a delayed ACK
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def send_body(self, body, content_type, category, throttle=False, etag=None):
+        time.sleep(self.server.latency)
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.server.record(f"{category}_not_modified", 0)
+            return
+        # Open-ended ranges only ("bytes=N-"), what a resumed download asks for
+        requested = self.headers.get("Range", "")
+        offset = int(requested[len("bytes="):-1]) if requested.startswith("bytes=") and requested.endswith("-") else 0
+        if offset and offset >= len(body):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(body)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            self.server.record(category, 0)
+            return
+        if 0 < offset < len(body):
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {offset}-{len(body) - 1}/{len(body)}")
+            body = body[offset:]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        chunk_size = 64 * 1024
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            self.wfile.write(chunk)
+            if throttle and self.server.bandwidth:
+                time.sleep(len(chunk) / self.server.bandwidth)
+        self.server.record(category, len(body))
+
+    def send_json(self, data, category):
+        self.send_body(json.dumps(data).encode("utf-8"), "application/json", category)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == "/unsplash/photos/random":
+            count = int(query.get("count", ["1"])[0])
+            photos = []
+            for _ in range(count):
+                photo_id = f"u{random.randint(0, 10 ** 9)}"
+                photos.append({
+                    "id": photo_id,
+                    "user": {"username": "fake_user"},
+                    "width": 3840,
+                    "height": 2160,
+                    "urls": {"raw": f"{self.base_url()}/cdn/{photo_id}.jpg?ixid=fake",
+                             "full": f"{self.base_url()}/cdn/{photo_id}.jpg"}
+                })
+            self.send_json(photos, "api")
+        elif url.path == "/pexels/v1/search":
+            count = int(query.get("per_page", ["1"])[0])
+            photos = []
+            for _ in range(count):
+                photo_id = random.randint(0, 10 ** 9)
+                photos.append({
+                    "id": photo_id,
+                    "photographer": "Fake Photographer",
+                    "width": 3840,
+                    "height": 2160,
+                    "src": {"original": f"{self.base_url()}/cdn/p{photo_id}.jpg",
+                            "large2x": f"{self.base_url()}/cdn/p{photo_id}.jpg?w=1880"}
+                })
+            self.send_json({"photos": photos, "page": 1, "per_page": count}, "api")
+        elif url.path == "/feed":
+            # A fixed RSS feed with Media RSS renditions; it never changes, so revalidating it gets a 304
+            items = "".join(
+                f'<item><title>Image {i}</title><dc:creator>Fake Feed</dc:creator><media:group>'
+                f'<media:content url="{self.base_url()}/cdn/f{i}.jpg" medium="image" width="3840" height="2160"/>'
+                f'<media:content url="{self.base_url()}/cdn/f{i}.jpg?w=1920" medium="image" width="1920" height="1080"/>'
+                f'</media:group></item>'
+                for i in range(FEED_ITEMS)
+            )
+            body = (f'<?xml version="1.0"?><rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/" '
+                    f'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel><title>Fake feed</title>{items}'
+                    f'</channel></rss>')
+            self.send_body(body.encode("utf-8"), "application/rss+xml", "page", etag='"feed"')
+        elif url.path.startswith("/cdn/"):
+            name = url.path[len("/cdn/"):]
+            size = self.server.package_bytes if name.endswith(".pkg") else self.server.image_bytes
+            self.send_body(fake_image_bytes(name, size), "application/octet-stream", "cdn", throttle=True)
+        elif url.path.rstrip("/") == "/workshop":
+            page = int(query.get("page", ["1"])[0])
+            items = "".join(
+                f'<div class="workshopItem"><a href="https://steamcommunity.com/sharedfiles/filedetails/'
+                f'?id={page * 1000 + i}&searchtext=">item</a></div>'
+                for i in range(WORKSHOP_ITEMS_PER_PAGE)
+            )
+            # Pages never change, so revalidating one always gets a 304
+            self.send_body(f"<html><body>{items}</body></html>".encode("utf-8"), "text/html", "page",
+                           etag=f'"page-{page}"')
+        elif url.path == "/_stats":
+            with self.server.stats_lock:
+                stats = dict(self.server.stats)
+            body = json.dumps(stats).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+
+        if url.path == "/steam/ISteamRemoteStorage/GetPublishedFileDetails/v1/":
+            count = int(form.get("itemcount", ["0"])[0])
+            ids = [form[f"publishedfileids[{i}]"][0] for i in range(count) if f"publishedfileids[{i}]" in form]
+            details = [workshop_item_details(pubfileid, self.server.package_bytes) for pubfileid in ids]
+            self.send_json({"response": {"result": 1, "resultcount": len(details),
+                                         "publishedfiledetails": details}}, "api")
+        elif url.path == "/_reset":
+            with self.server.stats_lock:
+                self.server.stats.clear()
+            self.send_response(204)
+            self.end_headers()
+        else:
+            self.send_error(404)
+
+class FakeServices(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, bandwidth=0, image_bytes=2 * 1024 * 1024, package_bytes=8 * 1024 * 1024, port=0):
+        super().__init__(("127.0.0.1", port), FakeServicesHandler)
+        self.latency = latency
+        self.bandwidth = bandwidth  # bytes per second per response, 0 for unlimited
+        self.image_bytes = image_bytes
+        self.package_bytes = package_bytes
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+
+    def record(self, category, size):
+        with self.stats_lock:
+            self.stats[f"{category}_bytes"] = self.stats.get(f"{category}_bytes", 0) + size
+            self.stats[f"{category}_requests"] = self.stats.get(f"{category}_requests", 0) + 1
+
+def serve_fakes(port_queue, latency, bandwidth, image_bytes, package_bytes):
+    """Process entry point: start the fakes and report the port they listen on."""
+    server = FakeServices(latency, bandwidth, image_bytes, package_bytes)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
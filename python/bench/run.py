@@ -0,0 +1,140 @@
+"""End-to-end benchmark of the update cycle against local fakes.
+
+    python -m python.bench.run --cycles 20 --save-baseline main
+    python -m python.bench.run --cycles 20 --compare main
+
+Reports p50/p95 cycle latency, bytes transferred and CPU time per source,
+and can save the results as a baseline or compare against a saved one.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import urllib.request
+from pathlib import Path
+from python.bench.environment import BENCH_DIR, start_fakes, prepare_environment, load_engine
+from python.metrics import reset_metrics, snapshot
+from python.perceptual_hash import get_hash_index
+
+BASELINE_DIR = BENCH_DIR / "baselines"
+SOURCES = ["unsplash", "pexels", "wallpaper_engine", "feeds"]
+# Metrics where a higher number is a regression
+COMPARED_METRICS = ["p50_ms", "p95_ms", "cpu_ms", "bytes"]
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def fake_stats(fake_url, reset=False):
+    if reset:
+        urllib.request.urlopen(urllib.request.Request(f"{fake_url}/_reset", data=b"", method="POST"))
+        return {}
+    with urllib.request.urlopen(f"{fake_url}/_stats") as response:
+        return json.load(response)
+
+def cpu_seconds():
+    """CPU time of this process plus finished children (the fake DepotDownloader)."""
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+def run_cycle(engine, source, save_path):
+    engine.handle_provider_update(engine.PROVIDERS[source], save_path)
+
+def benchmark_source(engine, source, cycles, fake_url, save_path):
+    reset_metrics()
+    latencies, cpu_times, transferred = [], [], []
+    for _ in range(cycles):
+        fake_stats(fake_url, reset=True)
+        wall_start, cpu_start = time.perf_counter(), cpu_seconds()
+        run_cycle(engine, source, save_path)
+        latencies.append((time.perf_counter() - wall_start) * 1000)
+        cpu_times.append((cpu_seconds() - cpu_start) * 1000)
+        stats = fake_stats(fake_url)
+        transferred.append(sum(value for key, value in stats.items() if key.endswith("_bytes")))
+
+    stages = {stage: round(by_source[source]["sum"] / by_source[source]["count"] * 1000, 2)
+              for stage, by_source in snapshot()["stages"].items() if source in by_source}
+    return {
+        "cycles": cycles,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "cpu_ms": round(sum(cpu_times) / cycles, 2),
+        "bytes": int(sum(transferred) / cycles),
+        "stages_ms": stages
+    }
+
+def compare(results, baseline, threshold):
+    """Print the change against the baseline; returns False on a regression above threshold."""
+    ok = True
+    for source, metrics in results.items():
+        if source not in baseline:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = baseline[source][metric], metrics[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(f"{source:18} {metric:8} {old:>14} -> {new:>14} ({change:+.1%}){flag}")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--sources", default=",".join(SOURCES))
+    parser.add_argument("--latency-ms", type=float, default=20, help="added latency per request")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="CDN bandwidth cap, 0 for unlimited")
+    parser.add_argument("--image-kb", type=int, default=2048)
+    parser.add_argument("--package-kb", type=int, default=8192)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    fakes, fake_url = start_fakes(
+        latency=args.latency_ms / 1000,
+        bandwidth=int(args.bandwidth_kbps * 1024),
+        image_bytes=args.image_kb * 1024,
+        package_bytes=args.package_kb * 1024
+    )
+    home = prepare_environment(fake_url)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        engine = load_engine()
+        logging.getLogger().setLevel(logging.WARNING)
+        save_path = Path(engine.config['SAVE_LOCATION'])
+
+        results = {}
+        for source in args.sources.split(","):
+            results[source] = benchmark_source(engine, source, args.cycles, fake_url, save_path)
+            metrics = results[source]
+            print(f"{source:18} p50 {metrics['p50_ms']:>9.1f} ms  p95 {metrics['p95_ms']:>9.1f} ms  "
+                  f"cpu {metrics['cpu_ms']:>8.1f} ms  {metrics['bytes']:>11} bytes/cycle")
+            print("    " + "  ".join(f"{stage} {ms:.1f} ms" for stage, ms in metrics["stages_ms"].items()))
+        # Written now, the exit-time save would find the environment removed
+        get_hash_index(engine.config).flush()
+    finally:
+        fakes.terminate()
+        shutil.rmtree(home, ignore_errors=True)
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        baseline_file = BASELINE_DIR / f"{args.save_baseline}.json"
+        baseline_file.write_text(json.dumps(results, indent=4))
+        print(f"Baseline saved to {baseline_file}")
+
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
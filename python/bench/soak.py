@@ -0,0 +1,123 @@
+"""Soak test: thousands of back-to-back update cycles against the local fakes.
+
+    python -m python.bench.soak --cycles 2000
+
+Runs the real engine loop with CHECK_INTERVAL 0 and tracks RSS, traced
+Python memory, open file descriptors/handles and thread count. Growth
+after the warmup is checked against budgets; the exit code is 1 when one
+is exceeded.
+"""
+import os
+import sys
+import queue
+import shutil
+import logging
+import argparse
+import threading
+import tracemalloc
+import psutil
+from python.bench.environment import start_fakes, prepare_environment, load_engine
+from python.perceptual_hash import get_hash_index
+from python.setter_backend import get_setter_state
+
+def open_handles(process):
+    return process.num_handles() if os.name == "nt" else process.num_fds()
+
+def sample(process):
+    traced, _ = tracemalloc.get_traced_memory()
+    return {
+        "rss": process.memory_info().rss,
+        "traced": traced,
+        "handles": open_handles(process),
+        "threads": threading.active_count()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100, help="cycles before the baseline sample")
+    parser.add_argument("--sources", default="unsplash,pexels")
+    parser.add_argument("--image-kb", type=int, default=64)
+    parser.add_argument("--package-kb", type=int, default=256)
+    parser.add_argument("--rss-budget-mb", type=float, default=50)
+    parser.add_argument("--traced-budget-mb", type=float, default=10)
+    parser.add_argument("--handle-budget", type=int, default=10)
+    parser.add_argument("--thread-budget", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    fakes, fake_url = start_fakes(image_bytes=args.image_kb * 1024, package_bytes=args.package_kb * 1024)
+    home = prepare_environment(fake_url)
+    process = psutil.Process()
+    tracemalloc.start(10)
+
+    try:
+        engine = load_engine()
+        # Keep logging on so its cost is part of the soak, but out of the console
+        logger = logging.getLogger()
+        logger.handlers.clear()
+        logger.addHandler(logging.FileHandler(os.devnull))
+        logger.setLevel(logging.INFO)
+
+        engine.set_engine_sources(args.sources.split(","))
+        events = engine.subscribe_events()
+        loop = threading.Thread(target=engine.start_wallpaper_update, daemon=True)
+        engine.stop_event.clear()
+        loop.start()
+
+        finished = 0
+        baseline = baseline_snapshot = None
+        report_every = max(1, args.cycles // 20)
+        while finished < args.cycles:
+            try:
+                event = events.get(timeout=120)
+            except queue.Empty:
+                print("No cycle finished within 120 seconds, giving up.")
+                return 1
+            if event["event"] != "cycle_finished":
+                continue
+            finished += 1
+            get_setter_state().backend.calls.clear()  # The fake's call log is not the app's memory
+            if finished == args.warmup:
+                baseline = sample(process)
+                baseline_snapshot = tracemalloc.take_snapshot()
+            if finished % report_every == 0:
+                current = sample(process)
+                print(f"cycle {finished:>6}  rss {current['rss'] / 2 ** 20:8.1f} MB  "
+                      f"traced {current['traced'] / 2 ** 20:7.2f} MB  "
+                      f"handles {current['handles']:>4}  threads {current['threads']:>3}")
+
+        engine.stop_event.set()
+        loop.join(30)
+        # Written now, the exit-time save would find the environment removed
+        get_hash_index(engine.config).flush()
+        final = sample(process)
+        final_snapshot = tracemalloc.take_snapshot()
+    finally:
+        fakes.terminate()
+        shutil.rmtree(home, ignore_errors=True)
+
+    if baseline is None:
+        print("Fewer cycles than the warmup, nothing to compare.")
+        return 1
+
+    print("\nTop allocation growth since warmup:")
+    for stat in final_snapshot.compare_to(baseline_snapshot, "lineno")[:10]:
+        print(f"  {stat}")
+
+    budgets = {
+        "rss": args.rss_budget_mb * 2 ** 20,
+        "traced": args.traced_budget_mb * 2 ** 20,
+        "handles": args.handle_budget,
+        "threads": args.thread_budget
+    }
+    failed = False
+    print()
+    for name, budget in budgets.items():
+        growth = final[name] - baseline[name]
+        verdict = "ok" if growth <= budget else "OVER BUDGET"
+        failed = failed or growth > budget
+        print(f"{name:8} growth {growth:>14,} (budget {budget:>14,.0f})  {verdict}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
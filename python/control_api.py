@@ -0,0 +1,202 @@
+import json
+import queue
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from python import engine
+from python.utils import load_config, save_config
+from python.wallpaper_utils import load_wallpaper_history
+from python.metrics import snapshot, render_prometheus
+from python.profiling import request_profile
+from python.sources import PROVIDERS
+
+# Source names as used by the engine, mapped to their config switches
+SOURCE_CONFIG_KEYS = {name: provider.config_key for name, provider in PROVIDERS.items()}
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    """Local control API of the update engine.
+
+    GET  /status          what the engine is doing right now
+    GET  /sources         enabled state of every source
+    POST /sources         {"unsplash": true, ...} to toggle sources
+    POST /next            skip the wait and rotate now
+    POST /profile         profile the next cycle with cProfile and tracemalloc
+    GET  /history         applied wallpapers, newest first (?source=&limit=)
+    GET  /events          server-sent event stream of engine events
+    GET  /metrics         per-stage timings and counters (?format=prometheus for text)
+    """
+
+    server_version = "WallYouNeed"
+
+    def log_message(self, format, *args):
+        logging.debug(f"Control API: {format % args}")
+
+    def send_json(self, data, code=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_local_request(self):
+        # Reject other hostnames so a web page cannot reach us through DNS rebinding
+        port = self.server.server_address[1]
+        return self.headers.get("Host") in (f"127.0.0.1:{port}", f"localhost:{port}")
+
+    def do_GET(self):
+        if not self.is_local_request():
+            self.send_json({"error": "forbidden"}, 403)
+            return
+
+        url = urlparse(self.path)
+        if url.path == "/status":
+            self.send_json(engine.status)
+        elif url.path == "/sources":
+            self.send_json({name: name in engine.selected_sources for name in SOURCE_CONFIG_KEYS})
+        elif url.path == "/history":
+            self.send_history(parse_qs(url.query))
+        elif url.path == "/events":
+            self.stream_events()
+        elif url.path == "/metrics":
+            self.send_metrics(parse_qs(url.query))
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        # Browsers cannot send application/json cross-origin without a preflight we never answer
+        if not self.is_local_request() or self.headers.get("Content-Type") != "application/json":
+            self.send_json({"error": "forbidden"}, 403)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self.send_json({"error": "invalid JSON body"}, 400)
+            return
+
+        url = urlparse(self.path)
+        if url.path == "/next":
+            engine.request_next_wallpaper()
+            self.send_json({"ok": True})
+        elif url.path == "/sources":
+            self.update_sources(payload)
+        elif url.path == "/profile":
+            request_profile()
+            self.send_json({"ok": True})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def send_history(self, query):
+        history = load_wallpaper_history(engine.config['SAVE_LOCATION'])
+        entries = [{"id": key, **entry} for key, entry in history.items()]
+        source = query.get("source", [None])[0]
+        if source:
+            entries = [entry for entry in entries if entry.get("source") == source]
+        entries.sort(key=lambda entry: entry.get("timestamp", 0), reverse=True)
+        try:
+            limit = int(query.get("limit", ["50"])[0])
+        except ValueError:
+            limit = 50
+        self.send_json(entries[:limit])
+
+    def send_metrics(self, query):
+        if query.get("format", ["json"])[0] != "prometheus":
+            self.send_json(snapshot())
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def update_sources(self, payload):
+        if not isinstance(payload, dict):
+            self.send_json({"error": "expected an object of source names to booleans"}, 400)
+            return
+        unknown = [name for name in payload if name not in SOURCE_CONFIG_KEYS]
+        if unknown:
+            self.send_json({"error": f"unknown sources: {', '.join(unknown)}"}, 400)
+            return
+
+        # Start from the saved toggles, the engine has no sources yet while it was never started
+        config = load_config()
+        enabled = {name: bool(config.get(key, False)) for name, key in SOURCE_CONFIG_KEYS.items()}
+        enabled.update({name: bool(value) for name, value in payload.items()})
+
+        # Persisted for the next start; the GUI ticks its checkboxes from the sources_changed event
+        for name, key in SOURCE_CONFIG_KEYS.items():
+            config[key] = enabled[name]
+            engine.config[key] = enabled[name]
+        save_config(config)
+        engine.set_engine_sources([name for name, on in enabled.items() if on])
+        self.send_json(enabled)
+
+    def stream_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        event_queue = engine.subscribe_events()
+        try:
+            while True:
+                try:
+                    message = event_queue.get(timeout=15)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                self.wfile.write(f"event: {message['event']}\ndata: {json.dumps(message)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if message["event"] == "stopped":
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            engine.unsubscribe_events(event_queue)
+
+def start_control_api(config):
+    """Start the control API in a background thread if it is enabled in config.
+
+    Returns the server, or None when it is disabled or the port is taken.
+    """
+    if not config.get('CONTROL_API_ENABLED', False):
+        return None
+
+    port = int(config.get('CONTROL_API_PORT', 8765))
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), ControlRequestHandler)
+    except OSError as e:
+        logging.error(f"Failed to start control API on port {port}: {e}")
+        return None
+
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Control API listening on http://127.0.0.1:{port}")
+    return server
+
+def stop_control_api(server):
+    if server:
+        server.shutdown()
+        server.server_close()
+
+def run_headless():
+    """Run the engine without a GUI, controlled only through the API."""
+    config = load_config()
+    config['CONTROL_API_ENABLED'] = True
+    engine.set_engine_config(config)
+    engine.set_engine_sources([name for name, key in SOURCE_CONFIG_KEYS.items() if config.get(key, False)])
+    server = start_control_api(config)
+    try:
+        engine.start_wallpaper_update()
+    except KeyboardInterrupt:
+        engine.stop_event.set()
+    finally:
+        stop_control_api(server)
+
+if __name__ == "__main__":
+    run_headless()
@@ -0,0 +1,135 @@
+import os
+import time
+import heapq
+import random
+import logging
+import threading
+from collections import deque
+from dotenv import dotenv_values
+from python.utils import get_base_path
+
+ENV_FILE = ".env"
+DEFAULT_ENV = "# Add your API keys below\nUNSPLASH_ACCESS_KEY=\nPEXELS_API_KEY=\n"
+# Seconds a Steam account is skipped after a failed login, doubled for every further failure
+LOGIN_COOLDOWN = 15 * 60
+MAX_LOGIN_COOLDOWN = 24 * 60 * 60
+
+class Credentials:
+    """Secrets from .env, parsed once and again only when the file changes.
+
+    A value missing or empty in .env falls back to the process environment.
+    The Steam accounts (comma-separated USERNAMES/PASSWORDS) are kept parsed
+    and handed out round-robin. An account whose login failed is skipped for
+    a cooldown that grows with every failure. Skipped accounts are dropped from the rotation
+    lazily and return to it from a heap ordered by cooldown end, so handing
+    out an account is O(1) amortized however many are cooling down.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None
+        self.values = {}
+        self.passwords = {}     # username -> password
+        self.ready = deque()    # usernames in rotation order, possibly with cooling ones not yet dropped
+        self.queued = set()     # usernames in ready
+        self.cooling = []       # heap of (cooldown end, username)
+        self.health = {}        # username -> {"failures": count, "until": cooldown end}
+        self.lock = threading.RLock()
+
+    def refresh(self):
+        """Parse .env again if it changed since it was last read (creating it when missing)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            try:
+                with open(self.path, "w") as f:
+                    f.write(DEFAULT_ENV)
+                stat = os.stat(self.path)
+            except OSError as e:
+                logging.error(f"Cannot create {self.path}: {e}")
+                return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return
+        self.stamp = stamp
+        self.values = {name: value for name, value in dotenv_values(self.path).items() if value}
+        self.load_accounts()
+        logging.info("Credentials loaded")
+
+    def load_accounts(self):
+        usernames = [name.strip() for name in self.get_raw("USERNAMES").split(",")]
+        passwords = [password.strip() for password in self.get_raw("PASSWORDS").split(",")]
+        if len(usernames) != len(passwords):
+            logging.warning(f"{len(usernames)} Steam usernames but {len(passwords)} passwords, extra entries are ignored")
+        self.passwords = {username: password for username, password in zip(usernames, passwords)
+                          if username and password}
+        # Health survives a reload for the accounts still listed
+        self.health = {username: health for username, health in self.health.items() if username in self.passwords}
+        now = time.time()
+        order = random.sample(list(self.passwords), len(self.passwords))  # Spread the first logins over accounts
+        self.ready = deque(username for username in order if self.health.get(username, {}).get("until", 0) <= now)
+        self.queued = set(self.ready)
+        self.cooling = [(health["until"], username) for username, health in self.health.items()
+                        if health["until"] > now]
+        heapq.heapify(self.cooling)
+
+    def get_raw(self, name):
+        return self.values.get(name) or os.environ.get(name) or ""
+
+    def get(self, name, default=None):
+        with self.lock:
+            self.refresh()
+            return self.get_raw(name) or default
+
+    def next_account(self):
+        """(username, password) of the next account not cooling down, (None, None) when there is none."""
+        with self.lock:
+            self.refresh()
+            now = time.time()
+            while self.cooling and self.cooling[0][0] <= now:
+                until, username = heapq.heappop(self.cooling)
+                if username in self.passwords and username not in self.queued:
+                    self.ready.append(username)
+                    self.queued.add(username)
+            while self.ready:
+                username = self.ready.popleft()
+                if username not in self.passwords or self.health.get(username, {}).get("until", 0) > now:
+                    self.queued.discard(username)  # Cooling down (or gone), back from the heap later
+                    continue
+                self.ready.append(username)
+                return username, self.passwords[username]
+            return None, None
+
+    def has_account(self):
+        """Whether an account is available right now."""
+        with self.lock:
+            self.refresh()
+            now = time.time()
+            return any(self.health.get(username, {}).get("until", 0) <= now for username in self.passwords)
+
+    def mark_failed(self, username):
+        """Skip an account whose login failed, longer with every failure in a row."""
+        with self.lock:
+            if username not in self.passwords:
+                return
+            failures = self.health.get(username, {}).get("failures", 0) + 1
+            cooldown = min(LOGIN_COOLDOWN * 2 ** (failures - 1), MAX_LOGIN_COOLDOWN)
+            until = time.time() + cooldown
+            self.health[username] = {"failures": failures, "until": until}
+            heapq.heappush(self.cooling, (until, username))
+            logging.warning(f"Steam login failed for {username}, skipping it for {cooldown // 60} minutes")
+
+    def mark_ok(self, username):
+        with self.lock:
+            self.health.pop(username, None)
+
+credentials = None
+credentials_lock = threading.Lock()
+
+def get_credentials():
+    """The credentials of the .env next to config.json, shared by the whole process."""
+    global credentials
+    with credentials_lock:
+        if credentials is None:
+            credentials = Credentials(os.path.join(get_base_path(), ENV_FILE))
+        return credentials
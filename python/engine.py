@@ -0,0 +1,446 @@
+import os
+import threading
+import random
+import logging
+import queue
+import time
+from pathlib import Path
+from python.utils import load_config
+from python.registry_utils import set_wallpaper_style, set_lock_screen_wallpaper
+from python.wallpaper_setter import resolve_wallpaper_setter, apply_wallpaper, apply_spanned_wallpaper
+from python.metrics import timed, increment, dump_metrics
+from python.profiling import profile_cycle
+from python.perceptual_hash import check_near_duplicate
+from python.image_features import compute_features, get_feature_index, active_rules
+from python.local_library import get_local_library
+from python.bandwidth import remaining_budget, download_allowance
+from python.archive import get_archive, locate_wallpaper, restore_wallpaper, RESTORED_FILE
+from python.monitors import get_spanned_monitors, detect_monitors, match_images, stitch_spanned, SPANNED_FILE
+from python.providers import download_image
+from python.sources import PROVIDERS
+from python.wallpaper_engine import close_wallpaper_engine, set_downloaded_wallpaper, resolve_depot_path, \
+    download_workshop_item, apply_workshop_item
+from python.work_queue import get_work_queue, work_item_id, DOWNLOADED, APPLIED, DISCARDED, DEFERRED, MAX_ATTEMPTS, \
+    DEFERRED_MAX_AGE
+from python.wallpaper_utils import cleanup_old_wallpapers, append_wallpaper_history, \
+    track_wallpaper
+
+# Engine state, shared by the GUI update thread and the engine worker process
+stop_event = threading.Event()
+skip_event = threading.Event()
+selected_sources = []
+config = load_config()
+
+# Snapshot of what the engine is doing, served by the control API
+status = {
+    "running": False,
+    "sources": [],
+    "current_source": None,
+    "last_source": None,
+    "last_wallpaper": None,
+    "last_update": None,
+    "next_update": None,
+    "offline": False
+}
+
+# Download manifest fields kept in wallpaper_history.json
+MANIFEST_HISTORY_FIELDS = ["id", "photographer", "url", "size", "sha256", "downloaded_at", "download_seconds"]
+
+subscribers = []
+subscribers_lock = threading.Lock()
+
+def subscribe_events():
+    """Return a queue that receives every engine event from now on."""
+    event_queue = queue.Queue(maxsize=100)
+    with subscribers_lock:
+        subscribers.append(event_queue)
+    return event_queue
+
+def unsubscribe_events(event_queue):
+    with subscribers_lock:
+        if event_queue in subscribers:
+            subscribers.remove(event_queue)
+
+def publish_event(event, **data):
+    """Send an event to all subscribers, dropping it for the ones that fall behind."""
+    message = {"event": event, "time": time.time(), **data}
+    with subscribers_lock:
+        for event_queue in subscribers:
+            try:
+                event_queue.put_nowait(message)
+            except queue.Full:
+                pass
+
+def set_engine_sources(sources):
+    """Replace the list of sources the update loop picks from."""
+    global selected_sources
+    selected_sources = list(sources)
+    status["sources"] = list(selected_sources)
+    publish_event("sources_changed", sources=status["sources"])
+
+def request_next_wallpaper():
+    """Cut the current wait short and start the next update cycle now."""
+    skip_event.set()
+    publish_event("next_requested")
+
+def wait_for_next_cycle(interval):
+    """Sleep until the interval passes, the engine stops or a skip is requested."""
+    deadline = time.monotonic() + interval
+    while not stop_event.is_set() and not skip_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        skip_event.wait(min(remaining, 1))
+    skip_event.clear()
+
+def record_applied_wallpaper(source, wallpaper_path, key=None, manifest=None):
+    """Update status and history after a wallpaper has been set.
+
+    The download manifest, when the wallpaper was just fetched, goes into the history entry.
+    """
+    wallpaper_path = str(wallpaper_path)
+    now = time.time()
+    status["last_source"] = source
+    status["last_wallpaper"] = wallpaper_path
+    status["last_update"] = now
+    fresh = manifest is not None and str(manifest["path"]) == wallpaper_path
+    if fresh:
+        queue = get_work_queue(config)
+        if queue.state(work_item_id(source, manifest["id"])) is not None:  # Images set in place are not journaled
+            queue.record(work_item_id(source, manifest["id"]), APPLIED)
+    # Wallpaper Engine already logs its own downloads under the pubfile id
+    if source != "wallpaper_engine":
+        entry = {"source": source, "timestamp": now, "path": wallpaper_path}
+        if fresh:
+            entry.update({name: manifest[name] for name in MANIFEST_HISTORY_FIELDS})
+        append_wallpaper_history(config['SAVE_LOCATION'], key or Path(wallpaper_path).stem, entry,
+                                 int(config.get('HISTORY_MAX_ENTRIES', 1000)))
+    publish_event("wallpaper_set", source=source, path=wallpaper_path)
+
+def reject_near_duplicate(source, wallpaper_path):
+    """True when the downloaded image looks like one already seen; its copy is then removed."""
+    with timed("dedupe", source):
+        duplicate_of = check_near_duplicate(config, wallpaper_path)
+    if duplicate_of is None:
+        return False
+    increment("near_duplicates", source)
+    logging.info(f"Skipping {Path(wallpaper_path).name}, near-duplicate of {duplicate_of}")
+    # The same photo downloaded again overwrote the earlier file, keep that one
+    if duplicate_of != Path(wallpaper_path).stem:
+        Path(wallpaper_path).unlink(missing_ok=True)
+    return True
+
+def index_features(source, wallpaper_path):
+    """Add a new download to the feature index and return the index."""
+    index = get_feature_index(config)
+    with timed("features", source):
+        features = compute_features(wallpaper_path)
+        if features is not None:
+            index.add(source, wallpaper_path, features)
+    return index
+
+def choose_wallpaper(source, wallpaper_path):
+    """Index the new download's features and return what to set under the active rules.
+
+    That is the download itself when it matches (or no rule is active), otherwise
+    an earlier wallpaper from the feature index that does, if one is still on disk.
+    """
+    index = index_features(source, wallpaper_path)
+    rules = active_rules(config)
+    if not rules or index.matches(wallpaper_path, rules):
+        return wallpaper_path
+    alternative = index.pick(rules, exclude={str(wallpaper_path)}, locate=locate_wallpaper)
+    if alternative is None:
+        logging.info("No saved wallpaper matches the active selection rules, using the new download")
+        return wallpaper_path
+    logging.info(f"{Path(wallpaper_path).name} does not match the active selection rules, using {Path(alternative).name}")
+    return Path(alternative)
+
+def display_copy(wallpaper_path):
+    """The file to hand the setters for a wallpaper, a decoded copy when it is archived."""
+    return restore_wallpaper(wallpaper_path, Path(config['SAVE_LOCATION']) / RESTORED_FILE)
+
+def apply_spanned_wallpapers(provider, manifests, monitors, save_path):
+    """Give every monitor its own new image, stitched into one spanned wallpaper set in one step.
+
+    Images are matched to the monitors by aspect ratio, orientation and
+    resolution. Selection rules are not applied here, they pick single images.
+    """
+    source = provider.name
+    manifests = [manifest for manifest in manifests if not stop_event.is_set()
+                 and not (provider.dedupe and reject_near_duplicate(source, manifest["path"]))]
+    if not manifests or stop_event.is_set():
+        return
+    for manifest in manifests:
+        index_features(source, manifest["path"])
+    with timed("stitch", source):
+        paths = match_images([manifest["path"] for manifest in manifests], monitors)
+        if not paths:
+            return
+        spanned_path = stitch_spanned(paths, monitors, save_path / SPANNED_FILE)
+    with timed("wallpaper_set", source):
+        # Windows reads the style when the image is set, so it is written first
+        set_wallpaper_style(span=True)
+        set_lock_screen_wallpaper(paths[0])  # The primary monitor's image
+        apply_spanned_wallpaper(spanned_path)
+        close_wallpaper_engine()
+    logging.info(f"Spanned {len(set(paths))} wallpapers across {len(monitors)} monitors")
+    for manifest in manifests:
+        record_applied_wallpaper(source, manifest["path"], manifest=manifest)
+
+def apply_new_wallpaper(provider, manifest):
+    """Set a new download, unless it is a near-duplicate; the selection rules may pick another."""
+    source = provider.name
+    wallpaper_path = manifest["path"]
+    if stop_event.is_set() or (provider.dedupe and reject_near_duplicate(source, wallpaper_path)):
+        return
+    wallpaper_path = choose_wallpaper(source, wallpaper_path)
+    with timed("wallpaper_set", source):
+        display_path = display_copy(wallpaper_path)
+        set_wallpaper_style()
+        set_lock_screen_wallpaper(display_path)
+        provider.apply(display_path)
+        close_wallpaper_engine()
+    record_applied_wallpaper(source, wallpaper_path, manifest=manifest)
+
+def apply_played_wallpapers(provider, manifests):
+    """Set items another program plays (Wallpaper Engine projects) one after the other."""
+    for manifest in manifests:
+        if stop_event.is_set():
+            return
+        with timed("wallpaper_set", provider.name):
+            wallpaper_set = provider.apply(manifest["path"])
+        if wallpaper_set:
+            record_applied_wallpaper(provider.name, manifest["path"], manifest=manifest)
+
+def finish_work_items(source):
+    """End the journal entries of a source's handled batch; downloads that were not set stay in the library.
+
+    When the engine is stopping they stay open, to be set on the next start.
+    """
+    if stop_event.is_set():
+        return
+    queue = get_work_queue(config)
+    for item in queue.unfinished([source]):
+        if item["state"] == DOWNLOADED:
+            queue.record(item["id"], DISCARDED)
+
+def waiting_for_allowance(queue, item, allowances):
+    """Whether a deferred download still does not fit its source's allowance (cached in allowances).
+
+    Deferred items older than DEFERRED_MAX_AGE are discarded instead.
+    """
+    if item["state"] != DEFERRED:
+        return False
+    if time.time() - item.get("deferred_at", item["time"]) > DEFERRED_MAX_AGE:
+        queue.discard(item["id"])
+        return True
+    if item["source"] not in allowances:
+        allowances[item["source"]] = download_allowance(config, item["source"])
+    allowance = allowances[item["source"]]
+    return allowance is not None and item.get("size", 0) > allowance
+
+def resume_interrupted_work(sources):
+    """Finish the downloads a crash or close interrupted before fetching anything new.
+
+    Partial images continue where they stopped, Workshop items run DepotDownloader
+    again on their folder; items that failed MAX_ATTEMPTS times are cleaned up.
+    Downloads deferred for the allowance are picked up once it covers them.
+    The newest finished item is set and returns True, it is the cycle's update.
+    """
+    queue = get_work_queue(config)
+    allowances = {}
+    items = [item for item in queue.unfinished(sources) if not waiting_for_allowance(queue, item, allowances)]
+    if not items:
+        return False
+    logging.info(f"Resuming {len(items)} interrupted downloads")
+    ready = []  # (item, manifest or Workshop wallpaper path)
+    for item in items:
+        if stop_event.is_set():
+            return False
+        if item["state"] != DOWNLOADED and item.get("attempts", 0) >= MAX_ATTEMPTS:
+            logging.warning(f"Cleaning up {item['id']}, it failed {MAX_ATTEMPTS} times")
+            queue.discard(item["id"])
+            continue
+        if item["source"] == "wallpaper_engine":
+            wallpaper_path = item.get("wallpaper") if item["state"] == DOWNLOADED else None
+            if wallpaper_path is None:
+                depot_path = resolve_depot_path(config)
+                wallpaper_path = depot_path and download_workshop_item(item["pubfileid"], depot_path, config, stop_event)
+            if wallpaper_path:
+                ready.append((item, wallpaper_path))
+            continue
+        if item["source"] not in PROVIDERS:
+            queue.discard(item["id"])  # Left by a source that no longer exists
+            continue
+        manifest = item.get("manifest") if item["state"] == DOWNLOADED else None
+        if manifest is None:
+            manifest = download_image(PROVIDERS[item["source"]], config, item["wallpaper"], Path(item["path"]).parent)
+        if manifest and os.path.exists(manifest["path"]):
+            manifest = {**manifest, "path": Path(manifest["path"])}
+            track_wallpaper(manifest["path"])
+            ready.append((item, manifest))
+        elif manifest:
+            queue.record(item["id"], DISCARDED)  # Deleted since
+    if not ready or stop_event.is_set():
+        return False
+
+    last_update = status["last_update"]
+    item, result = ready[-1]
+    if item["source"] == "wallpaper_engine":
+        if apply_workshop_item(item["pubfileid"], result, config):
+            record_applied_wallpaper("wallpaper_engine", result)
+    else:
+        apply_new_wallpaper(PROVIDERS[item["source"]], result)
+    for source in {item["source"] for item, _ in ready}:
+        finish_work_items(source)
+    return status["last_update"] != last_update
+
+def cleanup_images(directory):
+    """Drop images past MAX_WALLPAPERS (and HOT_TIER_MAX_MB), archiving them with SAVE_OLD_WALLPAPERS."""
+    archive = None
+    if config.get('SAVE_OLD_WALLPAPERS', False):
+        archive = lambda path: get_archive(config).submit(path, config)
+    cleanup_old_wallpapers(directory, int(config['MAX_WALLPAPERS']), archive,
+                           int(float(config.get('HOT_TIER_MAX_MB', 0) or 0) * 1024 * 1024))
+
+def is_source_available(source):
+    """Whether a source can fetch at all, e.g. has its API keys or folders configured."""
+    return source in PROVIDERS and PROVIDERS[source].is_available(config)
+
+def set_offline(offline):
+    """Track whether wallpapers currently come from the local library."""
+    if status["offline"] != offline:
+        status["offline"] = offline
+        logging.info("Rotating from the local library" if offline else "Back online")
+        publish_event("offline" if offline else "online")
+
+def set_engine_config(new_config=None):
+    """Use the given config, or reload it from disk when none is passed."""
+    global config
+    config = new_config if new_config is not None else load_config()
+
+def start_wallpaper_update():
+    """Main wallpaper update loop, runs until stop_event is set."""
+    logging.info("Wallpaper update thread started")
+    resolve_wallpaper_setter()
+    status["running"] = True
+    publish_event("started")
+
+    while not stop_event.is_set():
+        try:
+            current_sources = selected_sources.copy()
+            save_location_path = Path(config['SAVE_LOCATION'])
+
+            if not current_sources:
+                logging.warning("No sources selected in current iteration")
+                time.sleep(5)
+                continue
+
+            # Sources without keys would only fail, OFFLINE_MODE "always" skips the network entirely
+            offline_mode = config.get('OFFLINE_MODE', "auto")
+            online_sources = [name for name in current_sources
+                              if is_source_available(name) and remaining_budget(config, name) != 0]
+            source = random.choice(online_sources) if online_sources and offline_mode != "always" else None
+            label = source or "local"
+            logging.info(f"Randomly chosen source: {label} from {current_sources}")
+            status["current_source"] = label
+            publish_event("cycle_started", source=label)
+
+            last_update = status["last_update"]
+            with profile_cycle(config, label), timed("cycle", label):
+                # Work a crash or close interrupted comes first, a wallpaper set from it is this cycle's update
+                if source and resume_interrupted_work(current_sources):
+                    logging.info("Set a resumed download, nothing new fetched this cycle")
+                elif source:
+                    handle_provider_update(PROVIDERS[source], save_location_path)
+                if source and status["last_update"] != last_update:
+                    set_offline(False)
+                elif offline_mode != "never" and not stop_event.is_set():
+                    # Nothing new came in (network down, API errors, duplicates), rotate from disk
+                    handle_offline_update(current_sources)
+            if config.get('METRICS_FILE'):
+                dump_metrics(config['METRICS_FILE'])
+
+            status["current_source"] = None
+            interval = int(config['CHECK_INTERVAL'])
+            status["next_update"] = time.time() + interval
+            publish_event("cycle_finished", source=label, next_update=status["next_update"])
+            logging.info(f"Sleeping for {interval} seconds before the next update.")
+            wait_for_next_cycle(interval)
+
+        except Exception as e:
+            logging.error(f"Exception in update thread: {e}", exc_info=True)
+            time.sleep(5)
+
+    status["running"] = False
+    status["current_source"] = None
+    status["next_update"] = None
+    publish_event("stopped")
+
+def handle_offline_update(sources):
+    """Set the next wallpaper of the local library, without touching the network."""
+    try:
+        with timed("library_pick", "local"):
+            source, wallpaper_path = get_local_library(config).next_wallpaper(sources)
+        if wallpaper_path is None:
+            logging.warning("No wallpaper was fetched and the local library is empty")
+            return
+        set_offline(True)
+        with timed("wallpaper_set", "local"):
+            if source == "wallpaper_engine":
+                if not set_downloaded_wallpaper(str(wallpaper_path)):
+                    return
+            else:
+                display_path = display_copy(wallpaper_path)
+                set_wallpaper_style()
+                set_lock_screen_wallpaper(display_path)
+                apply_wallpaper(display_path)
+                close_wallpaper_engine()
+        record_applied_wallpaper(source, wallpaper_path)
+    except Exception as e:
+        increment("cycle_errors", "local")
+        logging.error(f"Offline rotation failed: {str(e)}", exc_info=True)
+
+def handle_provider_update(provider, save_path):
+    """One update cycle of a provider: fetch, download, then set (or span) the new wallpapers."""
+    source = provider.name
+    try:
+        # One image per monitor in multi-monitor mode, fetched with a single batched call
+        monitors = get_spanned_monitors(config) if provider.spans else []
+        items = provider.fetch(config, provider.fetch_count(config, monitors), stop_event)
+        if not items or stop_event.is_set():
+            return
+
+        # Renditions and the kept copies only need to cover the largest monitor; full size when it is not known.
+        # The layout is only read with MULTI_MONITOR on
+        directory = save_path / provider.folder if provider.folder else None
+        displays = monitors or (detect_monitors() if directory and config.get('MULTI_MONITOR', False) else [])
+        size = max(((monitor["width"], monitor["height"]) for monitor in displays),
+                   key=lambda size: size[0] * size[1], default=None)
+        manifests = provider.download(config, items, directory, size, stop_event)
+        if directory:
+            for manifest in manifests:
+                track_wallpaper(manifest["path"])
+
+        if monitors:
+            apply_spanned_wallpapers(provider, manifests, monitors, save_path)
+        elif not provider.desktop_image:
+            apply_played_wallpapers(provider, manifests)
+        elif manifests:
+            apply_new_wallpaper(provider, manifests[-1])
+        finish_work_items(source)
+
+        if directory:
+            # The hot tier is kept at display quality only where old wallpapers are archived
+            if size and config.get('SAVE_OLD_WALLPAPERS', False):
+                for manifest in manifests:
+                    if os.path.exists(manifest["path"]):  # Not a rejected near-duplicate
+                        get_archive(config).fit_to_display(manifest["path"], size, config)
+            with timed("cleanup", source):
+                cleanup_images(directory)
+        else:
+            provider.cleanup(config, save_path)
+    except Exception as e:
+        increment("cycle_errors", source)
+        logging.error(f"{provider.label} failed: {str(e)}", exc_info=True)
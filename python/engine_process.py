@@ -0,0 +1,236 @@
+import os
+import sys
+import logging
+import secrets
+import subprocess
+import threading
+from pathlib import Path
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+
+ENGINE_WORKER_FLAG = "--engine-worker"
+ENGINE_PORT_ENV = "WALLYOUNEED_ENGINE_PORT"
+ENGINE_AUTHKEY_ENV = "WALLYOUNEED_ENGINE_AUTHKEY"
+
+class ConnectionLogHandler(logging.Handler):
+    """Forward log records from the worker process to the GUI."""
+
+    def __init__(self, conn, send_lock):
+        logging.Handler.__init__(self)
+        self.conn = conn
+        self.send_lock = send_lock
+
+    def emit(self, record):
+        try:
+            with self.send_lock:
+                self.conn.send(("log", record.levelno, record.getMessage()))
+        except (OSError, EOFError):
+            pass  # GUI went away, nothing left to log to
+
+def run_engine_worker():
+    """Entry point of the engine worker process.
+
+    Connects back to the GUI, then serves start/stop/config/shutdown commands
+    until told to shut down or the GUI disappears. The control API runs for
+    as long as the worker does, also while the update loop is stopped.
+    """
+    # Import here so the GUI only pays for the engine modules in the worker
+    from python import engine
+    from python.control_api import start_control_api, stop_control_api
+    from python.wallpaper_utils import terminate_depotdownloader
+
+    port = int(os.environ[ENGINE_PORT_ENV])
+    authkey = bytes.fromhex(os.environ[ENGINE_AUTHKEY_ENV])
+    conn = Client(("127.0.0.1", port), authkey=authkey)
+    send_lock = threading.Lock()
+
+    logger = logging.getLogger()
+    logger.handlers.clear()
+    logger.addHandler(ConnectionLogHandler(conn, send_lock))
+    logger.setLevel(logging.INFO)
+
+    def send_status(state):
+        with send_lock:
+            conn.send(("status", state))
+
+    def forward_source_changes(events):
+        """Tell the GUI about sources toggled through the control API, so its checkboxes follow."""
+        while True:
+            message = events.get()
+            if message["event"] != "sources_changed":
+                continue
+            try:
+                with send_lock:
+                    conn.send(("sources", message["sources"]))
+            except (OSError, EOFError):
+                return
+
+    update_thread = None
+    control_server = None
+    control_settings = None
+
+    def update_control_api():
+        """(Re)start the control API when it was switched on or off or moved to another port."""
+        nonlocal control_server, control_settings
+        settings = (engine.config.get('CONTROL_API_ENABLED', False), engine.config.get('CONTROL_API_PORT', 8765))
+        if settings == control_settings:
+            return
+        stop_control_api(control_server)
+        control_server = start_control_api(engine.config)
+        control_settings = settings
+
+    def stop_update_thread():
+        nonlocal update_thread
+        if update_thread and update_thread.is_alive():
+            engine.stop_event.set()
+            terminate_depotdownloader()
+            update_thread.join()
+        update_thread = None
+
+    engine.set_engine_config()
+    threading.Thread(target=forward_source_changes, args=(engine.subscribe_events(),), daemon=True).start()
+    update_control_api()
+    send_status("ready")
+    try:
+        while True:
+            try:
+                command, *args = conn.recv()
+            except (EOFError, OSError):
+                logging.info("GUI connection closed, shutting down engine worker.")
+                break
+
+            if command == "start":
+                engine.set_engine_config()
+                update_control_api()
+                engine.set_engine_sources(args[0])
+                if not (update_thread and update_thread.is_alive()):
+                    engine.stop_event.clear()
+                    update_thread = threading.Thread(target=engine.start_wallpaper_update, daemon=True)
+                    update_thread.start()
+                send_status("running")
+            elif command == "stop":
+                stop_update_thread()
+                send_status("stopped")
+            elif command == "config":
+                engine.set_engine_config()
+                update_control_api()
+                if args:
+                    engine.set_engine_sources(args[0])
+            elif command == "shutdown":
+                break
+            else:
+                logging.warning(f"Unknown engine command: {command}")
+    finally:
+        stop_update_thread()
+        stop_control_api(control_server)
+        conn.close()
+
+class EngineProcess:
+    """GUI-side handle of the engine worker process.
+
+    Messages from the worker ("log", "status") and an ("exited", returncode)
+    message when it dies are put on event_queue for the Tk loop to drain.
+    """
+
+    def __init__(self, event_queue):
+        self.event_queue = event_queue
+        self.process = None
+        self.listener = None
+        self.conn = None
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        authkey = secrets.token_bytes(32)
+        self.listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        self.conn = None
+        self.pending = []
+
+        env = os.environ.copy()
+        env[ENGINE_PORT_ENV] = str(self.listener.address[1])
+        env[ENGINE_AUTHKEY_ENV] = authkey.hex()
+
+        if getattr(sys, 'frozen', False):
+            command = [sys.executable, ENGINE_WORKER_FLAG]
+            cwd = os.path.dirname(sys.executable)
+        else:
+            command = [sys.executable, "-m", "python.engine_process"]
+            cwd = str(Path(__file__).resolve().parent.parent)
+
+        self.process = subprocess.Popen(
+            command,
+            cwd=cwd,
+            env=env,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+        )
+        logging.info(f"Engine worker process started (PID: {self.process.pid})")
+        threading.Thread(target=self._reader, args=(self.listener, self.process), daemon=True).start()
+        threading.Thread(target=self._watch_startup, args=(self.listener, self.process, authkey), daemon=True).start()
+
+    def _watch_startup(self, listener, process, authkey):
+        """Wake _reader up when the worker dies before it connected, so its exit is still reported."""
+        process.wait()
+        with self.lock:
+            if self.conn is not None:
+                return
+        try:
+            Client(listener.address, authkey=authkey).close()
+        except (OSError, EOFError, AuthenticationError):
+            pass  # _reader is past accept already
+
+    def _reader(self, listener, process):
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, AuthenticationError):
+            self.event_queue.put(("exited", process.poll()))
+            return
+        finally:
+            listener.close()
+        if process.poll() is not None:
+            conn.close()  # Our own wake-up connection, the worker never connected
+            self.event_queue.put(("exited", process.returncode))
+            return
+
+        with self.lock:
+            self.conn = conn
+            for command in self.pending:
+                conn.send(command)
+            self.pending = []
+
+        while True:
+            try:
+                self.event_queue.put(conn.recv())
+            except (EOFError, OSError):
+                break
+        process.wait()
+        self.event_queue.put(("exited", process.returncode))
+
+    def send(self, *command):
+        """Send a command, queueing it until the worker has connected."""
+        with self.lock:
+            if self.conn is None:
+                self.pending.append(command)
+                return
+            try:
+                self.conn.send(command)
+            except (OSError, EOFError) as e:
+                logging.error(f"Failed to send {command[0]} to engine worker: {e}")
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout=5):
+        """Ask the worker to shut down, killing it if it does not exit in time."""
+        if not self.is_alive():
+            return
+        self.send("shutdown")
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logging.warning("Engine worker did not exit in time, killing it.")
+            self.process.kill()
+        if self.conn is None and self.listener is not None:
+            self.listener.close()
+
+if __name__ == "__main__":
+    run_engine_worker()
@@ -0,0 +1,132 @@
+import os
+import random
+import hashlib
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from urllib.parse import urlparse
+import requests
+from python.metrics import timed
+from python.http_session import conditional_get
+from python.local_library import IMAGE_SUFFIXES
+from python.archive import ARCHIVE_DIR
+from python.providers import WallpaperProvider
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+MEDIA = "{http://search.yahoo.com/mrss/}"
+DC = "{http://purl.org/dc/elements/1.1/}"
+
+def is_image(url, mime_type=None, medium=None):
+    if medium:
+        return medium == "image"
+    if mime_type:
+        return mime_type.startswith("image/")
+    return os.path.splitext(urlparse(url).path)[1].lower() in IMAGE_SUFFIXES
+
+def media_renditions(element):
+    """(width, height, url) of the images of media:content elements, also inside media:group."""
+    renditions = []
+    for content in element.iter(f"{MEDIA}content"):
+        url = content.get("url")
+        if url and is_image(url, content.get("type"), content.get("medium")):
+            renditions.append((int(content.get("width") or 0), int(content.get("height") or 0), url))
+    return renditions
+
+def parse_feed(body):
+    """Image entries of an RSS 2.0 or Atom feed as items, with every size the feed offers as renditions.
+
+    Images come from enclosures and Media RSS content; entries without one are skipped.
+    """
+    root = ET.fromstring(body)
+    feed_title = root.findtext("channel/title") or root.findtext(f"{ATOM}title")
+    items = []
+    for entry in root.findall("channel/item") + root.findall(f"{ATOM}entry"):
+        renditions = media_renditions(entry)
+        for enclosure in entry.findall("enclosure"):
+            if enclosure.get("url") and is_image(enclosure.get("url"), enclosure.get("type")):
+                renditions.append((0, 0, enclosure.get("url")))
+        for link in entry.findall(f"{ATOM}link"):
+            if link.get("rel") == "enclosure" and link.get("href") and is_image(link.get("href"), link.get("type")):
+                renditions.append((0, 0, link.get("href")))
+        if not renditions:
+            continue
+        # Largest first, sizes the feed does not state count as the largest
+        renditions.sort(key=lambda rendition: (rendition[0] or float("inf")) * (rendition[1] or float("inf")),
+                        reverse=True)
+        author = entry.findtext(f"{DC}creator") or entry.findtext("author") or \
+            entry.findtext(f"{ATOM}author/{ATOM}name") or feed_title
+        url = renditions[0][2]
+        items.append({"id": hashlib.sha1(url.encode("utf-8")).hexdigest()[:16], "photographer": author,
+                      "url": url, "renditions": renditions})
+    return items
+
+class FeedProvider(WallpaperProvider):
+    """Images of RSS/Atom feeds (FEED_URLS), e.g. photo-of-the-day feeds or a gallery's export.
+
+    Feeds are revalidated with their ETag/Last-Modified, so an unchanged feed
+    costs a 304 and is not parsed again. Images not downloaded before are
+    preferred, so a feed is worked through before anything repeats.
+    """
+
+    name = "feeds"
+    label = "RSS/Atom feeds"
+    folder = "feed_wallpapers"
+
+    def __init__(self):
+        self.parsed = {}  # feed url -> (validator, items)
+        self.lock = threading.Lock()
+
+    def is_available(self, config):
+        return bool(config.get('FEED_URLS'))
+
+    def fetch_feed(self, url, config):
+        try:
+            with timed("api_fetch", self.name):
+                response = conditional_get(url, config, self.name)
+                response.raise_for_status()
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            with self.lock:
+                cached = self.parsed.get(url)
+            if validator and cached and cached[0] == validator:
+                return cached[1]
+            with timed("parse", self.name):
+                items = parse_feed(response.content)
+            with self.lock:
+                self.parsed[url] = (validator, items)
+            return items
+        except (requests.RequestException, ET.ParseError) as e:
+            logging.error(f"Failed to fetch feed {url}: {e}")
+            return []
+
+    def fetch(self, config, count, stop_event=None):
+        items = []
+        for url in config.get('FEED_URLS') or []:
+            if stop_event and stop_event.is_set():
+                return []
+            items += self.fetch_feed(url, config)
+        if not items:
+            return []
+        directory = Path(config['SAVE_LOCATION']) / self.folder
+        unseen = [item for item in items
+                  if not (directory / self.file_name(item)).exists()
+                  and not (directory / ARCHIVE_DIR / self.file_name(item)).exists()]
+        chosen = random.sample(unseen or items, min(count, len(unseen or items)))
+        logging.info(f"Picked {len(chosen)} of {len(items)} feed images ({len(unseen)} new).")
+        return [dict(item) for item in chosen]
+
+    def select_rendition(self, item, size=None):
+        """The smallest size the feed offers that covers size, the largest one otherwise."""
+        renditions = item.get("renditions") or [(0, 0, item["url"])]
+        if size is not None:
+            covering = [rendition for rendition in renditions
+                        if rendition[0] >= size[0] and rendition[1] >= size[1]]
+            if covering:
+                return covering[-1][2]
+        return renditions[0][2]
+
+    def file_name(self, item):
+        # Named after the largest rendition, so it does not depend on the one chosen
+        renditions = item.get("renditions") or [(0, 0, item["url"])]
+        suffix = os.path.splitext(urlparse(renditions[0][2]).path)[1].lower()
+        return Path(super().file_name(item)).stem + (suffix if suffix in IMAGE_SUFFIXES else ".jpg")
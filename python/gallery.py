@@ -0,0 +1,145 @@
+import time
+import queue
+import tkinter as tk
+from tkinter import ttk
+from python.wallpaper_utils import load_wallpaper_history
+from python.thumbnails import ThumbnailCache, THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT
+
+CELL_PADDING = 8
+CELL_WIDTH = THUMBNAIL_WIDTH + CELL_PADDING
+CELL_HEIGHT = THUMBNAIL_HEIGHT + CELL_PADDING
+
+class HistoryGallery(ttk.Frame):
+    """Grid of past wallpapers, newest first.
+
+    Only the rows in view (plus one above and below) exist on the canvas, so
+    scrolling through thousands of entries costs the same as a screenful.
+    Thumbnails come from the ThumbnailCache; missing ones are drawn as
+    placeholders and filled in when the background pool has rendered them.
+    """
+
+    def __init__(self, parent, config):
+        super().__init__(parent)
+        self.config = config
+        self.cache = ThumbnailCache(config['SAVE_LOCATION'], int(config.get('THUMBNAIL_MAX_ENTRIES', 4000)))
+        self.entries = []
+        self.images = {}   # index -> PhotoImage, only for items on screen
+        self.drawn = {}    # index -> canvas item ids
+        self.selected = None
+        self.ready = queue.Queue()
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, background="#202020")
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.details = ttk.Label(self, text="", anchor="w")
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.details.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", lambda event: self.layout())
+        self.canvas.bind("<MouseWheel>", lambda event: self.on_scroll("scroll", -event.delta // 120, "units"))
+        # X11 sends the wheel as buttons 4 (up) and 5 (down)
+        self.canvas.bind("<Button-4>", lambda event: self.on_scroll("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda event: self.on_scroll("scroll", 1, "units"))
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.after(100, self.poll_ready)
+
+    def reload(self):
+        """Read the history again, e.g. when the tab is shown."""
+        history = load_wallpaper_history(self.config['SAVE_LOCATION'])
+        entries = sorted(history.items(), key=lambda item: item[1].get("timestamp", 0), reverse=True)
+        self.entries = [{"id": key, **entry} for key, entry in entries if entry.get("path")]
+        self.clear()
+        self.layout()
+
+    def columns(self):
+        return max(1, self.canvas.winfo_width() // CELL_WIDTH)
+
+    def layout(self):
+        rows = -(-len(self.entries) // self.columns())
+        self.canvas.configure(scrollregion=(0, 0, self.columns() * CELL_WIDTH, rows * CELL_HEIGHT),
+                              yscrollincrement=CELL_HEIGHT)
+        self.clear()  # Column count may have changed
+        self.draw_visible()
+
+    def clear(self):
+        self.canvas.delete("all")
+        self.drawn.clear()
+        self.images.clear()
+
+    def on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.draw_visible()
+
+    def visible_range(self):
+        """Indexes of the entries in the visible rows, one extra row on each side."""
+        columns = self.columns()
+        top = self.canvas.canvasy(0)
+        first_row = max(0, int(top // CELL_HEIGHT) - 1)
+        last_row = int((top + self.canvas.winfo_height()) // CELL_HEIGHT) + 1
+        return range(first_row * columns, min(len(self.entries), (last_row + 1) * columns))
+
+    def draw_visible(self):
+        visible = self.visible_range()
+        for index in [index for index in self.drawn if index not in visible]:
+            for item in self.drawn.pop(index):
+                self.canvas.delete(item)
+            self.images.pop(index, None)
+        for index in visible:
+            if index not in self.drawn:
+                self.draw_item(index)
+
+    def draw_item(self, index):
+        columns = self.columns()
+        x = (index % columns) * CELL_WIDTH + CELL_PADDING // 2
+        y = (index // columns) * CELL_HEIGHT + CELL_PADDING // 2
+        key = self.entries[index]["path"]
+        outline = "#4a90d9" if index == self.selected else "#404040"
+        items = [self.canvas.create_rectangle(x - 2, y - 2, x + THUMBNAIL_WIDTH + 1, y + THUMBNAIL_HEIGHT + 1,
+                                              outline=outline, width=2, fill="#303030")]
+        ppm = self.cache.get_ppm(key)
+        if ppm is None:
+            self.cache.request(key, self.ready.put)
+        else:
+            self.images[index] = tk.PhotoImage(data=ppm, format="ppm")
+            items.append(self.canvas.create_image(x, y, image=self.images[index], anchor="nw"))
+        self.drawn[index] = items
+
+    def redraw(self, index):
+        if index in self.drawn:
+            for item in self.drawn.pop(index):
+                self.canvas.delete(item)
+            self.images.pop(index, None)
+            self.draw_item(index)
+
+    def poll_ready(self):
+        """Redraw items whose thumbnail the pool finished (it cannot touch Tk itself)."""
+        keys = set()
+        while not self.ready.empty():
+            keys.add(self.ready.get_nowait())
+        if keys:
+            for index in list(self.drawn):
+                if self.entries[index]["path"] in keys:
+                    self.redraw(index)
+        self.after(100, self.poll_ready)
+
+    def on_click(self, event):
+        column = int(self.canvas.canvasx(event.x) // CELL_WIDTH)
+        index = int(self.canvas.canvasy(event.y) // CELL_HEIGHT) * self.columns() + column
+        if column >= self.columns() or index >= len(self.entries):
+            return
+        previous, self.selected = self.selected, index
+        if previous is not None:
+            self.redraw(previous)
+        self.redraw(index)
+        entry = self.entries[index]
+        shown = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.get("timestamp", 0)))
+        details = f"{entry.get('source', '?')}  {shown}  {entry['path']}"
+        if entry.get("photographer"):
+            details += f"  by {entry['photographer']}"
+        self.details.configure(text=details)
+
+    def close(self):
+        self.cache.close()
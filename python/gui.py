@@ -1,28 +1,47 @@
+import sys
+import multiprocessing
+
+# The frozen exe doubles as the processes of the archive pool (archive.py): freeze_support runs them and exits
+multiprocessing.freeze_support()
+if __name__ == "__main__":
+    # Those processes only need archive_worker; with no main module to go by, spawn does not re-run this one,
+    # and with it the whole GUI, in each of them
+    __spec__ = None
+    globals().pop("__file__", None)
+
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
 from tkinter import ttk
 import threading
-import random
 import logging
 import os
 import time
-import sys
-from python.utils import load_env_vars, load_config, save_config
+from python.utils import load_config, save_config, get_base_path
+from python.credentials import get_credentials, ENV_FILE
 from pathlib import Path
 from python.startup_gui import set_startup, is_startup_enabled
-from python.registry_utils import set_wallpaper_style, set_lock_screen_wallpaper, set_lock_screen_wallpaper_style
 import queue
-from python.unsplash import fetch_unsplash_wallpapers, save_unsplash_wallpapers, set_unsplash_wallpaper
-from python.pexels import fetch_pexels_wallpapers, save_pexels_wallpapers, set_pexels_wallpaper
-from python.wallpaper_engine import automate_wallpaper_update, close_wallpaper_engine
-from python.wallpaper_utils import get_latest_wallpaper, terminate_depotdownloader, cleanup_old_wallpapers
+from python.engine import stop_event, start_wallpaper_update, set_engine_sources, set_engine_config, subscribe_events
+from python.engine_process import EngineProcess, ENGINE_WORKER_FLAG, run_engine_worker
+from python.control_api import start_control_api, stop_control_api
+from python.wallpaper_utils import terminate_depotdownloader
+from python.gallery import HistoryGallery
+from python.sources import PROVIDERS
 
 # Add this at the very start of the file (before config loading)
 if getattr(sys, 'frozen', False):
     os.chdir(os.path.dirname(sys.executable))
 
+# The frozen exe doubles as the engine worker process, see engine_process.py
+if ENGINE_WORKER_FLAG in sys.argv:
+    run_engine_worker()
+    sys.exit(0)
+
 class TextHandler(logging.Handler):
     """Class to handle logging messages and display them in a Tkinter Text widget."""
+
+    # Oldest lines are dropped past this, the app runs for weeks
+    max_lines = 1000
     
     def __init__(self, text_widget):
         logging.Handler.__init__(self)
@@ -37,14 +56,21 @@ class TextHandler(logging.Handler):
     def _update_display(self, msg):
         self.text_widget.configure(state='normal')
         self.text_widget.insert(tk.END, msg + '\n')
+        excess = int(self.text_widget.index('end-1c').split('.')[0]) - 1 - self.max_lines
+        if excess > 0:
+            self.text_widget.delete('1.0', f'{excess + 1}.0')
         self.text_widget.configure(state='disabled')
         self.text_widget.yview(tk.END)
 
 # Global variables
-stop_event = threading.Event()
 selected_sources = []
 update_thread = None
+engine_process = None
+engine_running = False  # Whether the worker runs updates, it stays up idle for the control API
+control_server = None
+control_settings = None
 log_queue = queue.Queue()
+engine_events = subscribe_events()
 
 # BEFORE creating any GUI elements, load config
 config = load_config()
@@ -55,88 +81,91 @@ root.title("Wall-You-Need")
 root.geometry("800x600")
 root.resizable(True, True)
 
-def start_wallpaper_update():
-    """Main wallpaper update logic merged from main.py"""
-    global selected_sources, config
-    logging.info("Wallpaper update thread started")
-    
-    while not stop_event.is_set():
+def use_engine_process():
+    """Whether the update engine runs in its own worker process instead of a thread."""
+    return config.get('ENGINE_MODE', 'thread') == 'process'
+
+def is_update_running():
+    if engine_process is not None:
+        return engine_running and engine_process.is_alive()
+    return update_thread is not None and update_thread.is_alive()
+
+def update_control_api():
+    """Serve the control API for as long as the app runs, also while updates are stopped.
+
+    With the worker process the worker serves it, so an idle one is kept
+    while updates are stopped; with the thread engine the GUI does. Restarted
+    only when it was switched on or off or moved to another port, it is
+    checked on every poll.
+    """
+    global control_server, control_settings, engine_process
+    serve_from_worker = use_engine_process() and config.get('CONTROL_API_ENABLED', False)
+    if engine_process is not None and not engine_running and not serve_from_worker:
+        engine_process.stop()  # Idle, and no longer needed for the API
+        engine_process = None
+
+    settings = None
+    if engine_process is None and not serve_from_worker:
+        settings = (config.get('CONTROL_API_ENABLED', False), config.get('CONTROL_API_PORT', 8765))
+    if settings != control_settings:
+        stop_control_api(control_server)  # Before a worker takes over the port
+        control_server = start_control_api(config) if settings else None
+        control_settings = settings
+
+    if engine_process is None and serve_from_worker:
+        start_idle_engine_process()
+
+def start_idle_engine_process():
+    """Start the engine worker without starting updates."""
+    global engine_process
+    if engine_process is None or not engine_process.is_alive():
+        engine_process = EngineProcess(log_queue)
+        engine_process.start()
+
+def start_engine_process():
+    global engine_running
+    start_idle_engine_process()
+    engine_process.send("start", selected_sources)
+    engine_running = True
+
+def show_sources(sources):
+    """Tick the checkboxes of the sources the engine uses, after they were toggled through the control API."""
+    for name, var in source_vars.items():
+        if var.get() != (name in sources):
+            var.set(name in sources)
+
+def poll_engine_events():
+    """Drain messages from the engine worker and restart it if it crashed."""
+    global engine_process
+    engine_logger = logging.getLogger("engine")
+    # The thread engine's own events, for source toggles made through the GUI's control API
+    while True:
         try:
-            current_sources = selected_sources.copy()
-            save_location_path = Path(config['SAVE_LOCATION'])
-            
-            if not current_sources:
-                logging.warning("No sources selected in current iteration")
-                time.sleep(5)
-                continue
-
-            source = random.choice(current_sources)
-            logging.info(f"Randomly chosen source: {source} from {current_sources}")
-
-            if source == "unsplash":
-                handle_unsplash_update(save_location_path)
-            elif source == "pexels":
-                handle_pexels_update(save_location_path)
-            elif source == "wallpaper_engine":
-                handle_wallpaper_engine_update(save_location_path)
-
-            interval = int(config['CHECK_INTERVAL'])
-            logging.info(f"Sleeping for {interval} seconds before the next update.")
-            stop_event.wait(interval)
-            
-        except Exception as e:
-            logging.error(f"Exception in update thread: {e}", exc_info=True)
-            time.sleep(5)
-
-def handle_unsplash_update(save_path):
-    try:
-        wallpapers = fetch_unsplash_wallpapers(query="landscape", count=1)
-        if not wallpapers or stop_event.is_set():
-            return
-            
-        save_unsplash_wallpapers(wallpapers, save_path / "unsplash_wallpapers")
-        unsplash_wallpaper_path = get_latest_wallpaper(save_path / "unsplash_wallpapers")
-        
-        if unsplash_wallpaper_path and not stop_event.is_set():
-            set_unsplash_wallpaper(unsplash_wallpaper_path)
-            set_wallpaper_style()
-            set_lock_screen_wallpaper(unsplash_wallpaper_path)
-            close_wallpaper_engine()
-            
-        cleanup_old_wallpapers(save_path / "unsplash_wallpapers", 
-                            int(config['MAX_WALLPAPERS']))
-    except Exception as e:
-        logging.error(f"Unsplash failed: {str(e)}", exc_info=True)
-
-def handle_pexels_update(save_path):
-    try:
-        pexels_wallpapers = fetch_pexels_wallpapers(query="nature", count=1)
-        if not pexels_wallpapers or stop_event.is_set():
-            return
-            
-        save_pexels_wallpapers(pexels_wallpapers, save_path / "pexels_wallpapers")
-        pexels_wallpaper_path = get_latest_wallpaper(save_path / "pexels_wallpapers")
-        
-        if pexels_wallpaper_path and not stop_event.is_set():
-            set_pexels_wallpaper(pexels_wallpaper_path)
-            set_wallpaper_style()
-            set_lock_screen_wallpaper(pexels_wallpaper_path)
-            close_wallpaper_engine()
-            
-        cleanup_old_wallpapers(save_path / "pexels_wallpapers", 
-                             int(config['MAX_WALLPAPERS']))
-    except Exception as e:
-        logging.error(f"Pexels failed: {str(e)}", exc_info=True)
-
-def handle_wallpaper_engine_update(save_path):
-    try:
-        logging.info("Initiating Wallpaper Engine download sequence")
-        automate_wallpaper_update(stop_event=stop_event)
-        terminate_depotdownloader()
-        time.sleep(10)  # Add buffer before cleanup
-        cleanup_old_wallpapers(save_path, int(config['MAX_WALLPAPERS']))
-    except Exception as e:
-        logging.error(f"Wallpaper Engine failed: {str(e)}", exc_info=True)
+            message = engine_events.get_nowait()
+        except queue.Empty:
+            break
+        if message["event"] == "sources_changed":
+            show_sources(message["sources"])
+    while True:
+        try:
+            kind, *payload = log_queue.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "log":
+            engine_logger.log(payload[0], payload[1])
+        elif kind == "status":
+            logging.info(f"Engine worker status: {payload[0]}")
+        elif kind == "sources":
+            show_sources(payload[0])
+        elif kind == "exited" and engine_process is not None and not engine_process.is_alive():
+            if config.get('UPDATE_RUNNING', False):
+                logging.warning(f"Engine worker exited unexpectedly (code {payload[0]}), restarting it.")
+                engine_process = None
+                start_engine_process()
+            else:
+                engine_process = None  # Restarted idle by update_control_api if it serves the API
+    update_control_api()
+    root.after(200, poll_engine_events)
 
 def update_config_file():
     global config
@@ -147,16 +176,19 @@ def update_config_file():
     config['WALLPAPER_DOWNLOAD_LIMIT'] = wallpaper_limit_var.get()
     config['MAX_WALLPAPERS'] = max_wallpapers_var.get()
     config['SAVE_OLD_WALLPAPERS'] = var_save_old_wallpapers.get()
+    config['ENGINE_MODE'] = "process" if var_engine_process.get() else "thread"
+    config['MULTI_MONITOR'] = var_multi_monitor.get()
     
     # Save source states
-    config['SOURCE_UNSPLASH'] = var_unsplash.get()
-    config['SOURCE_PEXELS'] = var_pexels.get()
-    config['SOURCE_WALLPAPER_ENGINE'] = var_wallpaper_engine.get()
+    for name, var in source_vars.items():
+        config[PROVIDERS[name].config_key] = var.get()
     
     # Update running state
-    config['UPDATE_RUNNING'] = update_thread is not None and update_thread.is_alive()
+    config['UPDATE_RUNNING'] = is_update_running()
     
     save_config(config)
+    if engine_process is not None and engine_process.is_alive():
+        engine_process.send("config")
     logging.info("Configuration updated in real-time.")
 
 def on_start():
@@ -171,12 +203,7 @@ def on_start():
     if var_wallpaper_engine.get() and not validate_we_path():
         return
 
-    selected_sources = [
-        source for source, var in [("unsplash", var_unsplash),
-                                  ("pexels", var_pexels),
-                                  ("wallpaper_engine", var_wallpaper_engine)]
-        if var.get()
-    ]
+    selected_sources = [source for source, var in source_vars.items() if var.get()]
 
     if not selected_sources:
         messagebox.showinfo("No Selection", "No sources selected. Stopping wallpaper updates.")
@@ -187,14 +214,20 @@ def on_start():
     update_config_file()
     config = load_config()
     logging.info("Configuration reloaded.")
-
-    # print("Starting wallpaper update thread...")
-    update_thread = threading.Thread(
-        target=start_wallpaper_update,
-        daemon=True
-    )
-    stop_event.clear()
-    update_thread.start()
+    update_control_api()
+
+    if use_engine_process():
+        start_engine_process()
+    else:
+        # print("Starting wallpaper update thread...")
+        set_engine_sources(selected_sources)
+        set_engine_config(config)
+        update_thread = threading.Thread(
+            target=start_wallpaper_update,
+            daemon=True
+        )
+        stop_event.clear()
+        update_thread.start()
     root.update()  # Force immediate GUI refresh
 
     config['UPDATE_RUNNING'] = True
@@ -215,7 +248,12 @@ def on_start():
             print("Save location validation failed (post thread start).")
 
 def on_stop():
-    global update_thread
+    global update_thread, engine_running
+    if engine_process is not None:
+        # The worker stays up, idle, so its control API keeps serving
+        logging.info("Stopping the engine worker's updates.")
+        engine_process.send("stop")
+        engine_running = False
     if update_thread and update_thread.is_alive():
         logging.info("Stopping the update thread.")
         stop_event.set()  # Signal the thread to stop
@@ -240,6 +278,8 @@ def on_close():
     
     # Signal all components to stop first
     stop_event.set()
+    if engine_process is not None:
+        engine_process.stop()
     
     # Terminate depotdownloader processes
     terminate_depotdownloader()
@@ -250,14 +290,15 @@ def on_close():
         
     # Force kill any remaining processes
     terminate_depotdownloader()
+    stop_control_api(control_server)
+    history_gallery.close()
     
     # Final cleanup before destruction
     root.destroy()
 
 def save_credentials():
     """Save credentials to .env file"""
-    env_path = os.path.join(os.path.dirname(__file__), '.env') if not getattr(sys, 'frozen', False) \
-        else os.path.join(os.path.dirname(sys.executable), '.env')
+    env_path = os.path.join(get_base_path(), ENV_FILE)
     
     credentials = [
         f"UNSPLASH_ACCESS_KEY={unsplash_entry.get().strip()}",
@@ -269,11 +310,10 @@ def save_credentials():
     try:
         with open(env_path, 'w') as f:
             f.write("\n".join(credentials))
-        messagebox.showinfo("Success", "Credentials saved successfully!\nRestart the application to apply changes.")
+        # The engine reads .env again once it changed, from the next cycle on
+        messagebox.showinfo("Success", "Credentials saved successfully!")
     except Exception as e:
         messagebox.showerror("Error", f"Failed to save credentials: {str(e)}")
-    finally:
-        load_env_vars()  # Reload environment variables
 
 def validate_we_path():
     """Validate Wallpaper Engine installation path."""
@@ -299,9 +339,10 @@ def on_we_check():
         var_wallpaper_engine.set(False)
 
 # Create GUI variables linked to config values
-var_unsplash = tk.BooleanVar(value=config['SOURCE_UNSPLASH'])
-var_pexels = tk.BooleanVar(value=config['SOURCE_PEXELS'])
-var_wallpaper_engine = tk.BooleanVar(value=config['SOURCE_WALLPAPER_ENGINE'])
+source_vars = {name: tk.BooleanVar(value=config.get(provider.config_key, False)) for name, provider in PROVIDERS.items()}
+var_unsplash = source_vars["unsplash"]
+var_pexels = source_vars["pexels"]
+var_wallpaper_engine = source_vars["wallpaper_engine"]
 var_save_old_wallpapers = tk.BooleanVar(value=config['SAVE_OLD_WALLPAPERS'])
 var_startup = tk.BooleanVar(value=is_startup_enabled())
 save_location_var = tk.StringVar(value=config['SAVE_LOCATION'])
@@ -333,6 +374,10 @@ chk_wallpaper_engine = ttk.Checkbutton(sources_frame, text="Wallpaper Engine", v
 chk_unsplash.grid(row=0, column=0, sticky="w", pady=2)
 chk_pexels.grid(row=1, column=0, sticky="w", pady=2)
 chk_wallpaper_engine.grid(row=2, column=0, sticky="w", pady=2)
+# Sources configured in config.json only (LOCAL_FOLDERS, FEED_URLS)
+for row, name in enumerate(["folders", "feeds"], start=3):
+    ttk.Checkbutton(sources_frame, text=PROVIDERS[name].label, variable=source_vars[name]).grid(
+        row=row, column=0, sticky="w", pady=2)
 
 # Configuration Settings
 config_frame = ttk.LabelFrame(main_frame, text="Configuration", padding=10)
@@ -351,6 +396,16 @@ chk_startup = ttk.Checkbutton(config_frame, text="Start with Windows",
                             variable=var_startup, command=on_startup_checkbox_change)
 chk_startup.grid(row=7, column=0, sticky="w", pady=2)
 
+var_engine_process = tk.BooleanVar(value=config.get('ENGINE_MODE', 'thread') == 'process')
+chk_engine_process = ttk.Checkbutton(config_frame, text="Run updates in a separate process",
+                                     variable=var_engine_process)
+chk_engine_process.grid(row=8, column=0, sticky="w", pady=2)
+
+var_multi_monitor = tk.BooleanVar(value=config.get('MULTI_MONITOR', False))
+chk_multi_monitor = ttk.Checkbutton(config_frame, text="Different wallpaper on each monitor",
+                                    variable=var_multi_monitor)
+chk_multi_monitor.grid(row=9, column=0, sticky="w", pady=2)
+
 # API Credentials Tab
 creds_frame = ttk.Frame(notebook)
 notebook.add(creds_frame, text="Credentials")
@@ -358,26 +413,33 @@ notebook.add(creds_frame, text="Credentials")
 ttk.Label(creds_frame, text="Unsplash Access Key:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
 unsplash_entry = ttk.Entry(creds_frame, width=40, show="*")
 unsplash_entry.grid(row=0, column=1, padx=5, pady=5)
-unsplash_entry.insert(0, os.getenv("UNSPLASH_ACCESS_KEY", ""))
+unsplash_entry.insert(0, get_credentials().get("UNSPLASH_ACCESS_KEY", ""))
 
 ttk.Label(creds_frame, text="Pexels API Key:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
 pexels_entry = ttk.Entry(creds_frame, width=40, show="*")
 pexels_entry.grid(row=1, column=1, padx=5, pady=5)
-pexels_entry.insert(0, os.getenv("PEXELS_API_KEY", ""))
+pexels_entry.insert(0, get_credentials().get("PEXELS_API_KEY", ""))
 
 ttk.Label(creds_frame, text="Steam Usernames (comma-separated):").grid(row=2, column=0, padx=5, pady=5, sticky="w")
 username_entry = ttk.Entry(creds_frame, width=40)
 username_entry.grid(row=2, column=1, padx=5, pady=5)
-username_entry.insert(0, os.getenv("USERNAMES", ""))
+username_entry.insert(0, get_credentials().get("USERNAMES", ""))
 
 ttk.Label(creds_frame, text="Steam Passwords (comma-separated):").grid(row=3, column=0, padx=5, pady=5, sticky="w")
 password_entry = ttk.Entry(creds_frame, width=40, show="*")
 password_entry.grid(row=3, column=1, padx=5, pady=5)
-password_entry.insert(0, os.getenv("PASSWORDS", ""))
+password_entry.insert(0, get_credentials().get("PASSWORDS", ""))
 
 save_creds_btn = ttk.Button(creds_frame, text="Save Credentials", command=save_credentials)
 save_creds_btn.grid(row=4, column=1, pady=10)
 
+# History Tab
+history_gallery = HistoryGallery(notebook, config)
+notebook.add(history_gallery, text="History")
+# Reloaded whenever it is shown, new wallpapers may have been set since
+notebook.bind("<<NotebookTabChanged>>",
+              lambda event: history_gallery.reload() if notebook.select() == str(history_gallery) else None)
+
 # Logs Section
 logs_frame = ttk.LabelFrame(root, text="Logs", padding=10)
 logs_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
@@ -436,10 +498,11 @@ chk_pexels.grid(row=1, column=0, sticky="w", pady=2)
 chk_wallpaper_engine.grid(row=2, column=0, sticky="w", pady=2)
 
 # Bind the update_config_file function to the checkbox state changes
-var_unsplash.trace_add('write', lambda *args: update_config_file())
-var_pexels.trace_add('write', lambda *args: update_config_file())
-var_wallpaper_engine.trace_add('write', lambda *args: update_config_file())
+for var in source_vars.values():
+    var.trace_add('write', lambda *args: update_config_file())
 var_save_old_wallpapers.trace_add('write', lambda *args: update_config_file())
+var_engine_process.trace_add('write', lambda *args: update_config_file())
+var_multi_monitor.trace_add('write', lambda *args: update_config_file())
 
 # Bind the on_close function to the window close event
 root.protocol("WM_DELETE_WINDOW", on_close)
@@ -464,5 +527,8 @@ logger.setLevel(logging.INFO)
 if config.get('UPDATE_RUNNING', False):
     root.after(100, on_start)  # Small delay to ensure GUI is fully initialized
 
+update_control_api()
+root.after(200, poll_engine_events)
+
 # Run the Tkinter event loop
 root.mainloop()
\ No newline at end of file
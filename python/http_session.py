@@ -0,0 +1,190 @@
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from python.metrics import increment
+from python.utils import per_location, write_atomic
+
+CACHE_DIR = "http_cache"
+CACHE_INDEX = "index.json"
+# (connect, read) seconds, for calls that do not pass their own
+DEFAULT_TIMEOUT = (10, 30)
+POOL_HOSTS = 10
+POOL_CONNECTIONS_PER_HOST = 8
+# Wallpapers of one batch downloaded at once, below the pool size so a batch never waits for a connection
+MAX_PARALLEL_DOWNLOADS = 4
+
+class PooledSession(requests.Session):
+    """Session shared by every request the app makes.
+
+    Connections stay open per host between cycles (keep-alive), and requests
+    without a timeout get DEFAULT_TIMEOUT. Proxies and CA bundles come from
+    the environment as requests reads them (trust_env).
+    """
+
+    def __init__(self):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_CONNECTIONS_PER_HOST)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+session = None
+session_lock = threading.Lock()
+
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            session = PooledSession()
+        return session
+
+class HttpCache:
+    """Bodies of GET responses with their ETag/Last-Modified, under http_cache in the save location.
+
+    Only responses carrying a validator are kept. The least recently used
+    ones are dropped once the bodies exceed max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.index_path = self.directory / CACHE_INDEX
+        self.entries = {}  # url hash -> {url, etag, last_modified, encoding, size, used}
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.index_path.exists():
+                with self.index_path.open("r") as f:
+                    self.entries = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error reading HTTP cache index: {e}")
+        # Logical clock for the least recently used order
+        self.counter = max((entry.get("used", 0) for entry in self.entries.values()), default=0)
+
+    def save_index(self):
+        try:
+            write_atomic(self.index_path, lambda f: json.dump(self.entries, f))
+        except IOError as e:
+            logging.error(f"Error saving HTTP cache index: {e}")
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def validators(self, url):
+        """If-None-Match/If-Modified-Since headers for a cached url."""
+        with self.lock:
+            entry = self.entries.get(self.key(url))
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, url):
+        """(body, encoding) of a cached url, or None when the body is gone."""
+        key = self.key(url)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            try:
+                body = (self.directory / key).read_bytes()
+            except OSError:
+                del self.entries[key]
+                self.save_index()
+                return None
+            self.counter += 1
+            entry["used"] = self.counter
+            return body, entry.get("encoding")
+
+    def store(self, url, response):
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        key = self.key(url)
+        body = response.content
+        with self.lock:
+            try:
+                write_atomic(self.directory / key, lambda f: f.write(body), "wb")
+            except OSError as e:
+                logging.error(f"Error caching {url}: {e}")
+                return
+            self.counter += 1
+            self.entries[key] = {"url": url, "etag": etag, "last_modified": last_modified,
+                                 "encoding": response.encoding, "size": len(body), "used": self.counter}
+            self.evict()
+            self.save_index()
+
+    def evict(self):
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1].get("used", 0)):
+            if total <= self.max_bytes:
+                break
+            total -= entry["size"]
+            del self.entries[key]
+            (self.directory / key).unlink(missing_ok=True)
+
+class HttpResult:
+    """What conditional_get returns: status, headers and body, the body coming from the cache after a 304.
+
+    Offers the parts of requests.Response the callers use.
+    """
+
+    def __init__(self, response, cached=None):
+        self.response = response
+        self.not_modified = cached is not None
+        self.status_code = 200 if self.not_modified else response.status_code
+        self.headers = response.headers
+        self.content, self.encoding = cached if self.not_modified else (response.content, response.encoding)
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        try:
+            return json.loads(self.content)
+        except json.JSONDecodeError as e:
+            raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos)
+
+    def raise_for_status(self):
+        if not self.not_modified:
+            self.response.raise_for_status()
+
+def get_http_cache(config):
+    return per_location(config, CACHE_DIR,
+                        lambda directory: HttpCache(directory, int(float(config.get('HTTP_CACHE_MAX_MB', "50")) * 1024 * 1024)))
+
+def conditional_get(url, config, source="", headers=None, **kwargs):
+    """GET through the shared session, revalidating against the on-disk cache.
+
+    Returns an HttpResult; a 304 is answered from the cache and reported as
+    the 200 it stands for, so callers handle both the same way. Other statuses
+    are passed on as they are (raise_for_status is left to the caller).
+    """
+    if "params" in kwargs:
+        # Encoded into the URL here, which is what the cache is keyed by
+        url = requests.Request("GET", url, params=kwargs.pop("params")).prepare().url
+    cache = get_http_cache(config)
+    response = get_session().get(url, headers={**(headers or {}), **cache.validators(url)}, **kwargs)
+    if response.status_code == 304:
+        cached = cache.load(url)
+        if cached is not None:
+            increment("http_not_modified", source)
+            return HttpResult(response, cached)
+        # The body was lost, fetch it unconditionally
+        response = get_session().get(url, headers=headers, **kwargs)
+    if response.status_code == 200:
+        cache.store(url, response)
+    return HttpResult(response)
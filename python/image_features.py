@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+from python.utils import per_location, write_atomic
+
+FEATURE_FILE = "image_features.npz"
+DOMINANT_COLORS = 3
+# Queries used before they were configurable, for config files without *_QUERY
+DEFAULT_QUERIES = {"unsplash": "landscape", "pexels": "nature"}
+# Luma weights (ITU-R BT.601) for mean brightness
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def compute_features(image_path):
+    """Mean brightness (0-1), aspect ratio and dominant colors (0xRRGGBB) of an image.
+
+    Works on a 64 px thumbnail the JPEG decoder produces cheaply; colors are
+    counted in 512 bins (3 bits per channel). Returns None for unreadable files.
+    """
+    try:
+        with Image.open(image_path) as image:
+            width, height = image.size
+            image.draft("RGB", (64, 64))
+            pixels = np.asarray(image.convert("RGB").resize((64, 64)), dtype=np.uint8).reshape(-1, 3)
+    except (OSError, UnidentifiedImageError) as e:
+        logging.warning(f"Cannot read features of {image_path}: {e}")
+        return None
+
+    bins = (pixels >> 5).astype(np.uint16)
+    counts = np.bincount((bins[:, 0] << 6) | (bins[:, 1] << 3) | bins[:, 2], minlength=512)
+    top = np.argsort(counts)[::-1][:DOMINANT_COLORS]
+    # Report the centre of each bin, and repeat the top one if the image has fewer colors
+    top = np.where(counts[top] > 0, top, top[0])
+    centres = (np.stack([top >> 6, (top >> 3) & 7, top & 7], axis=1) << 5) + 16
+    return {
+        "brightness": float((pixels @ LUMA).mean() / 255),
+        "aspect": width / height if height else 0.0,
+        "colors": [int(r) << 16 | int(g) << 8 | int(b) for r, g, b in centres]
+    }
+
+def parse_time(value):
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def rule_is_active(rule, now=None):
+    """Rules without after/before always apply; windows may wrap past midnight."""
+    if "after" not in rule and "before" not in rule:
+        return True
+    now = now or time.localtime()
+    minute = now.tm_hour * 60 + now.tm_min
+    start = parse_time(rule.get("after", "00:00"))
+    end = parse_time(rule.get("before", "24:00"))
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+def active_rules(config, now=None):
+    """SELECTION_RULES entries that apply at this time of day."""
+    rules = config.get('SELECTION_RULES') or []
+    try:
+        return [rule for rule in rules if rule_is_active(rule, now)]
+    except (ValueError, AttributeError) as e:
+        logging.error(f"Invalid SELECTION_RULES: {e}")
+        return []
+
+def parse_aspect(value):
+    if isinstance(value, str) and ":" in value:
+        width, height = value.split(":")
+        return float(width) / float(height)
+    return float(value)
+
+def parse_color(value):
+    value = int(value.lstrip("#"), 16)
+    return np.array([value >> 16, (value >> 8) & 255, value & 255], dtype=np.int32)
+
+class ImageFeatureIndex:
+    """Features of downloaded wallpapers, one NumPy column per feature.
+
+    Rules are evaluated as boolean masks over the columns, so picking a
+    matching wallpaper never decodes an image. Rows whose file has been
+    cleaned up are dropped when a pick runs into them.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.brightness = np.zeros(0, dtype=np.float32)
+        self.aspect = np.zeros(0, dtype=np.float32)
+        self.colors = np.zeros((0, DOMINANT_COLORS), dtype=np.uint32)
+        self.paths = []
+        self.sources = []
+        self.lock = threading.Lock()
+        self.load()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.brightness = data["brightness"].astype(np.float32)
+                self.aspect = data["aspect"].astype(np.float32)
+                self.colors = data["colors"].astype(np.uint32).reshape(-1, DOMINANT_COLORS)
+                rows = json.loads(str(data["rows"]))
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Error reading image feature index: {e}")
+            return
+        self.paths = [row["path"] for row in rows]
+        self.sources = [row["source"] for row in rows]
+
+    def save(self):
+        rows = [{"path": path, "source": source} for path, source in zip(self.paths, self.sources)]
+        try:
+            write_atomic(self.path, lambda f: np.savez(f, brightness=self.brightness, aspect=self.aspect,
+                                                       colors=self.colors, rows=np.array(json.dumps(rows))), "wb")
+        except OSError as e:
+            logging.error(f"Error saving image feature index: {e}")
+
+    def keep_rows(self, mask):
+        self.brightness = self.brightness[mask]
+        self.aspect = self.aspect[mask]
+        self.colors = self.colors[mask]
+        self.paths = [path for path, keep in zip(self.paths, mask) if keep]
+        self.sources = [source for source, keep in zip(self.sources, mask) if keep]
+
+    def add(self, source, image_path, features):
+        image_path = str(image_path)
+        with self.lock:
+            if image_path in self.paths:  # Same file downloaded again
+                self.keep_rows(np.array([path != image_path for path in self.paths], dtype=bool))
+            self.brightness = np.append(self.brightness, np.float32(features["brightness"]))
+            self.aspect = np.append(self.aspect, np.float32(features["aspect"]))
+            self.colors = np.vstack([self.colors, np.array(features["colors"], dtype=np.uint32)])
+            self.paths.append(image_path)
+            self.sources.append(source)
+            if len(self.paths) > self.max_entries:
+                mask = np.zeros(len(self.paths), dtype=bool)
+                mask[-self.max_entries:] = True
+                self.keep_rows(mask)
+            self.save()
+
+    def match(self, rules):
+        """Boolean mask of the rows that satisfy every rule."""
+        mask = np.ones(len(self.paths), dtype=bool)
+        for rule in rules:
+            if "min_brightness" in rule:
+                mask &= self.brightness >= float(rule["min_brightness"])
+            if "max_brightness" in rule:
+                mask &= self.brightness <= float(rule["max_brightness"])
+            if "aspect" in rule:
+                target = parse_aspect(rule["aspect"])
+                mask &= np.abs(self.aspect - target) <= target * float(rule.get("aspect_tolerance", 0.03))
+            if "min_aspect" in rule:
+                mask &= self.aspect >= parse_aspect(rule["min_aspect"])
+            if "max_aspect" in rule:
+                mask &= self.aspect <= parse_aspect(rule["max_aspect"])
+            if "color" in rule:
+                colors = self.colors.astype(np.int32)
+                rgb = np.stack([colors >> 16, (colors >> 8) & 255, colors & 255], axis=-1)
+                distance = np.linalg.norm(rgb - parse_color(rule["color"]), axis=-1).min(axis=1)
+                mask &= distance <= float(rule.get("color_distance", 80))
+            if "source" in rule:
+                mask &= np.array([source == rule["source"] for source in self.sources], dtype=bool)
+        return mask
+
+    def pick(self, rules, exclude=(), locate=None):
+        """Random existing wallpaper matching the rules, or None.
+
+        locate maps an indexed path to where the file is now (None when gone),
+        for wallpapers that moved to the archive.
+        """
+        locate = locate or (lambda path: path if os.path.exists(path) else None)
+        with self.lock:
+            candidates = np.flatnonzero(self.match(rules))
+            missing = []
+            chosen = None
+            for row in np.random.permutation(candidates):
+                path = self.paths[row]
+                if path in exclude:
+                    continue
+                chosen = locate(path)
+                if chosen:
+                    break
+                missing.append(row)
+            if missing:
+                mask = np.ones(len(self.paths), dtype=bool)
+                mask[missing] = False
+                self.keep_rows(mask)
+                self.save()
+            return chosen
+
+    def matches(self, image_path, rules):
+        with self.lock:
+            image_path = str(image_path)
+            if image_path not in self.paths:
+                return False
+            return bool(self.match(rules)[self.paths.index(image_path)])
+
+def get_feature_index(config):
+    """The index stored in the save location."""
+    return per_location(config, FEATURE_FILE,
+                        lambda path: ImageFeatureIndex(path, int(config.get('FEATURE_INDEX_MAX_ENTRIES', 10000))))
+
+def get_query(config, source):
+    """Search query for a source, an active rule's query wins over the configured one."""
+    for rule in active_rules(config):
+        if rule.get("query"):
+            return rule["query"]
+    return config.get(f'{source.upper()}_QUERY') or DEFAULT_QUERIES.get(source, "wallpapers")
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from python.providers import WallpaperProvider
+from python.local_library import IMAGE_SUFFIXES
+from python.utils import ShuffledBag, per_location, write_atomic
+
+FOLDER_INDEX_FILE = "local_folders.json"
+
+class FolderIndex:
+    """Images under the LOCAL_FOLDERS trees, listed incrementally.
+
+    Every directory is kept with the mtime it was listed at and only listed
+    again when that changes (a file added, removed or renamed in it), so on a
+    NAS a cycle costs one stat per directory. Images are handed out from a
+    shuffled bag like the local library's, nothing repeats before every image
+    was shown. The index is persisted and survives restarts.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.dirs = {}      # directory -> {"mtime": mtime_ns, "images": [names], "subdirs": [names]}
+        self.bag = ShuffledBag()
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r") as f:
+                data = json.load(f)
+            self.dirs = data.get("dirs", {})
+            self.bag = ShuffledBag(data.get("bag", []), data.get("last"))
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error reading local folder index: {e}")
+
+    def save(self):
+        try:
+            write_atomic(self.path, lambda f: json.dump({"dirs": self.dirs, "bag": self.bag.items, "last": self.bag.last}, f))
+        except IOError as e:
+            logging.error(f"Error saving local folder index: {e}")
+
+    def list_directory(self, directory):
+        images, subdirs = [], []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in IMAGE_SUFFIXES:
+                        images.append(entry.name)
+                except OSError:
+                    continue
+        return images, subdirs
+
+    def images(self):
+        return [os.path.join(directory, name) for directory, entry in self.dirs.items() for name in entry["images"]]
+
+    def refresh(self, roots):
+        """Walk the trees, listing only directories whose mtime changed."""
+        visited = {}
+        pending = [str(Path(root)) for root in roots]
+        while pending:
+            directory = pending.pop()
+            if directory in visited:
+                continue
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue  # Gone, or the share is not mounted
+            entry = self.dirs.get(directory)
+            if entry is None or entry["mtime"] != mtime:
+                try:
+                    images, subdirs = self.list_directory(directory)
+                except OSError as e:
+                    logging.warning(f"Cannot list {directory}: {e}")
+                    continue
+                entry = {"mtime": mtime, "images": images, "subdirs": subdirs}
+            visited[directory] = entry
+            pending.extend(os.path.join(directory, name) for name in entry["subdirs"])
+        self.dirs = visited
+
+    def next_images(self, roots, count):
+        """The next count images from the shuffled bag, fewer when the folders hold fewer."""
+        with self.lock:
+            previous = set(self.images())
+            self.refresh(roots)
+            images = self.images()
+            known = set(images)
+            self.bag.keep(known)
+            # New images join the current round at random places
+            for path in images:
+                if path not in previous:
+                    self.bag.add(path)
+            chosen = []
+            while len(chosen) < min(count, len(images)):
+                path = self.bag.draw(known)
+                if path not in chosen:
+                    chosen.append(path)
+            self.save()
+            return chosen
+
+def get_folder_index(config):
+    """The folder index of the save location."""
+    return per_location(config, FOLDER_INDEX_FILE, FolderIndex)
+
+def image_id(path):
+    return hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:16]
+
+class LocalFolderProvider(WallpaperProvider):
+    """Images from folders on this machine or a network share (LOCAL_FOLDERS), including subfolders.
+
+    They are set where they are: nothing is copied into the save location,
+    and since they are the user's own files they are never deduplicated or
+    cleaned up.
+    """
+
+    name = "folders"
+    label = "Local folders"
+    dedupe = False
+
+    def is_available(self, config):
+        return bool(config.get('LOCAL_FOLDERS'))
+
+    def fetch(self, config, count, stop_event=None):
+        paths = get_folder_index(config).next_images(config.get('LOCAL_FOLDERS') or [], count)
+        return [{"id": image_id(path), "photographer": None, "url": Path(path).as_uri(), "path": path}
+                for path in paths]
+
+    def download(self, config, items, directory=None, size=None, stop_event=None):
+        """Manifests of the images in place."""
+        manifests = []
+        for item in items:
+            started = time.perf_counter()
+            try:
+                digest = hashlib.sha256()
+                with open(item["path"], "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            except OSError as e:
+                logging.warning(f"Cannot read {item['path']}: {e}")
+                continue
+            manifests.append({
+                "source": self.name,
+                **self.metadata(item),
+                "path": Path(item["path"]),
+                "size": os.path.getsize(item["path"]),
+                "sha256": digest.hexdigest(),
+                "downloaded_at": time.time(),
+                "download_seconds": round(time.perf_counter() - started, 3)
+            })
+        return manifests
@@ -0,0 +1,153 @@
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from python.archive import ARCHIVE_DIR
+from python.utils import ShuffledBag, per_location, write_atomic
+
+LIBRARY_FILE = "local_library.json"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+# Library folders under the save location and the source their wallpapers came from
+IMAGE_DIRS = {"unsplash_wallpapers": "unsplash", "pexels_wallpapers": "pexels", "feed_wallpapers": "feeds"}
+PROJECTS_DIR = Path("projects") / "myprojects"
+
+def owner_folder(path, source):
+    """The library folder a wallpaper was listed from."""
+    if source == "wallpaper_engine":
+        return os.path.dirname(os.path.dirname(path))
+    return os.path.dirname(path)
+
+def find_project_wallpaper(project_dir):
+    """scene.pkg of a Wallpaper Engine project, or its video when there is no package."""
+    scene = project_dir / "scene.pkg"
+    if scene.exists():
+        return scene
+    return next(iter(sorted(project_dir.glob("*.mp4"))), None)
+
+class LocalLibrary:
+    """Index of the wallpapers kept on disk, for rotating without a network.
+
+    Folders (and their archive subfolders) are only listed again when their
+    mtime changes, so a cycle costs a few stat calls. Wallpapers are handed
+    out from a shuffled bag that is refilled once empty, so nothing repeats
+    before the whole library was shown.
+    The bag is persisted with the index and survives restarts.
+    """
+
+    def __init__(self, save_location):
+        self.save_location = Path(save_location)
+        self.path = self.save_location / LIBRARY_FILE
+        self.dirs = {}      # folder -> mtime_ns it was listed at
+        self.items = {}     # wallpaper path -> source
+        self.pending = []   # project folders still waiting for their download
+        self.bag = ShuffledBag()
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r") as f:
+                data = json.load(f)
+            self.dirs = data.get("dirs", {})
+            self.items = data.get("items", {})
+            self.pending = data.get("pending", [])
+            self.bag = ShuffledBag(data.get("bag", []), data.get("last"))
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error reading local library index: {e}")
+
+    def save(self):
+        try:
+            write_atomic(self.path, lambda f: json.dump({"dirs": self.dirs, "items": self.items, "pending": self.pending,
+                                                         "bag": self.bag.items, "last": self.bag.last}, f))
+        except IOError as e:
+            logging.error(f"Error saving local library index: {e}")
+
+    def list_folder(self, folder):
+        """Wallpapers in one library folder, as {path: source}."""
+        if folder == self.save_location / PROJECTS_DIR:
+            found = {}
+            for project_dir in folder.iterdir():
+                if not project_dir.is_dir():
+                    continue
+                wallpaper = find_project_wallpaper(project_dir)
+                if wallpaper:
+                    found[str(wallpaper)] = "wallpaper_engine"
+                elif str(project_dir) not in self.pending:
+                    self.pending.append(str(project_dir))
+            return found
+        # Archived copies count for the source of the folder they were moved out of
+        source = IMAGE_DIRS[folder.parent.name if folder.name == ARCHIVE_DIR else folder.name]
+        return {str(path): source for path in folder.iterdir() if path.suffix.lower() in IMAGE_SUFFIXES}
+
+    def refresh(self):
+        """Re-list the folders whose mtime changed. Returns True if the index changed."""
+        changed = False
+        removed, added = [], []
+        folders = [self.save_location / name / sub for name in IMAGE_DIRS for sub in ("", ARCHIVE_DIR)]
+        for folder in folders + [self.save_location / PROJECTS_DIR]:
+            try:
+                mtime = folder.stat().st_mtime_ns
+            except OSError:
+                mtime = None
+            if self.dirs.get(str(folder)) == mtime:
+                continue
+            kept = {path: source for path, source in self.items.items() if owner_folder(path, source) != str(folder)}
+            listed = self.list_folder(folder) if mtime is not None else {}
+            removed += [path for path in self.items if path not in kept and path not in listed]
+            added += [path for path in listed if path not in self.items]
+            self.items = {**kept, **listed}
+            self.dirs[str(folder)] = mtime
+            changed = True
+
+        if changed:
+            # A wallpaper moving between the hot and archive folders keeps its place in the round:
+            # if it was shown already (or is the one being restored) it is not shown again
+            in_bag = set(self.bag.items)
+            shown = {Path(path).stem for path in removed if path not in in_bag}
+            self.bag.keep(self.items)
+            # New wallpapers join the current round at random places
+            for path in added:
+                if Path(path).stem not in shown:
+                    self.bag.add(path)
+
+        # A project folder is created before DepotDownloader fills it
+        for project_dir in list(self.pending):
+            wallpaper = find_project_wallpaper(Path(project_dir)) if os.path.isdir(project_dir) else None
+            if wallpaper or not os.path.isdir(project_dir):
+                self.pending.remove(project_dir)
+                changed = True
+            if wallpaper and str(wallpaper) not in self.items:
+                self.items[str(wallpaper)] = "wallpaper_engine"
+                self.bag.add(str(wallpaper))
+        return changed
+
+    def next_wallpaper(self, sources=None):
+        """Next (source, path) from the shuffled bag, preferring the given sources.
+
+        Returns (None, None) when the library is empty.
+        """
+        with self.lock:
+            changed = self.refresh()
+            try:
+                allowed = {path for path, source in self.items.items() if not sources or source in sources} \
+                    or set(self.items)
+                while True:
+                    choice = self.bag.draw(allowed)
+                    if choice is None:
+                        return None, None
+                    changed = True
+                    if os.path.exists(choice):
+                        return self.items[choice], Path(choice)
+                    # Deleted behind our back, forget it
+                    self.items.pop(choice, None)
+                    allowed.discard(choice)
+            finally:
+                if changed:
+                    self.save()
+
+def get_local_library(config):
+    """The library of the save location."""
+    return per_location(config, LIBRARY_FILE, lambda path: LocalLibrary(path.parent))
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the duration histogram buckets, +Inf is implied
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+metrics_lock = threading.Lock()
+histograms = {}  # (stage, source) -> {"buckets": [...], "count": n, "sum": seconds}
+counters = {}    # (name, source) -> value
+
+def observe_duration(stage, source, seconds):
+    """Record one duration of a stage (api_fetch, image_download, ...) for a source."""
+    with metrics_lock:
+        histogram = histograms.get((stage, source))
+        if histogram is None:
+            histogram = histograms[(stage, source)] = {
+                "buckets": [0] * len(DURATION_BUCKETS), "count": 0, "sum": 0.0
+            }
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+                break
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+
+def increment(name, source="", amount=1):
+    with metrics_lock:
+        counters[(name, source)] = counters.get((name, source), 0) + amount
+
+@contextmanager
+def timed(stage, source=""):
+    """Time the block as one observation of stage, also when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_duration(stage, source, time.perf_counter() - start)
+
+def reset_metrics():
+    with metrics_lock:
+        histograms.clear()
+        counters.clear()
+
+def snapshot():
+    """Current metrics as plain data, bucket counts are per bucket (not cumulative)."""
+    with metrics_lock:
+        stages = {}
+        for (stage, source), histogram in histograms.items():
+            stages.setdefault(stage, {})[source] = {
+                "count": histogram["count"],
+                "sum": round(histogram["sum"], 6),
+                "buckets": dict(zip([str(bound) for bound in DURATION_BUCKETS], histogram["buckets"]))
+            }
+        totals = {}
+        for (name, source), value in counters.items():
+            totals.setdefault(name, {})[source] = value
+    return {"timestamp": time.time(), "stages": stages, "counters": totals}
+
+def render_prometheus():
+    """Metrics in the Prometheus text exposition format."""
+    lines = ["# TYPE wallyouneed_stage_duration_seconds histogram"]
+    with metrics_lock:
+        for (stage, source), histogram in sorted(histograms.items()):
+            labels = f'stage="{stage}",source="{source}"'
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                cumulative += count
+                lines.append(f'wallyouneed_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'wallyouneed_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f'wallyouneed_stage_duration_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+            lines.append(f'wallyouneed_stage_duration_seconds_count{{{labels}}} {histogram["count"]}')
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE wallyouneed_{name}_total counter")
+            for (counter_name, source), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f'wallyouneed_{name}_total{{source="{source}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def dump_metrics(path):
+    """Write the metrics to path, as JSON for .json files and Prometheus text otherwise."""
+    try:
+        content = json.dumps(snapshot(), indent=4) if str(path).endswith(".json") else render_prometheus()
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(content)
+        os.replace(temp_path, path)  # Readers never see a half-written file
+    except OSError as e:
+        logging.error(f"Failed to write metrics to {path}: {e}")
@@ -0,0 +1,157 @@
+import re
+import sys
+import math
+import time
+import shutil
+import logging
+import threading
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from python.wallpaper_setter import resolve_spanning_setter
+
+SPANNED_FILE = "spanned_wallpaper.jpg"
+# Beyond this many monitors the assignment is greedy instead of trying every permutation
+EXHAUSTIVE_MATCH_LIMIT = 6
+# xrandr --listmonitors line: " 0: +*DP-1 2560/597x1440/336+0+0  DP-1"
+XRANDR_MONITOR = re.compile(r"^\s*\d+:\s+\+?(\*?)\S+\s+(\d+)/\d+x(\d+)/\d+\+(-?\d+)\+(-?\d+)")
+# The layout is read again after this many seconds, so a monitor plugged in is picked up within a few cycles
+LAYOUT_MAX_AGE = 300
+
+# Last layout read: (monotonic time it was read at, monitors)
+cached_layout = None
+layout_lock = threading.Lock()
+
+def detect_monitors_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class MONITORINFO(ctypes.Structure):
+        _fields_ = [("cbSize", wintypes.DWORD), ("rcMonitor", wintypes.RECT),
+                    ("rcWork", wintypes.RECT), ("dwFlags", wintypes.DWORD)]
+
+    monitors = []
+
+    def callback(handle, dc, rect, data):
+        info = MONITORINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if ctypes.windll.user32.GetMonitorInfoW(handle, ctypes.byref(info)):
+            bounds = info.rcMonitor
+            monitors.append({"x": bounds.left, "y": bounds.top, "width": bounds.right - bounds.left,
+                             "height": bounds.bottom - bounds.top, "primary": bool(info.dwFlags & 1)})
+        return 1
+
+    enum_proc = ctypes.WINFUNCTYPE(ctypes.c_int, wintypes.HMONITOR, wintypes.HDC,
+                                   ctypes.POINTER(wintypes.RECT), wintypes.LPARAM)
+    ctypes.windll.user32.EnumDisplayMonitors(None, None, enum_proc(callback), 0)
+    return monitors
+
+def detect_monitors_xrandr():
+    if not shutil.which("xrandr"):
+        return []
+    result = subprocess.run(["xrandr", "--listmonitors"], capture_output=True, text=True)
+    monitors = []
+    for line in result.stdout.splitlines():
+        match = XRANDR_MONITOR.match(line)
+        if match:
+            primary, width, height, x, y = match.groups()
+            monitors.append({"x": int(x), "y": int(y), "width": int(width), "height": int(height),
+                             "primary": primary == "*"})
+    return monitors
+
+def detect_monitors():
+    """Monitors as {x, y, width, height, primary} in desktop coordinates, primary first.
+
+    Empty where the layout cannot be read. The layout is cached for LAYOUT_MAX_AGE seconds.
+    """
+    global cached_layout
+    with layout_lock:
+        if cached_layout and time.monotonic() - cached_layout[0] < LAYOUT_MAX_AGE:
+            return list(cached_layout[1])
+        try:
+            monitors = detect_monitors_windows() if sys.platform == "win32" else detect_monitors_xrandr()
+        except (OSError, AttributeError) as e:
+            logging.warning(f"Cannot detect the monitor layout: {e}")
+            monitors = []
+        monitors = sorted(monitors, key=lambda monitor: (not monitor["primary"], monitor["x"], monitor["y"]))
+        cached_layout = (time.monotonic(), monitors)
+        return list(monitors)
+
+def get_spanned_monitors(config):
+    """The monitors to give one image each with MULTI_MONITOR on, empty for a single wallpaper.
+
+    Also empty with one monitor, or where the desktop cannot span an image.
+    """
+    if not config.get('MULTI_MONITOR', False) or resolve_spanning_setter() is None:
+        return []
+    monitors = detect_monitors()
+    return monitors if len(monitors) > 1 else []
+
+def match_cost(size, monitor):
+    """How badly an image of size (width, height) fits a monitor; 0 is a perfect fit."""
+    width, height = size
+    if not width or not height:
+        return math.inf
+    cost = abs(math.log((width / height) / (monitor["width"] / monitor["height"])))
+    if (width >= height) != (monitor["width"] >= monitor["height"]):
+        cost += 1  # Portrait image on a landscape monitor or the other way round
+    # Upscaling loses detail, downscaling costs nothing
+    cost += 0.5 * max(0.0, math.log((monitor["width"] * monitor["height"]) / (width * height)))
+    return cost
+
+def match_images(paths, monitors):
+    """The image for each monitor, chosen by aspect ratio, orientation and resolution.
+
+    With fewer images than monitors some images are used twice.
+    """
+    sizes = {}
+    for path in paths:
+        try:
+            with Image.open(path) as image:  # Reads the header only
+                sizes[path] = image.size
+        except OSError as e:
+            logging.warning(f"Cannot read {path}: {e}")
+    paths = [path for path in paths if path in sizes]
+    if not paths:
+        return []
+    candidates = list(itertools.islice(itertools.cycle(paths), max(len(paths), len(monitors))))
+    costs = [[match_cost(sizes[path], monitor) for path in candidates] for monitor in monitors]
+
+    if len(monitors) <= EXHAUSTIVE_MATCH_LIMIT:
+        best = min(itertools.permutations(range(len(candidates)), len(monitors)),
+                   key=lambda order: sum(costs[m][i] for m, i in enumerate(order)))
+        return [candidates[i] for i in best]
+    # Greedy: the best remaining image for each monitor in turn
+    free = set(range(len(candidates)))
+    chosen = []
+    for m in range(len(monitors)):
+        i = min(free, key=lambda i: costs[m][i])
+        free.discard(i)
+        chosen.append(candidates[i])
+    return chosen
+
+def fit_image(path, width, height):
+    with Image.open(path) as image:
+        image.draft("RGB", (width, height))  # JPEGs decode at the smallest scale still covering the monitor
+        return ImageOps.fit(image.convert("RGB"), (width, height), Image.LANCZOS)
+
+def stitch_spanned(paths, monitors, target):
+    """Draw paths[i] over monitors[i] on one image covering the whole desktop and save it to target.
+
+    Areas of the desktop's bounding box no monitor shows stay black.
+    """
+    left = min(monitor["x"] for monitor in monitors)
+    top = min(monitor["y"] for monitor in monitors)
+    right = max(monitor["x"] + monitor["width"] for monitor in monitors)
+    bottom = max(monitor["y"] + monitor["height"] for monitor in monitors)
+    canvas = Image.new("RGB", (right - left, bottom - top))
+    # Decoding and resizing release the GIL, so the images are prepared side by side
+    with ThreadPoolExecutor(max_workers=len(monitors)) as pool:
+        tiles = pool.map(lambda item: fit_image(item[0], item[1]["width"], item[1]["height"]), zip(paths, monitors))
+        for tile, monitor in zip(tiles, monitors):
+            canvas.paste(tile, (monitor["x"] - left, monitor["y"] - top))
+    temp_path = target.with_suffix(".tmp")
+    canvas.save(temp_path, "JPEG", quality=92)
+    temp_path.replace(target)
+    return target
@@ -0,0 +1,147 @@
+import json
+import atexit
+import logging
+import threading
+from pathlib import Path
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+from python.utils import per_location, write_atomic
+
+HASH_FILE = "perceptual_hashes.npz"
+# Seconds new hashes wait before the index is written, so a burst of downloads saves it once
+SAVE_DELAY = 30
+
+# Set bits of every byte value, for numpy versions without bitwise_count
+BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def dhash(image_path, hash_size=8):
+    """64-bit difference hash: compares neighbouring pixels of a 9x8 grayscale thumbnail.
+
+    Survives resizing, recompression and small crops, so the same photo uploaded
+    to Unsplash and Pexels at different sizes ends up a few bits apart.
+    Returns None when the file is not a readable image.
+    """
+    try:
+        with Image.open(image_path) as image:
+            image.draft("L", (hash_size * 8, hash_size * 8))  # Let the JPEG decoder downscale for us
+            pixels = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    except (OSError, UnidentifiedImageError) as e:
+        logging.warning(f"Cannot hash {image_path}: {e}")
+        return None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def hamming_distances(hashes, value):
+    """Hamming distance of every hash in the uint64 array to value."""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    return BYTE_POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+class PerceptualHashIndex:
+    """Hashes of every downloaded wallpaper, stored as one packed uint64 array.
+
+    Lookups are a single vectorized XOR and popcount over the array, well under
+    a millisecond for tens of thousands of hashes. Keys (file stems) are kept
+    in a parallel list. Entries outlive the files, so a photo that was cleaned
+    up is still recognised when it comes back. Only the newest max_entries are kept.
+    New hashes are written SAVE_DELAY seconds after they were added, off the
+    download path, and at exit; one lost in a crash only lets a duplicate through.
+    """
+
+    def __init__(self, path, max_entries=50000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hashes = np.zeros(1024, dtype=np.uint64)
+        self.keys = []
+        self.unsaved = 0
+        self.save_timer = None
+        self.lock = threading.Lock()
+        self.load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                hashes = data["hashes"].astype(np.uint64)
+                keys = json.loads(str(data["keys"]))
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Error reading perceptual hash index: {e}")
+            return
+        self.hashes = np.zeros(max(1024, len(hashes) * 2), dtype=np.uint64)
+        self.hashes[:len(hashes)] = hashes
+        self.keys = keys
+
+    def save(self):
+        try:
+            write_atomic(self.path, lambda f: np.savez(f, hashes=self.hashes[:len(self.keys)],
+                                                       keys=np.array(json.dumps(self.keys))), "wb")
+            self.unsaved = 0
+        except OSError as e:
+            logging.error(f"Error saving perceptual hash index: {e}")
+
+    def flush(self):
+        """Write the hashes added since the last save."""
+        with self.lock:
+            if self.save_timer:
+                self.save_timer.cancel()
+                self.save_timer = None
+            if self.unsaved:
+                self.save()
+
+    def find(self, value, max_distance):
+        """Key of the closest stored hash within max_distance bits, or None."""
+        with self.lock:
+            if not self.keys:
+                return None
+            distances = hamming_distances(self.hashes[:len(self.keys)], value)
+            closest = int(np.argmin(distances))
+            if distances[closest] > max_distance:
+                return None
+            return self.keys[closest]
+
+    def add(self, key, value):
+        with self.lock:
+            count = len(self.keys)
+            if count == len(self.hashes):
+                self.hashes = np.concatenate([self.hashes, np.zeros(count, dtype=np.uint64)])
+            self.hashes[count] = value
+            self.keys.append(key)
+            if len(self.keys) > self.max_entries:
+                drop = len(self.keys) - self.max_entries
+                self.hashes[:self.max_entries] = self.hashes[drop:len(self.keys)]
+                del self.keys[:drop]
+            self.unsaved += 1
+            if self.save_timer is None:
+                self.save_timer = threading.Timer(SAVE_DELAY, self.flush)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+def get_hash_index(config):
+    """The index stored in the save location."""
+    def open_index(path):
+        index = PerceptualHashIndex(path, int(config.get('DEDUPE_MAX_ENTRIES', 50000)))
+        atexit.register(index.flush)
+        return index
+    return per_location(config, HASH_FILE, open_index)
+
+def check_near_duplicate(config, image_path):
+    """Record the image in the hash index unless it is a near-duplicate of one already seen.
+
+    Returns the key of the earlier wallpaper it duplicates, or None when the
+    image is new (or deduplication is off or the image cannot be hashed).
+    """
+    if not config.get('DEDUPE_ENABLED', True):
+        return None
+    value = dhash(image_path)
+    if value is None:
+        return None
+    index = get_hash_index(config)
+    duplicate_of = index.find(value, int(config.get('DEDUPE_MAX_DISTANCE', 6)))
+    if duplicate_of is None:
+        index.add(Path(image_path).stem, value)
+    return duplicate_of
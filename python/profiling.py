@@ -0,0 +1,82 @@
+import os
+import time
+import random
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+from python.utils import get_base_path
+
+profile_next = threading.Event()
+
+def get_profile_dir():
+    """Profiles go to logs/profiles next to config.json."""
+    return Path(get_base_path()) / "logs" / "profiles"
+
+def get_sample_rate(config):
+    """Share of cycles to profile, WALLYOUNEED_PROFILE overrides PROFILE_SAMPLE_RATE."""
+    value = os.environ.get('WALLYOUNEED_PROFILE') or config.get('PROFILE_SAMPLE_RATE', "0")
+    try:
+        return max(0.0, min(1.0, float(value)))
+    except ValueError:
+        logging.warning(f"Invalid profile sample rate: {value}")
+        return 0.0
+
+def request_profile():
+    """Profile the next cycle regardless of the sample rate."""
+    profile_next.set()
+
+def prune_profiles(profile_dir, keep):
+    """Keep only the newest profiles so sampling can stay on for weeks."""
+    runs = sorted({path.name.split(".")[0] for path in profile_dir.iterdir()}, reverse=True)
+    for run in runs[keep:]:
+        for path in profile_dir.glob(f"{run}.*"):
+            path.unlink(missing_ok=True)
+
+@contextmanager
+def profile_cycle(config, label):
+    """Run the block under cProfile and tracemalloc if this cycle is sampled.
+
+    Writes <timestamp>_<label>.prof (open with pstats or snakeviz) and
+    <timestamp>_<label>.snapshot (tracemalloc.Snapshot.load) to the profile dir.
+    """
+    if not profile_next.is_set() and random.random() >= get_sample_rate(config):
+        yield
+        return
+    profile_next.clear()
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(10)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+        write_profile(config, label, profiler, snapshot)
+
+def write_profile(config, label, profiler, snapshot):
+    profile_dir = get_profile_dir()
+    try:
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        base = profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}_{label}"
+        profiler.dump_stats(f"{base}.prof")
+        snapshot.dump(f"{base}.snapshot")
+        prune_profiles(profile_dir, int(config.get('PROFILE_KEEP', "20")))
+    except OSError as e:
+        logging.error(f"Failed to write profile: {e}")
+        return
+
+    top_calls = pstats.Stats(profiler).sort_stats("cumulative")
+    total = getattr(top_calls, "total_tt", 0)
+    top_allocations = snapshot.statistics("lineno")[:3]
+    logging.info(f"Profiled {label} cycle ({total:.2f}s CPU) to {base}.prof")
+    for stat in top_allocations:
+        logging.info(f"Top allocation: {stat}")
@@ -0,0 +1,176 @@
+import os
+import re
+import abc
+import math
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from python.bandwidth import download_allowance, copy_limited
+from python.credentials import get_credentials
+from python.http_session import get_session, MAX_PARALLEL_DOWNLOADS
+from python.metrics import timed, increment
+from python.wallpaper_setter import apply_wallpaper
+from python.work_queue import get_work_queue, work_item_id, part_path, FETCHED, DOWNLOADING, DOWNLOADED
+
+class WallpaperProvider(abc.ABC):
+    """A source of wallpapers the engine rotates through.
+
+    An item is a dict with at least "id", "photographer" and "url". Providers
+    with several sizes per image also put their "renditions" in it, and
+    select_rendition picks one before the download. The defaults describe a
+    provider of image URLs, downloaded with the shared pooled downloader
+    into folder under the save location and set as the desktop wallpaper.
+    """
+
+    name = None            # Source name in config (SOURCE_<NAME>), history, metrics and budgets
+    label = None           # Shown in the GUI
+    folder = None          # Downloads go here under the save location; None keeps no copies
+    credential_vars = []   # Environment variables the provider cannot fetch without
+    spans = True           # Can give every monitor its own image
+    dedupe = True          # Near-duplicate downloads are dropped (and deleted)
+    desktop_image = True   # Set as the desktop image under the selection rules; False for items another program plays
+
+    @property
+    def config_key(self):
+        return f"SOURCE_{self.name.upper()}"
+
+    def is_available(self, config):
+        """Whether it can fetch at all, e.g. has its API keys."""
+        return all(get_credentials().get(name) for name in self.credential_vars)
+
+    def fetch_count(self, config, monitors):
+        """Items one cycle fetches: an image per spanned monitor."""
+        return max(1, len(monitors))
+
+    @abc.abstractmethod
+    def fetch(self, config, count, stop_event=None):
+        """Up to count new items, with as few requests as the service allows. Empty on failure."""
+
+    def select_rendition(self, item, size=None):
+        """URL to download for an item, the smallest rendition covering size (width, height) if given."""
+        return item["url"]
+
+    def file_name(self, item):
+        photographer = re.sub(r"[^\w-]", "_", str(item.get("photographer") or "unknown"))
+        return f"{item['id']}_{photographer}.jpg"
+
+    def metadata(self, item):
+        """Manifest fields describing where an item came from."""
+        return {"id": str(item["id"]), "photographer": item.get("photographer"), "url": item["url"]}
+
+    def download(self, config, items, directory, size=None, stop_event=None):
+        """Download items into directory, several at once, and return a manifest for each saved file.
+
+        Manifests hold the metadata plus path, size, sha256 and timing, so callers never look for files.
+        """
+        if stop_event and stop_event.is_set():
+            return []
+        directory.mkdir(parents=True, exist_ok=True)
+        queue = get_work_queue(config)
+        for item in items:
+            item["url"] = self.select_rendition(item, size)
+            queue.record(work_item_id(self.name, item["id"]), FETCHED, source=self.name, wallpaper=item,
+                         path=str(directory / self.file_name(item)))
+        if len(items) <= 1:
+            manifests = [download_image(self, config, item, directory) for item in items]
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(items), MAX_PARALLEL_DOWNLOADS)) as pool:
+                manifests = list(pool.map(lambda item: download_image(self, config, item, directory), items))
+        return [manifest for manifest in manifests if manifest]
+
+    def apply(self, wallpaper_path):
+        """Set the wallpaper, skipping it when the same file is already applied."""
+        return apply_wallpaper(wallpaper_path)
+
+    def cleanup(self, config, save_path):
+        """Drop old downloads kept outside folder; the engine cleans up folder itself."""
+
+def covering_width(width, height, size):
+    """Width a width x height image must be scaled to so it covers size (width, height).
+
+    None when that is no smaller than the image itself (or the sizes are unknown).
+    """
+    if not width or not height or size is None:
+        return None
+    needed = math.ceil(width * max(size[0] / width, size[1] / height))
+    return needed if needed < width else None
+
+def complete_length(response):
+    """Full size of the file from the Content-Range of a 206 or 416 response, None when not given."""
+    match = re.search(r"/(\d+)\s*$", response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+def download_image(provider, config, item, directory):
+    """Download one item with the shared session and return its manifest, None when it failed or was deferred.
+
+    The file is written as .part and renamed once complete; an interrupted
+    download continues where it stopped when the server supports ranges.
+    Every step is journaled in the work queue.
+    """
+    queue = get_work_queue(config)
+    item_id = work_item_id(provider.name, item["id"])
+    file_path = directory / provider.file_name(item)
+    partial = part_path(file_path)
+    try:
+        started = time.perf_counter()
+        allowance = download_allowance(config, provider.name)
+        with timed("image_download", provider.name):
+            offset = partial.stat().st_size if partial.exists() else 0
+            # Images are streamed to disk undecoded, so ask for them as they are
+            headers = {"Accept-Encoding": "identity"}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+            response = get_session().get(item["url"], stream=True, headers=headers)
+            # Nothing left after the offset: the crash came between the last byte and the rename
+            complete = bool(offset) and response.status_code == 416 and complete_length(response) == offset
+            if complete:
+                response.close()
+                logging.info(f"{file_path.name} was complete already")
+            else:
+                if response.status_code == 416:
+                    partial.unlink(missing_ok=True)  # Does not match the file on the server, start over next time
+                response.raise_for_status()
+                if response.status_code != 206:
+                    offset = 0  # Sent in full, start over
+            size = 0 if complete else int(response.headers.get("Content-Length", 0))
+            if allowance is not None and size > allowance:
+                # Over the budget, or too big to fetch while the link is in use: resumed once it fits
+                response.close()
+                if queue.defer(item_id, size, source=provider.name, wallpaper=item, path=str(file_path)):
+                    logging.info(f"Deferring {item['url']}, {size} bytes is over the allowance of {allowance}")
+                    increment("downloads_deferred", provider.name)
+                else:
+                    logging.info(f"Skipping {item['url']}, {size} bytes is over the allowance and enough are deferred")
+                    queue.discard(item_id)
+                return None
+            if not complete:
+                queue.record(item_id, DOWNLOADING, source=provider.name, wallpaper=item, path=str(file_path))
+            digest = hashlib.sha256()
+            if offset:
+                logging.info(f"Resuming {file_path.name} at {offset} bytes")
+                with open(partial, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            size = offset
+            if not complete:
+                with open(partial, "ab" if offset else "wb") as f:
+                    size += copy_limited(response, f, provider.name, config, digest)
+            os.replace(partial, file_path)
+        increment("download_bytes", provider.name, size - offset)
+        manifest = {
+            "source": provider.name,
+            **provider.metadata(item),
+            "path": file_path,
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "downloaded_at": time.time(),
+            "download_seconds": round(time.perf_counter() - started, 3)
+        }
+        queue.record(item_id, DOWNLOADED, manifest={**manifest, "path": str(file_path)})
+        logging.info(f"Saved wallpaper to {file_path}")
+        return manifest
+    except requests.RequestException as e:
+        logging.error(f"Failed to download wallpaper from {item['url']}: {e}")
+        return None
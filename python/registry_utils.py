@@ -1,18 +1,20 @@
 import logging
-import winreg
-from pathlib import Path
+from python.setter_backend import get_setter_state
 
-def set_wallpaper_style():
-    """Set the desktop wallpaper style to 'fit'."""
-    try:
-        reg_key = r"Control Panel\Desktop"
-
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, reg_key, 0, winreg.KEY_SET_VALUE) as key:
-            # Set the wallpaper style to 'fit'
-            winreg.SetValueEx(key, "WallpaperStyle", 0, winreg.REG_SZ, "6")
-            winreg.SetValueEx(key, "TileWallpaper", 0, winreg.REG_SZ, "0")
+DESKTOP_KEY = r"Control Panel\Desktop"
+PERSONALIZATION_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\PersonalizationCSP"
 
-        logging.info("Desktop wallpaper style set to 'fit'")
+def set_wallpaper_style(span=False):
+    """Set the desktop wallpaper style to 'fit', or to 'span' for one image across all monitors."""
+    try:
+        # Set the wallpaper style to 'fit' (6) or 'span' (22)
+        changed = get_setter_state().write_registry_values("HKEY_CURRENT_USER", DESKTOP_KEY, {
+            "WallpaperStyle": ("REG_SZ", "22" if span else "6"),
+            "TileWallpaper": ("REG_SZ", "0")
+        })
+
+        if changed:
+            logging.info(f"Desktop wallpaper style set to '{'span' if span else 'fit'}'")
     except Exception as e:
         logging.error(f"Failed to set desktop wallpaper style: {e}")
 
@@ -24,28 +26,29 @@ def set_lock_screen_wallpaper(image_path):
 
     try:
         image_path_str = str(image_path)  # Convert Path object to string
-        reg_key = r"SOFTWARE\Microsoft\Windows\CurrentVersion\PersonalizationCSP"
 
-        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_key, 0, winreg.KEY_SET_VALUE) as key:
+        changed = get_setter_state().write_registry_values("HKEY_LOCAL_MACHINE", PERSONALIZATION_KEY, {
             # Set the LockScreenImagePath as a REG_SZ (string)
-            winreg.SetValueEx(key, "LockScreenImagePath", 0, winreg.REG_SZ, image_path_str)
+            "LockScreenImagePath": ("REG_SZ", image_path_str),
             # Set the LockScreenImageStatus as a REG_DWORD (integer)
-            winreg.SetValueEx(key, "LockScreenImageStatus", 0, winreg.REG_DWORD, 1)
+            "LockScreenImageStatus": ("REG_DWORD", 1)
+        })
 
-        logging.info(f"Lock screen wallpaper set to {image_path_str}")
+        if changed:
+            logging.info(f"Lock screen wallpaper set to {image_path_str}")
     except Exception as e:
         logging.error(f"Failed to set lock screen wallpaper: {e}")
 
-# this maybe doesnt work? i dont know. its made up by ai. 
+# this maybe doesnt work? i dont know. its made up by ai.
 def set_lock_screen_wallpaper_style():
     """Set the lock screen wallpaper style to 'fit'."""
     try:
-        reg_key = r"SOFTWARE\Microsoft\Windows\CurrentVersion\PersonalizationCSP"
-
-        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_key, 0, winreg.KEY_SET_VALUE) as key:
-            # Ensure the lock screen image is set to 'fit'
-            winreg.SetValueEx(key, "LockScreenImageFit", 0, winreg.REG_DWORD, 1)
+        # Ensure the lock screen image is set to 'fit'
+        changed = get_setter_state().write_registry_values("HKEY_LOCAL_MACHINE", PERSONALIZATION_KEY, {
+            "LockScreenImageFit": ("REG_DWORD", 1)
+        })
 
-        logging.info("Lock screen wallpaper style set to 'fit'")
+        if changed:
+            logging.info("Lock screen wallpaper style set to 'fit'")
     except Exception as e:
-        logging.error(f"Failed to set lock screen wallpaper style: {e}")
\ No newline at end of file
+        logging.error(f"Failed to set lock screen wallpaper style: {e}")
@@ -0,0 +1,95 @@
+import os
+import logging
+import threading
+
+try:
+    import winreg
+except ImportError:  # Not on Windows, there is no registry to write to
+    winreg = None
+
+class SystemSetterBackend:
+    """Backend that writes to the real registry and desktop."""
+
+    supports_registry = winreg is not None
+
+    def write_registry_values(self, hive, key, values):
+        """Write {name: (kind, value)} under one registry key, opening it only once."""
+        with winreg.OpenKey(getattr(winreg, hive), key, 0, winreg.KEY_SET_VALUE) as reg_key:
+            for name, (kind, value) in values.items():
+                winreg.SetValueEx(reg_key, name, 0, getattr(winreg, kind), value)
+
+    def apply_wallpaper(self, file_path, apply):
+        apply(file_path)
+
+class FakeSetterBackend:
+    """In-memory backend for tests, records every write instead of touching the system."""
+
+    supports_registry = True
+
+    def __init__(self):
+        self.registry = {}
+        self.wallpaper = None
+        self.calls = []
+
+    def write_registry_values(self, hive, key, values):
+        self.calls.append(("registry", hive, key, dict(values)))
+        for name, value in values.items():
+            self.registry[(hive, key, name)] = value
+
+    def apply_wallpaper(self, file_path, apply):
+        self.calls.append(("wallpaper", str(file_path)))
+        self.wallpaper = str(file_path)
+
+class SetterState:
+    """Remembers what was last applied so repeated sets cost nothing.
+
+    Registry values are compared per (hive, key, name) and only changed ones
+    are written, each key opened once. The wallpaper is skipped when the same
+    unchanged file is set again.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.registry = {}
+        self.wallpaper = None
+        self.lock = threading.RLock()
+
+    def write_registry_values(self, hive, key, values):
+        """Write the values that differ from the last write. Returns True if any did."""
+        if not self.backend.supports_registry:
+            return False
+        with self.lock:
+            changed = {name: value for name, value in values.items()
+                       if self.registry.get((hive, key, name)) != value}
+            if not changed:
+                return False
+            self.backend.write_registry_values(hive, key, changed)
+            for name, value in changed.items():
+                self.registry[(hive, key, name)] = value
+            return True
+
+    def apply_wallpaper(self, file_path, apply):
+        """Apply the wallpaper with apply(file_path) unless it is already the current one."""
+        try:
+            stat = os.stat(file_path)
+            state = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            state = (os.path.abspath(file_path), None, None)
+        with self.lock:
+            if state == self.wallpaper:
+                logging.info(f"{file_path} is already the wallpaper, skipping")
+                return False
+            self.backend.apply_wallpaper(file_path, apply)
+            self.wallpaper = state
+            return True
+
+setter_state = SetterState(SystemSetterBackend())
+
+def get_setter_state():
+    return setter_state
+
+def set_setter_backend(backend):
+    """Swap the backend (e.g. FakeSetterBackend in tests), forgetting what was applied."""
+    global setter_state
+    setter_state = SetterState(backend)
+    return setter_state
@@ -0,0 +1,15 @@
+from python.unsplash import UnsplashProvider
+from python.pexels import PexelsProvider
+from python.wallpaper_engine import WallpaperEngineProvider
+from python.local_folders import LocalFolderProvider
+from python.feeds import FeedProvider
+
+# Every wallpaper source by name, in the order the GUI lists them.
+# A new source is a WallpaperProvider subclass added here (plus its SOURCE_<NAME> config default).
+PROVIDERS = {provider.name: provider for provider in [
+    UnsplashProvider(),
+    PexelsProvider(),
+    WallpaperEngineProvider(),
+    LocalFolderProvider(),
+    FeedProvider()
+]}
@@ -0,0 +1,86 @@
+import pytest
+import requests
+from python import http_session, utils
+from python.http_session import conditional_get, HttpResult
+
+def make_response(status, body=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers.update(headers or {})
+    response.encoding = "utf-8"
+    response.url = "https://example.com/feed"
+    return response
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+        self.urls = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent.append(dict(headers or {}))
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "location_objects", {})
+    return {"SAVE_LOCATION": str(tmp_path), "HTTP_CACHE_MAX_MB": "1"}
+
+def use_session(monkeypatch, session):
+    monkeypatch.setattr(http_session, "get_session", lambda: session)
+    return session
+
+def test_not_modified_is_answered_from_the_cache(config, monkeypatch):
+    session = use_session(monkeypatch, FakeSession(
+        make_response(200, b'{"photos": [1]}', {"ETag": '"v1"'}),
+        make_response(304, headers={"ETag": '"v1"'})
+    ))
+    first = conditional_get("https://example.com/feed", config)
+    second = conditional_get("https://example.com/feed", config)
+    assert session.sent[1] == {"If-None-Match": '"v1"'}
+    assert isinstance(second, HttpResult) and second.not_modified
+    second.raise_for_status()
+    assert second.status_code == 200
+    assert second.json() == first.json() == {"photos": [1]}
+    assert second.text == '{"photos": [1]}'
+
+def test_lost_cache_body_is_fetched_again(config, monkeypatch):
+    session = use_session(monkeypatch, FakeSession(
+        make_response(200, b"first", {"ETag": '"v1"'}),
+        make_response(304),
+        make_response(200, b"again", {"ETag": '"v1"'})
+    ))
+    conditional_get("https://example.com/feed", config)
+    cache = http_session.get_http_cache(config)
+    (cache.directory / cache.key("https://example.com/feed")).unlink()
+    result = conditional_get("https://example.com/feed", config)
+    assert result.content == b"again" and not result.not_modified
+    assert session.sent[2] == {}
+
+def test_errors_are_left_to_the_caller(config, monkeypatch):
+    use_session(monkeypatch, FakeSession(make_response(500, b"oops")))
+    result = conditional_get("https://example.com/feed", config)
+    assert result.status_code == 500
+    with pytest.raises(requests.HTTPError):
+        result.raise_for_status()
+
+def test_invalid_json_raises_a_requests_error(config, monkeypatch):
+    use_session(monkeypatch, FakeSession(make_response(200, b"<html>")))
+    with pytest.raises(requests.RequestException):
+        conditional_get("https://example.com/feed", config).json()
+
+def test_session_reads_proxies_from_the_environment():
+    assert http_session.PooledSession().trust_env
+
+def test_params_are_encoded_and_cached_per_query(config, monkeypatch):
+    session = use_session(monkeypatch, FakeSession(
+        make_response(200, b"{}", {"ETag": '"v1"'}),
+        make_response(200, b"{}", {"ETag": '"v2"'})
+    ))
+    conditional_get("https://example.com/search", config, params={"query": "night & day #1"})
+    conditional_get("https://example.com/search", config, params={"query": "forest"})
+    assert session.urls[0] == "https://example.com/search?query=night+%26+day+%231"
+    # The second query does not revalidate against the first one's ETag
+    assert session.sent[1] == {}
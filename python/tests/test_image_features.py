@@ -0,0 +1,103 @@
+import time
+import numpy as np
+import pytest
+from PIL import Image
+from python.image_features import ImageFeatureIndex, active_rules, rule_is_active, compute_features, get_query
+
+def at(hour, minute=0):
+    return time.struct_time((2026, 1, 1, hour, minute, 0, 3, 1, 0))
+
+def features(brightness=0.5, aspect=16 / 9, colors=(0x101010,) * 3):
+    return {"brightness": brightness, "aspect": aspect, "colors": list(colors)}
+
+@pytest.fixture
+def index(tmp_path):
+    index = ImageFeatureIndex(tmp_path / "image_features.npz")
+    for name, values in {
+        "dark_wide": features(0.1, 21 / 9, (0x303030, 0x101010, 0x101010)),
+        "dark_16x9": features(0.2, 16 / 9, (0x1070d0, 0x101010, 0x101010)),
+        "bright_16x9": features(0.9, 16 / 9, (0xf0f0f0, 0xd05010, 0xd05010)),
+        "bright_portrait": features(0.8, 9 / 16, (0xf0f0f0, 0xf0f0f0, 0xf0f0f0)),
+    }.items():
+        path = tmp_path / f"{name}.jpg"
+        path.write_bytes(b"")
+        index.add("pexels" if "16x9" in name else "unsplash", path, values)
+    return index
+
+def names(index, rules):
+    return sorted(path.rsplit("/", 1)[-1][:-4] for path, keep in zip(index.paths, index.match(rules)) if keep)
+
+def test_rules_without_a_window_always_apply():
+    assert rule_is_active({"min_brightness": 0.5}, at(3))
+
+@pytest.mark.parametrize("hour, active", [(6, False), (7, True), (12, True), (18, False)])
+def test_time_window(hour, active):
+    assert rule_is_active({"after": "07:00", "before": "18:00"}, at(hour)) == active
+
+@pytest.mark.parametrize("hour, minute, active", [(21, 59, False), (22, 0, True), (2, 0, True), (6, 30, False)])
+def test_time_window_past_midnight(hour, minute, active):
+    assert rule_is_active({"after": "22:00", "before": "06:30"}, at(hour, minute)) == active
+
+def test_active_rules_skips_invalid_rules(caplog):
+    config = {"SELECTION_RULES": [{"after": "20:00", "max_brightness": 0.3}, {"source": "pexels"}]}
+    assert active_rules(config, at(21)) == config["SELECTION_RULES"]
+    assert active_rules(config, at(9)) == [{"source": "pexels"}]
+    assert active_rules({"SELECTION_RULES": [{"after": "late"}]}, at(9)) == []
+    assert "Invalid SELECTION_RULES" in caplog.text
+
+def test_brightness_rules(index):
+    assert names(index, [{"max_brightness": 0.3}]) == ["dark_16x9", "dark_wide"]
+    assert names(index, [{"min_brightness": 0.85}]) == ["bright_16x9"]
+
+def test_aspect_rules(index):
+    assert names(index, [{"aspect": "16:9"}]) == ["bright_16x9", "dark_16x9"]
+    assert names(index, [{"aspect": "16:9", "aspect_tolerance": 0.5}]) == ["bright_16x9", "dark_16x9", "dark_wide"]
+    assert names(index, [{"max_aspect": 1}]) == ["bright_portrait"]
+    assert names(index, [{"min_aspect": "2:1"}]) == ["dark_wide"]
+
+def test_color_rule(index):
+    assert names(index, [{"color": "#d05010"}]) == ["bright_16x9"]
+    assert names(index, [{"color": "#1070d0", "color_distance": 10}]) == ["dark_16x9"]
+
+def test_rules_combine(index):
+    assert names(index, [{"source": "pexels"}, {"max_brightness": 0.5}]) == ["dark_16x9"]
+    assert names(index, [{"source": "pexels", "max_aspect": 1}]) == []
+    assert names(index, []) == ["bright_16x9", "bright_portrait", "dark_16x9", "dark_wide"]
+
+def test_pick_skips_excluded_and_drops_missing_files(index, tmp_path):
+    (tmp_path / "dark_wide.jpg").unlink()
+    rules = [{"max_brightness": 0.3}]
+    assert index.pick(rules, exclude={str(tmp_path / "dark_16x9.jpg")}) is None
+    assert str(tmp_path / "dark_wide.jpg") not in index.paths
+    assert len(ImageFeatureIndex(index.path)) == 3
+    assert index.pick(rules) == str(tmp_path / "dark_16x9.jpg")
+
+def test_pick_locates_moved_files(index, tmp_path):
+    moved = str(tmp_path / "archive" / "bright_portrait.jpg")
+    picked = index.pick([{"max_aspect": 1}], locate=lambda path: moved)
+    assert picked == moved
+
+def test_matches_and_reload(index, tmp_path):
+    assert index.matches(tmp_path / "dark_wide.jpg", [{"max_brightness": 0.3}])
+    assert not index.matches(tmp_path / "dark_wide.jpg", [{"source": "pexels"}])
+    assert not index.matches(tmp_path / "unknown.jpg", [])
+    reloaded = ImageFeatureIndex(index.path)
+    assert reloaded.paths == index.paths
+    assert names(reloaded, [{"color": "#d05010"}]) == ["bright_16x9"]
+
+def test_compute_features(tmp_path):
+    path = tmp_path / "red.jpg"
+    pixels = np.zeros((100, 200, 3), dtype=np.uint8)
+    pixels[..., 0] = 250
+    Image.fromarray(pixels).save(path)
+    result = compute_features(path)
+    assert result["aspect"] == 2.0
+    assert result["brightness"] == pytest.approx(0.299 * 250 / 255, abs=0.02)
+    assert result["colors"][0] == 0xf01010
+    assert compute_features(tmp_path / "missing.jpg") is None
+
+def test_rule_query_wins():
+    config = {"SELECTION_RULES": [{"query": "night city"}], "PEXELS_QUERY": "forest"}
+    assert get_query(config, "pexels") == "night city"
+    assert get_query({"PEXELS_QUERY": "forest"}, "pexels") == "forest"
+    assert get_query({}, "unsplash") == "landscape"
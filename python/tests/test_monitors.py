@@ -0,0 +1,17 @@
+from python import monitors
+
+def test_layout_is_read_once_per_max_age(monkeypatch):
+    reads = []
+    layout = [{"x": 1920, "y": 0, "width": 1920, "height": 1080, "primary": False},
+              {"x": 0, "y": 0, "width": 2560, "height": 1440, "primary": True}]
+    monkeypatch.setattr(monitors.sys, "platform", "linux")
+    monkeypatch.setattr(monitors, "detect_monitors_xrandr", lambda: reads.append(1) or layout)
+    monkeypatch.setattr(monitors, "cached_layout", None)
+    now = [1000.0]
+    monkeypatch.setattr(monitors.time, "monotonic", lambda: now[0])
+    assert monitors.detect_monitors()[0]["primary"]
+    assert monitors.detect_monitors() == monitors.detect_monitors()
+    assert len(reads) == 1
+    now[0] += monitors.LAYOUT_MAX_AGE
+    monitors.detect_monitors()
+    assert len(reads) == 2
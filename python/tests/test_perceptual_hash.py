@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from PIL import Image
+from python import utils
+from python.perceptual_hash import dhash, hamming_distances, check_near_duplicate, get_hash_index, PerceptualHashIndex
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "location_objects", {})
+    return {"SAVE_LOCATION": str(tmp_path)}
+
+def save_photo(path, size=(640, 400), flip=False, quality=90):
+    """A smooth two-axis gradient with a bright block, so its hash has bits either way."""
+    x = np.linspace(0, 255, size[0])
+    y = np.linspace(0, 255, size[1])
+    pixels = (x[None, :] * 0.7 + y[:, None] * 0.3).astype(np.uint8)
+    pixels[size[1] // 4:size[1] // 2, size[0] // 5:size[0] // 3] = 255
+    if flip:
+        pixels = pixels[:, ::-1]
+    Image.fromarray(np.stack([pixels] * 3, axis=-1)).save(path, quality=quality)
+    return path
+
+def test_hamming_distances():
+    hashes = np.array([0, 0b1011, 2**64 - 1], dtype=np.uint64)
+    assert list(hamming_distances(hashes, 0)) == [0, 3, 64]
+    assert list(hamming_distances(hashes, 0b1000)) == [1, 2, 63]
+
+def test_resized_copy_is_a_near_duplicate(tmp_path, config):
+    original = save_photo(tmp_path / "unsplash_1.jpg")
+    copy = save_photo(tmp_path / "pexels_2.jpg", size=(1280, 800), quality=60)
+    assert check_near_duplicate(config, original) is None
+    assert check_near_duplicate(config, copy) == "unsplash_1"
+    # The duplicate is not indexed itself
+    assert len(get_hash_index(config)) == 1
+
+def test_different_image_is_not_a_duplicate(tmp_path, config):
+    assert check_near_duplicate(config, save_photo(tmp_path / "a.jpg")) is None
+    assert check_near_duplicate(config, save_photo(tmp_path / "b.jpg", flip=True)) is None
+    assert len(get_hash_index(config)) == 2
+
+@pytest.mark.parametrize("max_distance, expected", [(2, None), (3, "earlier"), (6, "earlier")])
+def test_max_distance_threshold(tmp_path, config, max_distance, expected):
+    path = save_photo(tmp_path / "a.jpg")
+    get_hash_index(config).add("earlier", dhash(path) ^ 0b111)  # Three bits apart
+    config["DEDUPE_MAX_DISTANCE"] = max_distance
+    assert check_near_duplicate(config, path) == expected
+
+@pytest.mark.parametrize("flipped, expected", [(0b111111, "earlier"), (0b1111111, None)])
+def test_default_max_distance_is_six_bits(tmp_path, config, flipped, expected):
+    path = save_photo(tmp_path / "a.jpg")
+    get_hash_index(config).add("earlier", dhash(path) ^ flipped)
+    assert check_near_duplicate(config, path) == expected
+
+def test_dedupe_disabled_or_unreadable(tmp_path, config):
+    path = save_photo(tmp_path / "a.jpg")
+    assert check_near_duplicate({**config, "DEDUPE_ENABLED": False}, path) is None
+    assert len(get_hash_index(config)) == 0
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    assert check_near_duplicate(config, broken) is None
+    assert len(get_hash_index(config)) == 0
+
+def test_index_keeps_the_newest_entries_across_reloads(tmp_path):
+    path = tmp_path / "hashes.npz"
+    index = PerceptualHashIndex(path, max_entries=3)
+    for value in range(5):
+        index.add(f"key{value}", value)
+    assert not path.exists()  # Written later, in one go
+    index.flush()
+    reloaded = PerceptualHashIndex(path, max_entries=3)
+    assert reloaded.keys == ["key2", "key3", "key4"]
+    assert reloaded.find(4, 0) == "key4"
+    assert reloaded.find(0, 0) is None
@@ -0,0 +1,55 @@
+import logging
+import pytest
+from python import registry_utils
+from python.setter_backend import FakeSetterBackend, SetterState, set_setter_backend, SystemSetterBackend
+
+@pytest.fixture
+def backend():
+    backend = FakeSetterBackend()
+    set_setter_backend(backend)
+    yield backend
+    set_setter_backend(SystemSetterBackend())
+
+def test_only_changed_registry_values_are_written():
+    backend = FakeSetterBackend()
+    state = SetterState(backend)
+    assert state.write_registry_values("HKEY_CURRENT_USER", "Key", {"A": ("REG_SZ", "1"), "B": ("REG_SZ", "2")})
+    assert not state.write_registry_values("HKEY_CURRENT_USER", "Key", {"A": ("REG_SZ", "1")})
+    assert state.write_registry_values("HKEY_CURRENT_USER", "Key", {"A": ("REG_SZ", "1"), "B": ("REG_SZ", "3")})
+    assert backend.calls == [
+        ("registry", "HKEY_CURRENT_USER", "Key", {"A": ("REG_SZ", "1"), "B": ("REG_SZ", "2")}),
+        ("registry", "HKEY_CURRENT_USER", "Key", {"B": ("REG_SZ", "3")})
+    ]
+
+def test_nothing_is_written_without_a_registry():
+    backend = FakeSetterBackend()
+    backend.supports_registry = False
+    state = SetterState(backend)
+    assert not state.write_registry_values("HKEY_CURRENT_USER", "Key", {"A": ("REG_SZ", "1")})
+    assert backend.calls == []
+
+def test_same_unchanged_wallpaper_is_skipped(tmp_path):
+    backend = FakeSetterBackend()
+    state = SetterState(backend)
+    image = tmp_path / "wallpaper.jpg"
+    image.write_bytes(b"one")
+    assert state.apply_wallpaper(image, None)
+    assert not state.apply_wallpaper(image, None)
+    image.write_bytes(b"longer")
+    assert state.apply_wallpaper(image, None)
+    assert backend.calls == [("wallpaper", str(image)), ("wallpaper", str(image))]
+
+def test_style_and_lock_screen_are_written_in_order(backend, caplog):
+    caplog.set_level(logging.INFO)
+    registry_utils.set_wallpaper_style(span=True)
+    registry_utils.set_lock_screen_wallpaper("C:/wallpaper.jpg")
+    assert [call[2] for call in backend.calls] == [registry_utils.DESKTOP_KEY, registry_utils.PERSONALIZATION_KEY]
+    assert backend.registry[("HKEY_CURRENT_USER", registry_utils.DESKTOP_KEY, "WallpaperStyle")] == ("REG_SZ", "22")
+    assert "Lock screen wallpaper set to C:/wallpaper.jpg" in caplog.text
+
+def test_unchanged_lock_screen_is_not_logged_again(backend, caplog):
+    registry_utils.set_lock_screen_wallpaper("C:/wallpaper.jpg")
+    caplog.set_level(logging.INFO)
+    registry_utils.set_lock_screen_wallpaper("C:/wallpaper.jpg")
+    assert len(backend.calls) == 1
+    assert "Lock screen wallpaper set" not in caplog.text
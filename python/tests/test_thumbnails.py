@@ -0,0 +1,47 @@
+import threading
+import pytest
+from PIL import Image
+from python import thumbnails
+from python.thumbnails import ThumbnailCache, SLOT_SIZE
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ThumbnailCache(tmp_path / "cache", max_entries=4, workers=1)
+    yield cache
+    cache.close()
+
+def render(cache, key):
+    """Render key on the pool and wait for it; True when a thumbnail was stored."""
+    done = threading.Event()
+    cache.request(key, lambda key: done.set())
+    cache.executor.submit(lambda: None).result()  # One worker, so this runs after the render
+    return done.is_set()
+
+def test_thumbnail_is_stored_as_raw_rgb(cache, tmp_path):
+    image = tmp_path / "wallpaper.jpg"
+    Image.new("RGB", (640, 360), (200, 10, 10)).save(image)
+    assert render(cache, str(image))
+    assert len(cache.get_ppm(str(image))) == len(thumbnails.PPM_HEADER) + SLOT_SIZE
+
+@pytest.mark.parametrize("content", [b"\xff\xd8\xff\xe0truncated", b"\x89PNG\r\n\x1a\n" + b"\x00" * 40])
+def test_broken_images_are_marked_failed(cache, tmp_path, content):
+    image = tmp_path / "broken.jpg"
+    image.write_bytes(content)
+    assert not render(cache, str(image))
+    assert str(image) in cache.failed
+    assert cache.get_ppm(str(image)) is None
+
+def test_decompression_bomb_is_marked_failed(cache, tmp_path, monkeypatch):
+    image = tmp_path / "huge.png"
+    Image.new("RGB", (400, 400)).save(image)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)  # Twice this raises DecompressionBombError
+    assert not render(cache, str(image))
+    assert str(image) in cache.failed
+
+def test_failed_keys_are_not_rendered_again(cache, tmp_path, monkeypatch):
+    key = str(tmp_path / "missing.jpg")
+    assert not render(cache, key)
+    calls = []
+    monkeypatch.setattr(thumbnails, "find_image", lambda path: calls.append(path))
+    cache.request(key, lambda key: None)
+    assert calls == []
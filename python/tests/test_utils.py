@@ -0,0 +1,65 @@
+import json
+import pytest
+from python import utils
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("WALLYOUNEED_HOME", str(tmp_path))
+    monkeypatch.setattr(utils, "config_cache", {"stamp": None, "config": None})
+    return tmp_path
+
+def test_nested_values_of_a_loaded_config_are_copies(home):
+    config = utils.load_config()
+    config["SELECTION_RULES"].append({"brightness": "dark"})
+    config["BANDWIDTH_BUDGETS"]["pexels"] = {"daily_mb": 1}
+    fresh = utils.load_config()
+    assert fresh["SELECTION_RULES"] == []
+    assert fresh["BANDWIDTH_BUDGETS"] == {}
+
+def test_saved_config_is_not_shared_with_the_caller(home):
+    config = utils.load_config()
+    utils.save_config(config)
+    config["LOCAL_FOLDERS"].append("D:/Pictures")
+    assert utils.load_config()["LOCAL_FOLDERS"] == []
+
+def test_broken_config_is_not_cached(home, caplog):
+    (home / "config.json").write_text("{broken")
+    assert utils.load_config() == {}
+    assert "no configuration loaded" in caplog.text
+    (home / "config.json").write_text(json.dumps({"CHECK_INTERVAL": "60"}))
+    assert utils.load_config() == {"CHECK_INTERVAL": "60"}
+
+def test_broken_config_keeps_the_last_valid_one(home):
+    (home / "config.json").write_text(json.dumps({"CHECK_INTERVAL": "60"}))
+    utils.load_config()
+    (home / "config.json").write_text("{broken!")
+    assert utils.load_config() == {"CHECK_INTERVAL": "60"}
+
+def test_bag_hands_out_every_allowed_item_once_per_round():
+    bag = utils.ShuffledBag()
+    first = [bag.draw({"a", "b", "c"}) for _ in range(3)]
+    assert sorted(first) == ["a", "b", "c"]
+    assert bag.draw({"a", "b", "c"}) != first[-1]
+    assert bag.draw(set()) is None
+
+def test_bag_keeps_other_items_for_later():
+    bag = utils.ShuffledBag(["x", "a", "y"], last="b")
+    assert bag.draw({"a", "b"}) == "a"
+    assert bag.draw({"a", "b"}) == "b"
+    assert bag.items[:2] == ["x", "y"]
+    bag.keep({"y", "a"})
+    assert bag.items == ["y", "a"]
+
+def test_one_object_per_save_location(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "location_objects", {})
+    config = {"SAVE_LOCATION": str(tmp_path / "wallpapers")}
+    first = utils.per_location(config, "index.json", lambda path: [path])
+    assert first == [tmp_path / "wallpapers" / "index.json"]
+    assert (tmp_path / "wallpapers").is_dir()
+    assert utils.per_location(dict(config), "index.json", lambda path: []) is first
+
+def test_write_atomic_leaves_no_temp_file(tmp_path):
+    path = tmp_path / "index.json"
+    utils.write_atomic(path, lambda f: f.write("{}"))
+    assert path.read_text() == "{}"
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,102 @@
+import json
+import pytest
+from python import utils, work_queue
+from python.work_queue import (WorkQueue, get_work_queue, part_path, work_item_id, FETCHED, DOWNLOADING,
+                               DOWNLOADED, APPLIED, DISCARDED, DEFERRED, MAX_DEFERRED)
+
+@pytest.fixture
+def journal(tmp_path):
+    return tmp_path / "work_journal.jsonl"
+
+def entries(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_replay_gives_the_last_state_of_each_item(journal):
+    queue = WorkQueue(journal)
+    queue.record("pexels:1", FETCHED, source="pexels", path="a.jpg")
+    queue.record("pexels:1", DOWNLOADING)
+    queue.record("pexels:2", FETCHED, source="pexels", path="b.jpg")
+    replayed = WorkQueue(journal)
+    assert replayed.state("pexels:1") == DOWNLOADING
+    assert replayed.state("pexels:2") == FETCHED
+    assert replayed.attempts("pexels:1") == 1
+    # Data of earlier steps is merged into the item
+    assert [item["path"] for item in replayed.unfinished()] == ["a.jpg", "b.jpg"]
+
+def test_attempts_count_every_started_download(journal):
+    queue = WorkQueue(journal)
+    for _ in range(3):
+        queue.record("unsplash:1", DOWNLOADING, source="unsplash")
+    assert queue.attempts("unsplash:1") == 3
+    assert WorkQueue(journal).attempts("unsplash:1") == 3
+    assert queue.attempts("unsplash:2") == 0
+
+def test_line_cut_short_by_a_crash_is_skipped(journal):
+    queue = WorkQueue(journal)
+    queue.record("pexels:1", DOWNLOADED, source="pexels")
+    with journal.open("a") as f:
+        f.write('{"id": "pexels:1", "state": "appl')
+    assert WorkQueue(journal).state("pexels:1") == DOWNLOADED
+
+def test_load_compacts_finished_items(journal):
+    queue = WorkQueue(journal)
+    queue.record("pexels:1", FETCHED, source="pexels")
+    queue.record("pexels:1", APPLIED)
+    queue.record("pexels:2", FETCHED, source="pexels")
+    replayed = WorkQueue(journal)
+    assert replayed.state("pexels:1") is None
+    assert [entry["id"] for entry in entries(journal)] == ["pexels:2"]
+
+def test_compacts_after_enough_finished_items(journal, monkeypatch):
+    monkeypatch.setattr(work_queue, "COMPACT_AFTER", 3)
+    queue = WorkQueue(journal)
+    queue.record("feeds:open", FETCHED, source="feeds")
+    for number in range(3):
+        queue.record(f"feeds:{number}", FETCHED, source="feeds")
+        queue.record(f"feeds:{number}", DISCARDED)
+    assert [entry["id"] for entry in entries(journal)] == ["feeds:open"]
+    assert queue.finished == 0
+
+def test_unfinished_filters_by_source(journal):
+    queue = WorkQueue(journal)
+    queue.record("pexels:1", FETCHED, source="pexels")
+    queue.record("unsplash:1", FETCHED, source="unsplash")
+    queue.record("unsplash:2", APPLIED, source="unsplash")
+    assert [item["id"] for item in queue.unfinished({"unsplash"})] == ["unsplash:1"]
+    assert len(queue.unfinished()) == 2
+
+def test_defer_keeps_the_first_deferral_time(journal):
+    queue = WorkQueue(journal)
+    assert queue.defer("pexels:1", 5000, source="pexels", path="a.jpg")
+    deferred_at = queue.unfinished()[0]["deferred_at"]
+    assert queue.defer("pexels:1", 5000, source="pexels", path="a.jpg")
+    item = WorkQueue(journal).unfinished()[0]
+    assert item["state"] == DEFERRED
+    assert item["size"] == 5000
+    assert item["deferred_at"] == deferred_at
+
+def test_defer_limit_is_per_source(journal):
+    queue = WorkQueue(journal)
+    for number in range(MAX_DEFERRED):
+        assert queue.defer(f"pexels:{number}", 1, source="pexels")
+    assert not queue.defer("pexels:extra", 1, source="pexels")
+    assert queue.state("pexels:extra") is None
+    # An item already waiting can be deferred again, other sources have their own limit
+    assert queue.defer("pexels:0", 1, source="pexels")
+    assert queue.defer("unsplash:1", 1, source="unsplash")
+
+def test_discard_removes_the_partial_download(journal, tmp_path):
+    image = tmp_path / "1_someone.jpg"
+    part_path(image).write_bytes(b"half")
+    queue = WorkQueue(journal)
+    queue.record("pexels:1", DOWNLOADING, source="pexels", path=str(image))
+    queue.discard("pexels:1")
+    assert not part_path(image).exists()
+    assert queue.state("pexels:1") == DISCARDED
+
+def test_one_queue_per_save_location(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "location_objects", {})
+    config = {"SAVE_LOCATION": str(tmp_path / "wallpapers")}
+    assert get_work_queue(config) is get_work_queue(dict(config))
+    assert get_work_queue({"SAVE_LOCATION": str(tmp_path / "other")}) is not get_work_queue(config)
+    assert work_item_id("pexels", 42) == "pexels:42"
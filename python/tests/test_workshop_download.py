@@ -0,0 +1,47 @@
+import pytest
+from python import utils, wallpaper_engine
+from python.wallpaper_engine import download_workshop_item
+from python.work_queue import get_work_queue, work_item_id, FETCHED, MAX_ATTEMPTS
+
+class FakeCredentials:
+    def __init__(self, accounts):
+        self.accounts = list(accounts)
+        self.failed = []
+
+    def next_account(self):
+        return self.accounts.pop(0) if self.accounts else (None, None)
+
+    def mark_failed(self, username):
+        self.failed.append(username)
+
+    def mark_ok(self, username):
+        pass
+
+class FakeProcess:
+    def __init__(self, command, **kwargs):
+        self.stdout = iter(["Logging 'someone' into Steam3...\n", "Failed to authenticate with Steam: InvalidPassword\n"])
+        self.returncode = None
+
+    def wait(self):
+        self.returncode = 1
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "location_objects", {})
+    monkeypatch.setattr(wallpaper_engine.subprocess, "Popen", FakeProcess)
+    return {"SAVE_LOCATION": str(tmp_path)}
+
+def test_failed_logins_do_not_use_up_attempts(config, monkeypatch):
+    credentials = FakeCredentials([(f"user{number}", "wrong") for number in range(MAX_ATTEMPTS + 1)])
+    monkeypatch.setattr(wallpaper_engine, "get_credentials", lambda: credentials)
+    for _ in range(MAX_ATTEMPTS + 1):
+        assert download_workshop_item("123", "depot", config) is None
+    queue = get_work_queue(config)
+    assert credentials.failed == [f"user{number}" for number in range(MAX_ATTEMPTS + 1)]
+    assert queue.state(work_item_id("wallpaper_engine", "123")) == FETCHED
+    assert queue.attempts(work_item_id("wallpaper_engine", "123")) == 0
+
+def test_item_is_kept_without_an_account(config, monkeypatch):
+    monkeypatch.setattr(wallpaper_engine, "get_credentials", lambda: FakeCredentials([]))
+    assert download_workshop_item("123", "depot", config) is None
+    assert get_work_queue(config).state(work_item_id("wallpaper_engine", "123")) == FETCHED
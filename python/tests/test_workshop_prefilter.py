@@ -0,0 +1,56 @@
+import pytest
+from python import utils, wallpaper_engine
+from python.wallpaper_engine import is_usable_wallpaper, filter_wallpaper_candidates, stub_file_details_lookup
+from python.work_queue import get_work_queue, DEFERRED
+
+MB = 1024 * 1024
+
+def details(file_size=10 * MB, *tags):
+    return {"file_size": str(file_size), "tags": [{"tag": tag} for tag in tags]}
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    config = {"SAVE_LOCATION": str(tmp_path)}
+    monkeypatch.setattr(wallpaper_engine, "load_config", lambda: config)
+    monkeypatch.setattr(wallpaper_engine, "download_allowance", lambda config, source: None)
+    monkeypatch.setattr(utils, "location_objects", {})
+    return config
+
+@pytest.mark.parametrize("item, usable", [
+    (details(10 * MB, "Scene", "Landscape"), True),
+    (details(10 * MB, "Video"), True),
+    (details(10 * MB, "Web"), False),
+    (details(10 * MB), False),
+    (details(600 * MB, "Video"), False),
+])
+def test_default_limits(item, usable):
+    assert is_usable_wallpaper(item, {}) == usable
+
+def test_configured_limits():
+    config = {"WORKSHOP_MAX_SIZE_MB": "2000", "WORKSHOP_ALLOWED_TYPES": "video, web", "WORKSHOP_EXCLUDED_TAGS": "Anime"}
+    assert is_usable_wallpaper(details(1500 * MB, "Video"), config)
+    assert is_usable_wallpaper(details(10 * MB, "Web"), config)
+    assert not is_usable_wallpaper(details(10 * MB, "Scene"), config)
+    assert not is_usable_wallpaper(details(10 * MB, "Video", "anime"), config)
+    assert is_usable_wallpaper(details(10 * MB, "Application"), {"WORKSHOP_ALLOWED_TYPES": ""})
+
+def test_prefilter_keeps_usable_items_in_order(config):
+    lookup = stub_file_details_lookup({
+        "1": details(10 * MB, "Scene"),
+        "2": details(900 * MB, "Scene"),
+        "3": details(10 * MB, "Web"),
+        "4": details(20 * MB, "Video"),
+    })
+    # "5" is unknown to Steam, so it is dropped as well
+    assert filter_wallpaper_candidates(["4", "1", "2", "3", "5"], details_lookup=lookup) == ["4", "1"]
+
+def test_prefilter_falls_back_without_details(config, caplog):
+    assert filter_wallpaper_candidates(["1", "2"], details_lookup=stub_file_details_lookup({})) == ["1", "2"]
+    assert "skipping the prefilter" in caplog.text
+
+def test_items_over_the_allowance_are_deferred(config, monkeypatch):
+    monkeypatch.setattr(wallpaper_engine, "download_allowance", lambda config, source: 50 * MB)
+    lookup = stub_file_details_lookup({"1": details(10 * MB, "Scene"), "2": details(200 * MB, "Scene")})
+    assert filter_wallpaper_candidates(["1", "2"], details_lookup=lookup) == ["1"]
+    deferred = get_work_queue(config).unfinished({"wallpaper_engine"})
+    assert [(item["pubfileid"], item["state"], item["size"]) for item in deferred] == [("2", DEFERRED, 200 * MB)]
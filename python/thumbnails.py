@@ -0,0 +1,156 @@
+import os
+import json
+import mmap
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from python.archive import locate_wallpaper
+
+THUMBNAIL_FILE = "thumbnails.bin"
+THUMBNAIL_INDEX = "thumbnails.json"
+THUMBNAIL_WIDTH = 128
+THUMBNAIL_HEIGHT = 72
+SLOT_SIZE = THUMBNAIL_WIDTH * THUMBNAIL_HEIGHT * 3  # Raw RGB
+PPM_HEADER = f"P6 {THUMBNAIL_WIDTH} {THUMBNAIL_HEIGHT} 255\n".encode("ascii")
+# Wallpaper Engine projects ship a preview next to the scene
+PROJECT_PREVIEWS = ["preview.jpg", "preview.png", "preview.gif"]
+# What Pillow raises for missing, truncated, corrupt or oversized images
+IMAGE_ERRORS = (OSError, SyntaxError, ValueError, EOFError, Image.DecompressionBombError)
+
+def find_image(path):
+    """The file to thumbnail for a history path: the image, its archived copy or a project preview."""
+    path = Path(path)
+    project_dir = path if path.is_dir() else path.parent
+    if path.is_dir() or path.suffix.lower() in (".pkg", ".mp4"):
+        return next((project_dir / name for name in PROJECT_PREVIEWS if (project_dir / name).exists()), None)
+    located = locate_wallpaper(path)
+    return Path(located) if located else None
+
+def render_thumbnail(image_path):
+    """Raw RGB bytes of a letterboxed THUMBNAIL_WIDTH x THUMBNAIL_HEIGHT thumbnail."""
+    with Image.open(image_path) as image:
+        image.draft("RGB", (THUMBNAIL_WIDTH * 2, THUMBNAIL_HEIGHT * 2))  # JPEGs decode at 1/8 scale
+        image = ImageOps.pad(image.convert("RGB"), (THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT), color=(32, 32, 32))
+        return image.tobytes()
+
+class ThumbnailCache:
+    """Thumbnails of past wallpapers in one memory-mapped file of fixed-size slots.
+
+    A slot holds raw RGB, so showing one is a slice of the map plus a PPM
+    header, no decoding. Slots are reused round-robin once max_entries is
+    reached. Missing thumbnails are rendered by a small thread pool (Pillow
+    releases the GIL while decoding and resizing); on_ready(key) is called
+    from the pool thread when one is done. Keys whose image cannot be
+    rendered are marked failed and not tried again this session.
+    """
+
+    def __init__(self, directory, max_entries=4000, workers=2):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.path = self.directory / THUMBNAIL_FILE
+        self.index_path = self.directory / THUMBNAIL_INDEX
+        self.slots = {}       # key -> slot number
+        self.slot_keys = {}   # slot number -> key
+        self.next_slot = 0
+        self.unsaved = 0
+        self.pending = set()
+        self.failed = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self.file = None
+        self.map = None
+        self.load()
+
+    def load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.index_path.exists():
+                with self.index_path.open("r") as f:
+                    data = json.load(f)
+                self.slots, self.next_slot = data["slots"], data["next_slot"]
+        except (json.JSONDecodeError, IOError, KeyError) as e:
+            logging.error(f"Error reading thumbnail index: {e}")
+            self.slots, self.next_slot = {}, 0
+        self.slot_keys = {slot: key for key, slot in self.slots.items()}
+        self.file = open(self.path, "a+b")
+        self.resize(max(len(self.slots), 1))
+
+    def resize(self, slot_count):
+        """Make room for slot_count slots, growing the file in doubling steps, and map it again."""
+        if self.map is not None and len(self.map) >= slot_count * SLOT_SIZE:
+            return
+        size = max(slot_count, min(self.max_entries, 2 * len(self.map) // SLOT_SIZE if self.map else 0)) * SLOT_SIZE
+        if self.map is not None:
+            self.map.close()  # Windows cannot resize a file while it is mapped
+        if os.path.getsize(self.path) < size:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), os.path.getsize(self.path))
+
+    def save_index(self):
+        temp_path = self.index_path.with_suffix(".tmp")
+        try:
+            with temp_path.open("w") as f:
+                json.dump({"slots": self.slots, "next_slot": self.next_slot}, f)
+            os.replace(temp_path, self.index_path)
+        except IOError as e:
+            logging.error(f"Error saving thumbnail index: {e}")
+
+    def get_ppm(self, key):
+        """PPM bytes for tk.PhotoImage(data=...), or None when not rendered yet."""
+        with self.lock:
+            slot = self.slots.get(key)
+            if slot is None:
+                return None
+            return PPM_HEADER + self.map[slot * SLOT_SIZE:(slot + 1) * SLOT_SIZE]
+
+    def request(self, key, on_ready):
+        """Render the thumbnail of key (a history path) in the background if it is missing."""
+        with self.lock:
+            if key in self.slots or key in self.pending or key in self.failed:
+                return
+            self.pending.add(key)
+        self.executor.submit(self.render, key, on_ready)
+
+    def render(self, key, on_ready):
+        pixels = None
+        try:
+            image_path = find_image(key)
+            if image_path is not None:
+                pixels = render_thumbnail(image_path)
+        except IMAGE_ERRORS as e:
+            logging.warning(f"Cannot create thumbnail for {key}: {e}")
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+                if pixels is None:
+                    self.failed.add(key)
+        if pixels is None:
+            return
+
+        with self.lock:
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.max_entries
+            # Reusing a slot evicts the oldest thumbnail
+            self.slots.pop(self.slot_keys.get(slot), None)
+            self.resize(slot + 1)
+            self.map[slot * SLOT_SIZE:(slot + 1) * SLOT_SIZE] = pixels
+            self.slots[key] = slot
+            self.slot_keys[slot] = key
+            # A lost index only means rendering again, so it is written in batches
+            self.unsaved += 1
+            if self.unsaved >= 32:
+                self.save_index()
+                self.unsaved = 0
+        on_ready(key)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            self.save_index()
+            if self.map is not None:
+                self.map.flush()
+                self.map.close()
+                self.map = None
+            self.file.close()
@@ -1,37 +1,37 @@
 import os
+import copy
 import json
-from dotenv import load_dotenv
+import random
 import logging
 import threading
 import sys
+from pathlib import Path
 
 config_lock = threading.Lock()
 
-def load_env_vars():
-    """Load environment variables from .env file."""
+# Indexes, journals and caches kept in the save location, one instance per location (see per_location)
+location_objects = {}
+location_lock = threading.Lock()
+
+# Last parsed config.json and the (mtime, size) it was read at, so unchanged files are not re-parsed
+config_cache = {"stamp": None, "config": None}
+
+def get_base_path():
+    """Directory holding config.json and .env.
+
+    WALLYOUNEED_HOME overrides it, so benchmarks and tests never touch the user's files.
+    """
+    if os.environ.get('WALLYOUNEED_HOME'):
+        return os.environ['WALLYOUNEED_HOME']
     if getattr(sys, 'frozen', False):
         # Running as compiled exe
-        exe_dir = os.path.dirname(sys.executable)
-        env_path = os.path.join(exe_dir, '.env')
-    else:
-        # Running as script
-        env_path = os.path.join(os.path.dirname(__file__), '.env')
-    
-    if not os.path.exists(env_path):
-        with open(env_path, 'w') as f:
-            f.write("# Add your API keys below\nUNSPLASH_ACCESS_KEY=\nPEXELS_API_KEY=\n")
-    
-    load_dotenv(env_path)
+        return os.path.dirname(sys.executable)
+    # Running as script
+    return os.path.dirname(os.path.abspath(__file__))
 
 def load_config():
     with config_lock:
-        if getattr(sys, 'frozen', False):
-            # Running as exe - use executable directory
-            base_path = os.path.dirname(sys.executable)
-        else:
-            base_path = os.path.dirname(os.path.abspath(__file__))
-        
-        config_path = os.path.join(base_path, 'config.json')
+        config_path = os.path.join(get_base_path(), 'config.json')
         
         if not os.path.exists(config_path):
             default_config = {
@@ -39,42 +39,151 @@ def load_config():
                 "SOURCE_UNSPLASH": False,
                 "SOURCE_PEXELS": False,
                 "SOURCE_WALLPAPER_ENGINE": False,
+                "SOURCE_FOLDERS": False,
+                "SOURCE_FEEDS": False,
                 "CHECK_INTERVAL": "300",
                 "COLLECTIONS_URL": "https://steamcommunity.com/sharedfiles/filedetails/?id=2801058904",
                 "WALLPAPER_DOWNLOAD_LIMIT": "1",
                 "MAX_WALLPAPERS": "1",
                 "SAVE_OLD_WALLPAPERS": False,
-                "UPDATE_RUNNING": False
+                "UPDATE_RUNNING": False,
+                "ENGINE_MODE": "thread",
+                "CONTROL_API_ENABLED": False,
+                "CONTROL_API_PORT": "8765",
+                "WORKSHOP_PREFILTER": True,
+                "WORKSHOP_MAX_SIZE_MB": "500",
+                "WORKSHOP_ALLOWED_TYPES": "scene,video",
+                "WORKSHOP_EXCLUDED_TAGS": "",
+                "UNSPLASH_API_URL": "https://api.unsplash.com",
+                "PEXELS_API_URL": "https://api.pexels.com",
+                "DEPOTDOWNLOADER_PATH": "",
+                "WALLPAPER_ENGINE_SETTLE_SECONDS": "10",
+                "METRICS_FILE": "",
+                "PROFILE_SAMPLE_RATE": "0",
+                "PROFILE_KEEP": "20",
+                "HISTORY_MAX_ENTRIES": "1000",
+                "DEDUPE_ENABLED": True,
+                "DEDUPE_MAX_DISTANCE": "6",
+                "DEDUPE_MAX_ENTRIES": "50000",
+                "UNSPLASH_QUERY": "landscape",
+                "PEXELS_QUERY": "nature",
+                "SELECTION_RULES": [],
+                "FEATURE_INDEX_MAX_ENTRIES": "10000",
+                "OFFLINE_MODE": "auto",
+                "BANDWIDTH_LIMIT_KBPS": "0",
+                "BANDWIDTH_BUDGETS": {},
+                "LARGE_DOWNLOAD_MB": "100",
+                "IDLE_MINUTES": "5",
+                "IDLE_NETWORK_KBPS": "256",
+                "HOT_TIER_MAX_MB": "0",
+                "HOT_TIER_QUALITY": "90",
+                "ARCHIVE_MAX_MB": "2048",
+                "ARCHIVE_QUALITY": "80",
+                "ARCHIVE_MAX_SIZE": "2560",
+                "ARCHIVE_WORKERS": "2",
+                "THUMBNAIL_MAX_ENTRIES": "4000",
+                "HTTP_CACHE_MAX_MB": "50",
+                "MULTI_MONITOR": False,
+                "LOCAL_FOLDERS": [],
+                "FEED_URLS": []
             }
             with open(config_path, 'w') as f:
                 json.dump(default_config, f, indent=4)
         
         try:
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            # logging.info(f"Configuration loaded successfully: {config}")
-            logging.info(f"Configuration loaded successfully")
-        except json.JSONDecodeError as e:
-            logging.error(f"Error decoding JSON: {e}")
+            stat = os.stat(config_path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp != config_cache["stamp"]:
+                with open(config_path, 'r') as f:
+                    config_cache["config"] = json.load(f)
+                config_cache["stamp"] = stamp
+                # logging.info(f"Configuration loaded successfully: {config}")
+                logging.info(f"Configuration loaded successfully")
+        except (json.JSONDecodeError, OSError) as e:
+            # Nothing is cached for a broken file, the next call reads it again
+            if config_cache["config"] is None:
+                logging.error(f"Error decoding JSON: {e}, no configuration loaded")
+            else:
+                logging.error(f"Error decoding JSON: {e}, keeping the last valid configuration")
 
-        return config
+        # Callers modify their copy freely, nested lists and dicts included
+        return copy.deepcopy(config_cache["config"] or {})
 
 def save_config(config):
     with config_lock:
         try:
             # Get the correct config path using same logic as load_config()
-            base_path = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) \
-                else os.path.dirname(os.path.abspath(__file__))
-            config_path = os.path.join(base_path, 'config.json')
+            config_path = os.path.join(get_base_path(), 'config.json')
             
             with open(config_path, 'w') as f:
                 json.dump(config, f, indent=4)
+            stat = os.stat(config_path)
+            config_cache["config"] = copy.deepcopy(config)
+            config_cache["stamp"] = (stat.st_mtime_ns, stat.st_size)
             logging.info("Configuration saved successfully.")
         except Exception as e:
             logging.error(f"Error saving configuration: {e}")
 
-# # Load environment variables at the start of the script
-# load_env_vars()
+def per_location(config, name, factory):
+    """The object stored under name in the save location, made by factory(path) on first use.
+
+    Loaded once per location and shared by every caller after that.
+    """
+    path = Path(config['SAVE_LOCATION']) / name
+    with location_lock:
+        if path not in location_objects:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            location_objects[path] = factory(path)
+        return location_objects[path]
+
+def write_atomic(path, write, mode="w"):
+    """Write a file through write(f) on a temp file renamed over it, so readers never see half of it.
+
+    OSError is left to the caller.
+    """
+    path = Path(path)
+    temp_path = path.with_suffix(".tmp")
+    with open(temp_path, mode) as f:
+        write(f)
+    os.replace(temp_path, path)
+
+class ShuffledBag:
+    """Hands out items in shuffled rounds, so nothing repeats before every item was handed out.
+
+    items is the rest of the current round, next first; it and last (the
+    item handed out last) are what gets persisted.
+    """
+
+    def __init__(self, items=(), last=None):
+        self.items = list(items)
+        self.last = last
+
+    def keep(self, known):
+        """Drop the items that are gone."""
+        self.items = [item for item in self.items if item in known]
+
+    def add(self, item):
+        """Put a new item into the current round at a random place."""
+        self.items.insert(random.randint(0, len(self.items)), item)
+
+    def draw(self, allowed):
+        """The next item of the current round that is in allowed, None when allowed is empty.
+
+        When the round holds none of them a new round of allowed starts, without repeating the last item first.
+        """
+        allowed = set(allowed)
+        if not allowed:
+            return None
+        choice = next((item for item in self.items if item in allowed), None)
+        if choice is None:
+            new_round = random.sample(sorted(allowed), len(allowed))
+            if len(new_round) > 1 and new_round[0] == self.last:
+                new_round.append(new_round.pop(0))
+            self.items += new_round
+            choice = new_round[0]
+        self.items.remove(choice)
+        self.last = choice
+        return choice
 
 # # Example usage:
 # if __name__ == "__main__":
@@ -1,25 +1,38 @@
 import time
 import requests
 import subprocess
-import json
 from pathlib import Path
 from bs4 import BeautifulSoup
 import random
 import logging
+import re
 import psutil
 import os
-from python.utils import load_env_vars, load_config  # Import utility functions
+from python.utils import load_config  # Import utility functions
+from python.credentials import get_credentials
+from python.wallpaper_utils import append_wallpaper_history, cleanup_old_wallpapers, terminate_depotdownloader
+from python.metrics import timed, increment
+from python.bandwidth import download_allowance, record_usage
+from python.http_session import get_session, conditional_get
+from python.local_library import find_project_wallpaper
+from python.work_queue import get_work_queue, work_item_id, FETCHED, DOWNLOADING, DOWNLOADED, APPLIED, MAX_ATTEMPTS
+from python.providers import WallpaperProvider
 import sys
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load environment variables
-load_env_vars()
-
 # Load configuration fresh each time
 config = load_config()
 
+WORKSHOP_ITEM_URL = "https://steamcommunity.com/sharedfiles/filedetails/?id="
+# DepotDownloader output when Steam rejected the account, not the item
+LOGIN_FAILURE = re.compile(r"Failed to authenticate with Steam|Unable to login to Steam|Unable to get steam3 credentials"
+                           r"|InvalidPassword|AccountLogonDenied|RateLimitExceeded")
+
+# Only Windows knows these flags, elsewhere (benchmarks on Linux) run without them
+CREATION_FLAGS = getattr(subprocess, "CREATE_NO_WINDOW", 0) | getattr(subprocess, "CREATE_BREAKAWAY_FROM_JOB", 0)
+
 # Wallpaper Engine related functions
 
 def printlog(log):
@@ -28,12 +41,12 @@ def printlog(log):
     logging.info(log)
 
 def fetch_page_content(url, stop_event):
-    """Fetch a webpage's content."""
+    """Fetch a webpage's content, revalidating a cached copy instead of downloading it again."""
     try:
         if stop_event and stop_event.is_set():
             return None
             
-        response = requests.get(url, timeout=10)
+        response = conditional_get(url, config, "wallpaper_engine", timeout=10)
         response.raise_for_status()
         return response.text
     except requests.RequestException as e:
@@ -42,35 +55,14 @@ def fetch_page_content(url, stop_event):
         logging.warning(f"Failed to fetch {url}: {e}")
         return None
 
-def get_random_credential_pair():
-    """Select a random username-password pair."""
-    usernames = os.getenv('USERNAMES').split(',')
-    passwords = os.getenv('PASSWORDS').split(',')
-    
-    if not usernames or not passwords:
-        logging.error("Usernames or passwords are not set in environment variables.")
-        return None, None
-    
-    index = random.randint(0, len(usernames) - 1)
-    return usernames[index], passwords[index]
-
 def log_downloaded_wallpaper(pubfileid):
     """Log downloaded wallpaper metadata."""
     save_location = Path(config['SAVE_LOCATION'])
-    history_file = save_location / "wallpaper_history.json"
-    try:
-        history = {}
-        if history_file.exists():
-            with history_file.open("r") as f:
-                history = json.load(f)
-        history[pubfileid] = {
-            "timestamp": time.time(),
-            "path": str(save_location / "projects" / "myprojects" / pubfileid)
-        }
-        with history_file.open("w") as f:
-            json.dump(history, f, indent=4)
-    except (json.JSONDecodeError, IOError) as e:
-        logging.error(f"Error logging wallpaper: {e}")
+    append_wallpaper_history(save_location, pubfileid, {
+        "source": "wallpaper_engine",
+        "timestamp": time.time(),
+        "path": str(save_location / "projects" / "myprojects" / pubfileid)
+    }, int(config.get('HISTORY_MAX_ENTRIES', 1000)))
 
 # def validate_we_path():
 #     """Validate Wallpaper Engine installation path."""
@@ -118,11 +110,11 @@ def set_downloaded_wallpaper(wallpaper_path):
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
-            creationflags=subprocess.CREATE_NO_WINDOW | subprocess.CREATE_BREAKAWAY_FROM_JOB
+            creationflags=CREATION_FLAGS
         )
         for line in process.stdout:
             logging.info(f"[Wallpaper Engine] {line.strip()}")
-        time.sleep(10)  # Add safety delay before cleanup
+        time.sleep(float(config.get('WALLPAPER_ENGINE_SETTLE_SECONDS', 10)))  # Add safety delay before cleanup
         return True
     except (subprocess.SubprocessError, FileNotFoundError) as e:
         logging.error(f"Failed to set wallpaper: {e}")
@@ -154,11 +146,13 @@ def scrape_wallpapers(stop_event):
     collections_url = config['COLLECTIONS_URL'].format(page=random_page)
     logging.info(f"Fetching wallpaper links from page {random_page}...")
 
-    wallpapers_page = fetch_page_content(collections_url, stop_event)
+    with timed("page_scrape", "wallpaper_engine"):
+        wallpapers_page = fetch_page_content(collections_url, stop_event)
     if wallpapers_page:
         logging.info("Parsing wallpapers...")
-        soup = BeautifulSoup(wallpapers_page, 'html.parser')
-        raw_links = [a['href'] for a in soup.select('div.workshopItem a') if a.get('href')]
+        with timed("parse", "wallpaper_engine"):
+            soup = BeautifulSoup(wallpapers_page, 'html.parser')
+            raw_links = [a['href'] for a in soup.select('div.workshopItem a') if a.get('href')]
 
         wallpaper_links = clean_and_filter_wallpaper_links(raw_links)
         unique_links = set(wallpaper_links)
@@ -168,84 +162,258 @@ def scrape_wallpapers(stop_event):
         logging.warning(f"Failed to fetch or parse page {random_page}.")
     return []
 
-def download_random_wallpapers(wallpaper_links, stop_event=None):
-    """Download random wallpapers using depotdownloader."""
+def fetch_published_file_details(pubfileids, stop_event=None):
+    """Look up Workshop metadata for many pubfiles with one batched request.
+
+    Returns {pubfileid: details} for the items Steam knows about.
+    """
+    if not pubfileids or (stop_event and stop_event.is_set()):
+        return {}
+    config = load_config()
+    api_url = config.get('STEAM_API_URL', "https://api.steampowered.com").rstrip("/")
+    data = {"itemcount": len(pubfileids)}
+    for i, pubfileid in enumerate(pubfileids):
+        data[f"publishedfileids[{i}]"] = pubfileid
+    try:
+        with timed("api_fetch", "wallpaper_engine"):
+            response = get_session().post(f"{api_url}/ISteamRemoteStorage/GetPublishedFileDetails/v1/", data=data, timeout=10)
+            response.raise_for_status()
+            items = response.json()["response"].get("publishedfiledetails", [])
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logging.warning(f"Failed to fetch Workshop file details: {e}")
+        return {}
+    return {item["publishedfileid"]: item for item in items if item.get("result") == 1}
+
+def stub_file_details_lookup(details_by_id):
+    """Build a details lookup that answers from a dict, for tests and benchmarks."""
+    def lookup(pubfileids, stop_event=None):
+        return {pubfileid: details_by_id[pubfileid] for pubfileid in pubfileids if pubfileid in details_by_id}
+    return lookup
+
+def get_wallpaper_tags(details):
+    return [tag["tag"].lower() for tag in details.get("tags", []) if tag.get("tag")]
+
+def is_usable_wallpaper(details, config):
+    """Check Workshop details against the configured size, type and tag limits."""
+    max_size = int(float(config.get('WORKSHOP_MAX_SIZE_MB', "500")) * 1024 * 1024)
+    allowed_types = {t.strip().lower() for t in config.get('WORKSHOP_ALLOWED_TYPES', "scene,video").split(",") if t.strip()}
+    excluded_tags = {t.strip().lower() for t in config.get('WORKSHOP_EXCLUDED_TAGS', "").split(",") if t.strip()}
+
+    tags = set(get_wallpaper_tags(details))
+    if int(details.get("file_size", 0)) > max_size:
+        return False
+    # The wallpaper type (Scene, Video, Web, Application) is one of the item's tags
+    if allowed_types and not tags & allowed_types:
+        return False
+    return not tags & excluded_tags
+
+def filter_wallpaper_candidates(pubfileids, stop_event=None, details_lookup=None):
+    """Drop pubfiles that are too big or of an unusable type before downloading anything.
+
+    Falls back to the unfiltered list when the details lookup fails.
+    """
+    config = load_config()
+    details_lookup = details_lookup or fetch_published_file_details
+    details = details_lookup(pubfileids, stop_event)
+    if not details:
+        logging.warning("No Workshop details available, skipping the prefilter.")
+        return list(pubfileids)
+
+    usable = [pubfileid for pubfileid in pubfileids
+              if pubfileid in details and is_usable_wallpaper(details[pubfileid], config)]
+    # Packages over the remaining budget, or too large while the link is busy, are journaled for an idle cycle
+    allowance = download_allowance(config, "wallpaper_engine")
+    if allowance is not None:
+        queue = get_work_queue(config)
+        affordable = []
+        for pubfileid in usable:
+            size = int(details[pubfileid].get("file_size", 0))
+            if size <= allowance:
+                affordable.append(pubfileid)
+            elif queue.defer(work_item_id("wallpaper_engine", pubfileid), size, source="wallpaper_engine",
+                             pubfileid=pubfileid,
+                             path=str(Path(config['SAVE_LOCATION']) / "projects" / "myprojects" / pubfileid)):
+                increment("downloads_deferred", "wallpaper_engine")
+        usable = affordable
+    logging.info(f"Prefilter kept {len(usable)} of {len(pubfileids)} wallpapers.")
+    return usable
+
+def resolve_depot_path(config):
+    """Where DepotDownloader is, None when it cannot be found."""
+    base_path = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__)
+    depot_path = config.get('DEPOTDOWNLOADER_PATH') or \
+        os.path.join(base_path, "DepotDownloaderMod", "DepotDownloadermod.exe")
+    
+    # For EXE builds, check one level up if needed
+    if not os.path.exists(depot_path) and getattr(sys, 'frozen', False):
+        exe_parent = Path(sys.executable).parent
+        depot_path = exe_parent.parent / "DepotDownloaderMod" / "DepotDownloadermod.exe"
+    
+    logging.info(f"Resolved depotdownloader path: {depot_path}")
+    
+    if not os.path.exists(depot_path):
+        logging.error(f"DepotDownloader not found at: {depot_path}")
+        return None
+    return depot_path
+
+def directory_size(directory):
+    return sum(f.stat().st_size for f in directory.rglob("*") if f.is_file())
+
+def download_workshop_item(pubfileid, depot_path, config, stop_event=None):
+    """Download one Workshop item with DepotDownloader, journaled in the work queue.
+
+    Returns the wallpaper file, or None when the download did not complete.
+    An interrupted item keeps its journal entry and folder, so running it
+    again (see engine.resume_interrupted_work) lets -verify-all reuse what
+    is already there.
+    """
+    queue = get_work_queue(config)
+    item_id = work_item_id("wallpaper_engine", pubfileid)
+    logging.info(f"Downloading wallpaper ID {pubfileid}")
+
+    # Create specific directory for this wallpaper
+    save_location = Path(config['SAVE_LOCATION'])
+    directory = save_location / "projects" / "myprojects" / pubfileid
+    queue.record(item_id, FETCHED, source="wallpaper_engine", pubfileid=pubfileid, path=str(directory))
+
+    username, password = get_credentials().next_account()
+    if not username:
+        # The item is fine, it stays journaled for when an account is usable again
+        logging.error("No Steam account available (none set, or all cooling down after failed logins), skipping download")
+        return None
+
+    directory.mkdir(parents=True, exist_ok=True)
+    # A resumed item already has part of its files, only what this run adds is counted
+    size_before = directory_size(directory)
+    queue.record(item_id, DOWNLOADING)
+    login_failed = False
     try:
-        config = load_config()
+        with timed("depotdownloader", "wallpaper_engine"):
+            process = subprocess.Popen(
+                [
+                    depot_path,
+                    "-app", "431960",
+                    "-pubfile", pubfileid,
+                    "-verify-all",
+                    "-username", username,
+                    "-password", password,
+                    "-dir", str(directory)
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                creationflags=CREATION_FLAGS
+            )
+            for line in process.stdout:
+                logging.info(f"[DepotDownloader] {line.strip()}")
+                login_failed = login_failed or bool(LOGIN_FAILURE.search(line))
+            process.wait()
+    except (subprocess.SubprocessError, OSError) as e:
+        logging.error(f"Download failed for {pubfileid}: {e}")
+        return None
+    if login_failed and process.returncode != 0:
+        # The item is fine, it is resumed next cycle with another account; the run does not count as an attempt
+        get_credentials().mark_failed(username)
+        queue.record(item_id, FETCHED, attempts=queue.attempts(item_id) - 1)
+        return None
+    if process.returncode == 0:
+        get_credentials().mark_ok(username)
+    downloaded = max(0, directory_size(directory) - size_before)
+    # DepotDownloader does its own transfers, so they count against the budget but are not rate capped
+    increment("download_bytes", "wallpaper_engine", downloaded)
+    record_usage(config, "wallpaper_engine", downloaded)
+
+    wallpaper_path = find_project_wallpaper(directory)
+    if process.returncode != 0 or wallpaper_path is None:
         if stop_event and stop_event.is_set():
-            return
+            logging.info(f"Download of {pubfileid} interrupted, it is resumed on the next start")
+        elif queue.attempts(item_id) >= MAX_ATTEMPTS:
+            logging.warning(f"Giving up on {pubfileid} after {MAX_ATTEMPTS} attempts")
+            queue.discard(item_id)
+        else:
+            logging.warning(f"DepotDownloader did not finish {pubfileid} (exit code {process.returncode})")
+        return None
+    queue.record(item_id, DOWNLOADED, wallpaper=str(wallpaper_path))
+    log_downloaded_wallpaper(pubfileid)
+    return wallpaper_path
 
-        wallpaper_download_limit = int(config['WALLPAPER_DOWNLOAD_LIMIT'])
-        if len(wallpaper_links) < wallpaper_download_limit:
-            logging.warning("Not enough wallpapers to download.")
-            return
+def apply_workshop_item(pubfileid, wallpaper_path, config):
+    """Set a downloaded Workshop item and journal it as applied. Returns True if it was set."""
+    with timed("wallpaper_set", "wallpaper_engine"):
+        wallpaper_set = set_downloaded_wallpaper(str(wallpaper_path))
+    if wallpaper_set:
+        get_work_queue(config).record(work_item_id("wallpaper_engine", pubfileid), APPLIED)
+    return wallpaper_set
 
-        selected_links = random.sample(wallpaper_links, wallpaper_download_limit)
-        
-        base_path = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__)
-        depot_path = os.path.join(base_path, "DepotDownloaderMod", "DepotDownloadermod.exe")
-        
-        # For EXE builds, check one level up if needed
-        if not os.path.exists(depot_path) and getattr(sys, 'frozen', False):
-            exe_parent = Path(sys.executable).parent
-            depot_path = exe_parent.parent / "DepotDownloaderMod" / "DepotDownloadermod.exe"
-        
-        logging.info(f"Resolved depotdownloader path: {depot_path}")
-        
-        if not os.path.exists(depot_path):
-            logging.error(f"DepotDownloader not found at: {depot_path}")
-            return
+def select_wallpapers(wallpaper_links, count, stop_event=None, details_lookup=None):
+    """Pubfile ids to download: a random sample of count from the links, prefiltered.
+
+    Empty when not enough of them are usable.
+    """
+    config = load_config()
+    pubfileids = [link.split("id=")[1] for link in wallpaper_links]
+    if config.get('WORKSHOP_PREFILTER', True):
+        pubfileids = filter_wallpaper_candidates(pubfileids, stop_event, details_lookup)
 
-        for link in selected_links:
+    if len(pubfileids) < count:
+        logging.warning("Not enough wallpapers to download.")
+        return []
+    return random.sample(pubfileids, count)
+
+class WallpaperEngineProvider(WallpaperProvider):
+    """Workshop items, downloaded with DepotDownloader into the project folders Wallpaper Engine plays from.
+
+    An item is the whole package, there are no renditions to choose from.
+    A cycle fetches WALLPAPER_DOWNLOAD_LIMIT of them and sets them one by one;
+    they are neither spanned nor deduplicated.
+    """
+
+    name = "wallpaper_engine"
+    label = "Wallpaper Engine"
+    credential_vars = ["USERNAMES", "PASSWORDS"]
+    spans = False
+    dedupe = False
+    desktop_image = False
+
+    def is_available(self, config):
+        """Whether a Steam account is set and not cooling down after a failed login."""
+        return get_credentials().has_account()
+
+    def fetch_count(self, config, monitors):
+        return int(config['WALLPAPER_DOWNLOAD_LIMIT'])
+
+    def fetch(self, config, count, stop_event=None):
+        wallpaper_links = scrape_wallpapers(stop_event)
+        if not wallpaper_links:
+            logging.warning("No new wallpapers to download.")
+            return []
+        return [{"id": pubfileid, "photographer": None, "url": f"{WORKSHOP_ITEM_URL}{pubfileid}"}
+                for pubfileid in select_wallpapers(wallpaper_links, count, stop_event)]
+
+    def download(self, config, items, directory=None, size=None, stop_event=None):
+        depot_path = resolve_depot_path(config)
+        if depot_path is None:
+            return []
+        manifests = []
+        for item in items:
             if stop_event and stop_event.is_set():
-                return
-                
-            pubfileid = link.split("id=")[1]
-            logging.info(f"Downloading wallpaper ID {pubfileid}")
-            
-            # Create specific directory for this wallpaper
-            save_location = Path(config['SAVE_LOCATION'])
-            directory = save_location / "projects" / "myprojects" / pubfileid
-            directory.mkdir(parents=True, exist_ok=True)
-
-            username, password = get_random_credential_pair()
-            if not username or not password:
-                logging.error("Invalid credentials, skipping download")
-                continue
-
-            try:
-                process = subprocess.Popen(
-                    [
-                        depot_path,
-                        "-app", "431960",
-                        "-pubfile", pubfileid,
-                        "-verify-all",
-                        "-username", username,
-                        "-password", password,
-                        "-dir", str(directory)
-                    ],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW | subprocess.CREATE_BREAKAWAY_FROM_JOB
-                )
-                for line in process.stdout:
-                    logging.info(f"[DepotDownloader] {line.strip()}")
-                
-                log_downloaded_wallpaper(pubfileid)
-                wallpaper_path = directory / "scene.pkg"
-                set_downloaded_wallpaper(str(wallpaper_path))
-                time.sleep(10)  # Add safety delay before cleanup
-                
-                if stop_event and stop_event.is_set():
-                    process.terminate()
-                    return
-                
-            except subprocess.CalledProcessError as e:
-                logging.error(f"Download failed for {pubfileid}: {e}")
-
-    except Exception as e:
-        logging.error(f"Error in download process: {e}")
+                break
+            wallpaper_path = download_workshop_item(item["id"], depot_path, config, stop_event)
+            if wallpaper_path is not None:
+                manifests.append({"source": self.name, **self.metadata(item), "path": wallpaper_path})
+        return manifests
+
+    def apply(self, wallpaper_path):
+        """Set the project, then give Wallpaper Engine WALLPAPER_ENGINE_SETTLE_SECONDS to load it."""
+        wallpaper_set = set_downloaded_wallpaper(str(wallpaper_path))
+        time.sleep(float(load_config().get('WALLPAPER_ENGINE_SETTLE_SECONDS', 10)))
+        return wallpaper_set
+
+    def cleanup(self, config, save_path):
+        terminate_depotdownloader()
+        time.sleep(float(config.get('WALLPAPER_ENGINE_SETTLE_SECONDS', 10)))  # Add buffer before cleanup
+        with timed("cleanup", self.name):
+            cleanup_old_wallpapers(save_path, int(config['MAX_WALLPAPERS']))
 
 def close_wallpaper_engine():
     """Close Wallpaper Engine if it is running."""
@@ -256,18 +424,3 @@ def close_wallpaper_engine():
             process.wait()  # Wait for the process to be terminated
             logging.info(f"{process.info['name']} terminated.")
             return
-
-def automate_wallpaper_update(stop_event=None):
-    """Automate the process of scraping, downloading, and setting wallpapers."""
-    logging.info("Starting automated wallpaper update.")
-    wallpaper_links = scrape_wallpapers(stop_event)
-
-    if wallpaper_links:
-        download_random_wallpapers(wallpaper_links, stop_event)
-    else:
-        logging.warning("No new wallpapers to download.")
-    logging.info("Completed automated wallpaper update.")
-
-# Example usage
-# if __name__ == "__main__":
-#     automate_wallpaper_update()
\ No newline at end of file
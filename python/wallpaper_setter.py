@@ -0,0 +1,117 @@
+import os
+import shutil
+import logging
+import platform
+import subprocess
+import threading
+import ctypes
+from python.setter_backend import get_setter_state
+
+# Desktop setter picked by the first call to resolve_wallpaper_setter()
+wallpaper_setter = None
+resolve_lock = threading.Lock()
+
+def set_wallpaper_windows(file_path):
+    """Set the desktop wallpaper on Windows."""
+    absolute_path = os.path.abspath(file_path)
+    ctypes.windll.user32.SystemParametersInfoW(20, 0, absolute_path, 3)
+    logging.info(f"Wallpaper set to {absolute_path} on Windows")
+
+def set_wallpaper_macos(file_path):
+    """Set the desktop wallpaper on macOS."""
+    script = f'''
+    tell application "System Events"
+        set picture of every desktop to "{file_path}"
+    end tell
+    '''
+    subprocess.run(["osascript", "-e", script])
+    logging.info(f"Wallpaper set to {file_path} on macOS")
+
+def set_wallpaper_gnome(file_path):
+    """Set the desktop wallpaper on Linux with GNOME, for both light and dark styles."""
+    uri = f"file://{os.path.abspath(file_path)}"
+    subprocess.run(["gsettings", "set", "org.gnome.desktop.background", "picture-uri", uri])
+    subprocess.run(["gsettings", "set", "org.gnome.desktop.background", "picture-uri-dark", uri])
+    logging.info(f"Wallpaper set to {file_path} on GNOME")
+
+def set_wallpaper_kde(file_path):
+    """Set the desktop wallpaper on KDE Plasma."""
+    subprocess.run(["plasma-apply-wallpaperimage", os.path.abspath(file_path)])
+    logging.info(f"Wallpaper set to {file_path} on KDE Plasma")
+
+def set_wallpaper_sway(file_path):
+    """Set the wallpaper of every output on sway."""
+    subprocess.run(["swaymsg", "output", "*", "bg", os.path.abspath(file_path), "fill"])
+    logging.info(f"Wallpaper set to {file_path} on sway")
+
+def set_wallpaper_feh(file_path):
+    """Set the root window wallpaper with feh, for plain X11 window managers."""
+    subprocess.run(["feh", "--bg-fill", os.path.abspath(file_path)])
+    logging.info(f"Wallpaper set to {file_path} with feh")
+
+def set_spanned_wallpaper_feh(file_path):
+    """Stretch one image over all X11 screens with feh, instead of one copy per screen."""
+    subprocess.run(["feh", "--no-xinerama", "--bg-fill", os.path.abspath(file_path)])
+    logging.info(f"Spanned wallpaper set to {file_path} with feh")
+
+def set_wallpaper_unsupported(file_path):
+    logging.error(f"No way to set the wallpaper on {platform.system()}, {file_path} was not applied")
+
+LINUX_SETTERS = {
+    "gnome": set_wallpaper_gnome,
+    "kde": set_wallpaper_kde,
+    "sway": set_wallpaper_sway,
+    "feh": set_wallpaper_feh
+}
+
+# Setters able to span one image across every monitor. On Windows the span comes
+# from WallpaperStyle 22 (see registry_utils), the image is set as usual.
+SPANNING_SETTERS = {
+    set_wallpaper_windows: set_wallpaper_windows,
+    set_wallpaper_feh: set_spanned_wallpaper_feh
+}
+
+def probe_linux_setter():
+    """Pick the Linux desktop setter from the session and the tools on PATH."""
+    desktop = os.environ.get("XDG_CURRENT_DESKTOP", "").lower()
+    if (os.environ.get("SWAYSOCK") or "sway" in desktop) and shutil.which("swaymsg"):
+        return "sway"
+    if "kde" in desktop and shutil.which("plasma-apply-wallpaperimage"):
+        return "kde"
+    if any(name in desktop for name in ("gnome", "unity", "budgie")) and shutil.which("gsettings"):
+        return "gnome"
+    if os.environ.get("DISPLAY") and shutil.which("feh"):
+        return "feh"
+    if shutil.which("gsettings"):
+        return "gnome"
+    return None
+
+def resolve_wallpaper_setter():
+    """Return the desktop setter for this machine, probing only on the first call."""
+    global wallpaper_setter
+    with resolve_lock:
+        if wallpaper_setter is None:
+            system = platform.system()
+            if system == "Windows":
+                wallpaper_setter = set_wallpaper_windows
+            elif system == "Darwin":  # macOS
+                wallpaper_setter = set_wallpaper_macos
+            elif system == "Linux":
+                name = probe_linux_setter()
+                wallpaper_setter = LINUX_SETTERS.get(name, set_wallpaper_unsupported)
+                logging.info(f"Using the {name or 'unsupported'} wallpaper setter")
+            else:
+                wallpaper_setter = set_wallpaper_unsupported
+        return wallpaper_setter
+
+def apply_wallpaper(file_path):
+    """Set the desktop wallpaper, skipping it when the same file is already applied."""
+    return get_setter_state().apply_wallpaper(file_path, resolve_wallpaper_setter())
+
+def resolve_spanning_setter():
+    """The setter spanning one image across all monitors, None where the desktop has none."""
+    return SPANNING_SETTERS.get(resolve_wallpaper_setter())
+
+def apply_spanned_wallpaper(file_path):
+    """Set an image covering the whole desktop, see monitors.stitch_spanned."""
+    return get_setter_state().apply_wallpaper(file_path, resolve_spanning_setter())
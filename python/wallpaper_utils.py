@@ -1,20 +1,80 @@
 import logging
 import os
+import json
 import shutil
 import subprocess
+import threading
 import time
+from pathlib import Path
 
-def get_latest_wallpaper(directory):
-    """Get the latest wallpaper file from the specified directory."""
-    wallpapers = list(directory.glob("*.jpg"))
-    if not wallpapers:
-        return None
-    latest_wallpaper = max(wallpapers, key=os.path.getctime)
-    logging.info(f"Latest wallpaper identified: {latest_wallpaper}")
-    return latest_wallpaper
+history_lock = threading.Lock()
+
+# Wallpaper files per folder, oldest first. Listed once, then kept up to date
+# by track_wallpaper, so cleanup does not list and stat the folder every cycle.
+tracked_wallpapers = {}
+tracked_lock = threading.Lock()
+
+def track_wallpaper(path):
+    """Tell cleanup about a file just written to a wallpaper folder it already knows."""
+    path = Path(path)
+    with tracked_lock:
+        files = tracked_wallpapers.get(path.parent)
+        if files is not None:  # Folders cleanup has not seen yet are listed on their first cleanup
+            if path in files:
+                files.remove(path)
+            files.append(path)
+
+def load_wallpaper_history(save_location):
+    """Load wallpaper_history.json from the save location, empty if missing or corrupt."""
+    history_file = Path(save_location) / "wallpaper_history.json"
+    with history_lock:
+        try:
+            if history_file.exists():
+                with history_file.open("r") as f:
+                    return json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error reading wallpaper history: {e}")
+    return {}
+
+def append_wallpaper_history(save_location, key, entry, max_entries=1000):
+    """Add or replace one entry of wallpaper_history.json, keeping the newest max_entries."""
+    history_file = Path(save_location) / "wallpaper_history.json"
+    with history_lock:
+        try:
+            history = {}
+            if history_file.exists():
+                with history_file.open("r") as f:
+                    history = json.load(f)
+            history[key] = entry
+            if len(history) > max_entries:
+                newest = sorted(history.items(), key=lambda item: item[1].get("timestamp", 0))[-max_entries:]
+                history = dict(newest)
+            with history_file.open("w") as f:
+                json.dump(history, f, indent=4)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error logging wallpaper: {e}")
+
+def update_wallpaper_history(save_location, key, path, **fields):
+    """Change fields of the history entry of the file at path, e.g. after it was re-encoded."""
+    history_file = Path(save_location) / "wallpaper_history.json"
+    with history_lock:
+        try:
+            if not history_file.exists():
+                return
+            with history_file.open("r") as f:
+                history = json.load(f)
+            if history.get(key, {}).get("path") != path:
+                return
+            history[key].update(fields)
+            with history_file.open("w") as f:
+                json.dump(history, f, indent=4)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.error(f"Error updating wallpaper history: {e}")
 
 def terminate_depotdownloader():
     """Terminate DepotDownloaderMod.exe if it is running."""
+    if os.name != "nt":
+        return  # tasklist/taskkill only exist on Windows
     try:
         # Check if process exists before killing
         result = subprocess.run(["tasklist", "/fi", "imagename eq DepotDownloaderMod.exe"], 
@@ -26,20 +86,39 @@ def terminate_depotdownloader():
     except subprocess.CalledProcessError as e:
         logging.error(f"Failed to terminate DepotDownloaderMod.exe: {e}")
 
-def cleanup_old_wallpapers(directory, max_wallpapers):
-    """Delete old wallpapers to save space."""
-    wallpaper_files = list(directory.glob("*.jpg"))
+def cleanup_old_wallpapers(directory, max_wallpapers, archive=None, max_bytes=0):
+    """Delete old wallpapers to save space.
+
+    With an archive callable the old images are handed to it instead of deleted.
+    max_bytes additionally caps the total size of the images kept (0 for no cap).
+    """
+    with tracked_lock:
+        wallpaper_files = tracked_wallpapers.get(directory)
+        if wallpaper_files is None:
+            wallpaper_files = sorted(directory.glob("*.jpg"), key=os.path.getctime)
+            tracked_wallpapers[directory] = wallpaper_files
+        # Drops files removed elsewhere (near-duplicates, the user); only the kept few are checked
+        wallpaper_files[:] = [f for f in wallpaper_files if f.exists()]
+        old_files = wallpaper_files[:-max_wallpapers] if len(wallpaper_files) > max_wallpapers else []
+
+        if max_bytes:
+            kept = wallpaper_files[len(old_files):]
+            total = sum(f.stat().st_size for f in kept)
+            while len(kept) > 1 and total > max_bytes:
+                total -= kept[0].stat().st_size
+                old_files.append(kept.pop(0))
+        del wallpaper_files[:len(old_files)]
 
-    if len(wallpaper_files) > max_wallpapers:
-        wallpaper_files.sort(key=os.path.getctime)
-        
-        for file_to_delete in wallpaper_files[:-max_wallpapers]:
-            logging.info(f"Deleting old wallpaper file: {file_to_delete}")
-            try:
-                file_to_delete.unlink()
-                logging.info(f"Successfully deleted: {file_to_delete}")
-            except OSError as e:
-                logging.error(f"Failed to delete old wallpaper {file_to_delete}: {e}")
+    for file_to_delete in old_files:
+        if archive:
+            archive(file_to_delete)
+            continue
+        logging.info(f"Deleting old wallpaper file: {file_to_delete}")
+        try:
+            file_to_delete.unlink()
+            logging.info(f"Successfully deleted: {file_to_delete}")
+        except OSError as e:
+            logging.error(f"Failed to delete old wallpaper {file_to_delete}: {e}")
 
     target_dir = directory / "projects" / "myprojects"
     if target_dir.exists() and target_dir.is_dir():
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from pathlib import Path
+from python.utils import per_location, write_atomic
+
+JOURNAL_FILE = "work_journal.jsonl"
+# Steps of a work item, in order. applied and discarded end it.
+FETCHED = "fetched"
+DOWNLOADING = "downloading"
+DOWNLOADED = "downloaded"
+APPLIED = "applied"
+DISCARDED = "discarded"
+# Put off until the source's download allowance covers it (an idle window or a new budget period)
+DEFERRED = "deferred"
+FINAL_STATES = {APPLIED, DISCARDED}
+# Downloads that failed this often are cleaned up instead of resumed again
+MAX_ATTEMPTS = 3
+# Finished items the journal may hold before it is rewritten without them
+COMPACT_AFTER = 200
+# Deferred downloads kept per source, and how long they wait for an allowance before they are dropped
+MAX_DEFERRED = 10
+DEFERRED_MAX_AGE = 7 * 24 * 60 * 60
+
+def work_item_id(source, source_id):
+    return f"{source}:{source_id}"
+
+def part_path(file_path):
+    """Where an image is downloaded to before it is complete."""
+    file_path = Path(file_path)
+    return file_path.with_name(file_path.name + ".part")
+
+class WorkQueue:
+    """Journal of in-flight downloads, so a crash or close does not lose them.
+
+    Every step of an item is appended to work_journal.jsonl and synced
+    before the work it announces starts; replaying the journal gives the last
+    step of each item. Unfinished items are resumed by the engine (see
+    engine.resume_interrupted_work), finished ones are dropped when the
+    journal is compacted.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.items = {}  # item id -> latest state and data
+        self.finished = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut short by the crash
+                    self.items[entry["id"]] = {**self.items.get(entry["id"], {}), **entry}
+        except (IOError, KeyError) as e:
+            logging.error(f"Error reading work journal: {e}")
+        self.compact()
+
+    def compact(self):
+        """Rewrite the journal with only the unfinished items."""
+        self.items = {item_id: item for item_id, item in self.items.items() if item["state"] not in FINAL_STATES}
+        self.finished = 0
+        try:
+            write_atomic(self.path, lambda f: f.writelines(json.dumps(item) + "\n" for item in self.items.values()))
+        except IOError as e:
+            logging.error(f"Error compacting work journal: {e}")
+
+    def record(self, item_id, state, **data):
+        """Journal that an item reached state; data is merged into what is known about it."""
+        with self.lock:
+            item = {**self.items.get(item_id, {}), **data, "id": item_id, "state": state, "time": time.time()}
+            if state == DOWNLOADING:
+                item["attempts"] = item.get("attempts", 0) + 1
+            self.items[item_id] = item
+            try:
+                with self.path.open("a") as f:
+                    f.write(json.dumps({**data, "id": item_id, "state": state, "time": item["time"],
+                                        "attempts": item.get("attempts", 0)}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except IOError as e:
+                logging.error(f"Error writing work journal: {e}")
+            if state in FINAL_STATES:
+                self.finished += 1
+                if self.finished >= COMPACT_AFTER:
+                    self.compact()
+
+    def defer(self, item_id, size, **data):
+        """Journal a download that is over the allowance, to be resumed once the allowance covers size.
+
+        Returns False without journaling it when the source already has MAX_DEFERRED waiting.
+        """
+        with self.lock:
+            waiting = sum(1 for item in self.items.values() if item["state"] == DEFERRED
+                          and item.get("source") == data.get("source") and item["id"] != item_id)
+            deferred_at = self.items.get(item_id, {}).get("deferred_at", time.time())
+        if waiting >= MAX_DEFERRED:
+            return False
+        self.record(item_id, DEFERRED, size=size, deferred_at=deferred_at, **data)
+        return True
+
+    def state(self, item_id):
+        with self.lock:
+            item = self.items.get(item_id)
+            return item["state"] if item else None
+
+    def attempts(self, item_id):
+        """How often the item's download was started."""
+        with self.lock:
+            return self.items.get(item_id, {}).get("attempts", 0)
+
+    def unfinished(self, sources=None):
+        """Items not applied or discarded yet, oldest first."""
+        with self.lock:
+            items = [dict(item) for item in self.items.values()
+                     if item["state"] not in FINAL_STATES and (sources is None or item.get("source") in sources)]
+        return sorted(items, key=lambda item: item["time"])
+
+    def discard(self, item_id):
+        """End an item that cannot be finished, removing what it left on disk."""
+        with self.lock:
+            item = dict(self.items.get(item_id, {}))
+        if item.get("source") == "wallpaper_engine":
+            # A project folder without a wallpaper would only confuse Wallpaper Engine and the library
+            directory = item.get("path")
+            if directory and os.path.isdir(directory) and not item.get("wallpaper"):
+                shutil.rmtree(directory, ignore_errors=True)
+        elif item.get("path"):
+            part_path(item["path"]).unlink(missing_ok=True)
+        self.record(item_id, DISCARDED)
+
+def get_work_queue(config):
+    """The journal of the save location."""
+    return per_location(config, JOURNAL_FILE, WorkQueue)